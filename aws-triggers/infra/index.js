@@ -28,7 +28,7 @@ const getEndpoint = async () => {
   });
 
   // This endpoint is used to start the different benchmarks
-  return new awsx.apigateway.API('InfraEndpoint', {
+  const endpoint = new awsx.apigateway.API('InfraEndpoint', {
     stageArgs: {
       xrayTracingEnabled: true, // Enable X-ray for API gateway
     },
@@ -41,6 +41,10 @@ const getEndpoint = async () => {
       },
     ],
   });
+  return { endpoint, fn };
 };
 
-exports.url = getEndpoint().then((endpoint) => endpoint.url);
+const resources = getEndpoint();
+exports.url = resources.then(({ endpoint }) => endpoint.url);
+// Lambda function name used as X-Ray service name for filtering traces
+exports.functionName = resources.then(({ fn }) => fn.name);
@@ -32,7 +32,10 @@ const getQueueTrigger = async () => {
   });
   queue.onEvent('QueueTrigger', fn);
 
-  return pulumi.output(aws.sqs.getQueue({ name: queue.name }));
+  return { queue: pulumi.output(aws.sqs.getQueue({ name: queue.name })), fn };
 };
 
-exports.url = getQueueTrigger().then((queue) => queue.url);
+const resources = getQueueTrigger();
+exports.url = resources.then(({ queue }) => queue.url);
+// Lambda function name used as X-Ray service name for filtering traces
+exports.functionName = resources.then(({ fn }) => fn.name);
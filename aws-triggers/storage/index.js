@@ -32,7 +32,10 @@ const getStorageTrigger = async () => {
   });
   triggerBucket.onObjectCreated('objectCreatedHandler', fn);
 
-  return triggerBucket;
+  return { triggerBucket, fn };
 };
 
-exports.url = getStorageTrigger().then((bucket) => bucket.id);
+const resources = getStorageTrigger();
+exports.url = resources.then(({ triggerBucket }) => triggerBucket.id);
+// Lambda function name used as X-Ray service name for filtering traces
+exports.functionName = resources.then(({ fn }) => fn.name);
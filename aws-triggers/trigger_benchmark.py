@@ -16,60 +16,114 @@ PULUMI_IMAGE = 'pulumi/pulumi:3.28.0'
 
 def prepare(spec):
     trigger = spec['trigger']
-    # Initialization
-    init = ['shared', trigger, 'infra']
-    init_cmd = ' && '.join([f"cd {i} && npm install && cd .." for i in init])
-    spec.run(init_cmd, image='node12.x')
-    # Deploy shared resources
-    shared_cmd = (
-        'cd shared'
-        ' && pulumi stack select shared -c'
-        f" && pulumi config set aws:region {spec['region']}"
-        ' && pulumi up -f -y'
-    )
-    spec.run(shared_cmd, image=PULUMI_IMAGE)
-    # Deploy receiving Function2 with respective trigger
-    receiver_cmd = (
-        f"cd {trigger}"
-        f" && pulumi stack select {trigger} -c"
-        f" && pulumi config set aws:region {spec['region']}"
-        ' && pulumi up -f -y'
-    )
-    spec.run(receiver_cmd, image=PULUMI_IMAGE)
-    spec['receiver'] = last_line(spec.run(f"cd {trigger} && PULUMI_SKIP_UPDATE_CHECK=true pulumi stack output url", image=PULUMI_IMAGE))
-    # Deploy invoking Function1 called infra
-    infra_cmd = (
-        'cd infra'
-        ' && pulumi stack select infra -c'
-        f" && pulumi config set aws:region {spec['region']}"
-        ' && pulumi up -f -y'
-    )
-    spec.run(infra_cmd, image=PULUMI_IMAGE)
-    spec['invoker'] = last_line(spec.run('cd infra && PULUMI_SKIP_UPDATE_CHECK=true pulumi stack output url', image=PULUMI_IMAGE))
+    receiver_stack = spec.stack_name(trigger)
+    infra_stack = spec.stack_name('infra')
+    # Stack dependencies: the receiver (i.e., trigger) and infra stacks both import the
+    # shared stack but are independent of each other. Hence, all npm projects install
+    # concurrently and the receiver and infra stacks deploy concurrently after shared.
+    # Projects with an unchanged package-lock.json skip their npm install.
+    # The lock serializes installs and shared stack updates across concurrent instances.
+    with spec.lock('shared'):
+        spec.run_many({
+            # Initialization
+            'init_shared': {'cmd': spec.npm_install_command('shared'), 'image': 'node12.x'},
+            'init_trigger': {'cmd': spec.npm_install_command(trigger), 'image': 'node12.x'},
+            'init_infra': {'cmd': spec.npm_install_command('infra'), 'image': 'node12.x'},
+            # Deploy shared resources
+            'deploy_shared': {
+                'cmd': pulumi_up_cmd(spec, 'shared', 'shared'),
+                'image': PULUMI_IMAGE,
+                'after': ['init_shared']
+            }
+        })
+    outputs = spec.run_many({
+        # Deploy receiving Function2 with respective trigger
+        'deploy_receiver': {
+            'cmd': pulumi_up_cmd(spec, trigger, receiver_stack),
+            'image': PULUMI_IMAGE
+        },
+        'receiver_url': {
+            'cmd': pulumi_output_cmd(trigger, receiver_stack, 'url'),
+            'image': PULUMI_IMAGE,
+            'after': ['deploy_receiver']
+        },
+        # Deploy invoking Function1 called infra
+        'deploy_infra': {
+            'cmd': pulumi_up_cmd(spec, 'infra', infra_stack),
+            'image': PULUMI_IMAGE
+        },
+        'infra_url': {
+            'cmd': pulumi_output_cmd('infra', infra_stack, 'url'),
+            'image': PULUMI_IMAGE,
+            'after': ['deploy_infra']
+        },
+        # Function names for filtering the X-Ray traces of this deployment
+        'receiver_function': {
+            'cmd': pulumi_output_cmd(trigger, receiver_stack, 'functionName'),
+            'image': PULUMI_IMAGE,
+            'after': ['deploy_receiver']
+        },
+        'infra_function': {
+            'cmd': pulumi_output_cmd('infra', infra_stack, 'functionName'),
+            'image': PULUMI_IMAGE,
+            'after': ['deploy_infra']
+        }
+    })
+    spec['receiver'] = last_line(outputs['receiver_url'])
+    spec['invoker'] = last_line(outputs['infra_url'])
     spec['benchmark_url'] = f"{spec['invoker']}?trigger={trigger}&input={spec['receiver']}"
+    # Only download traces of this deployment rather than all traces in the account
+    spec['trace_services'] = [last_line(outputs['infra_function']),
+                              last_line(outputs['receiver_function'])]
     logging.info(f"Deployed {spec['trigger']} trigger available at benchmark_url={spec['benchmark_url']}")
 
 
+def pulumi_up_cmd(spec, project, stack):
+    """Returns the command to deploy a Pulumi `stack` of the `project` directory.
+    All commands explicitly specify their stack because concurrent instances
+    share the selected stack of a project directory."""
+    return (
+        f"cd {project}"
+        f" && pulumi stack select {stack} -c"
+        f" && pulumi config set aws:region {spec['region']} -s {stack}"
+        f" && pulumi up -f -y -s {stack}"
+    )
+
+
+def pulumi_output_cmd(project, stack, output):
+    """Returns the command to print a Pulumi stack output."""
+    return f"cd {project} && PULUMI_SKIP_UPDATE_CHECK=true pulumi stack output {output} -s {stack}"
+
+
 def invoke(spec):
     envs = {
-        'BENCHMARK_URL': spec['benchmark_url']
+        'BENCHMARK_URL': spec['benchmark_url'],
+        # Composite workloads can only target the deployed trigger
+        **spec.endpoint_envs({spec['trigger']: spec['benchmark_url']})
     }
     spec.run_k6(envs)
 
 
 def cleanup(spec):
+    if spec.instance():
+        # Keep the shared stack for other instances. The default instance destroys it.
+        for project in ['infra', spec['trigger']]:
+            pulumi_destroy(spec, project, spec.stack_name(project), remove=True)
+        return
     # shared needs to be destroyed last as it is a dependency
     stacks = ['infra', *supported_triggers, 'shared']
     for stack in stacks:
-        pulumi_destroy(spec, stack)
+        pulumi_destroy(spec, stack, stack)
 
 
-def pulumi_destroy(spec, stack):
-    """Destroys a Pulumi stack."""
+def pulumi_destroy(spec, project, stack, remove=False):
+    """Destroys a Pulumi `stack` of the `project` directory and optionally removes the stack."""
     cmd = (
-        f"cd {stack}"
-        ' && pulumi destroy -f -y'
+        f"cd {project}"
+        f" && pulumi destroy -f -y -s {stack}"
     )
+    if remove:
+        cmd += f" && pulumi stack rm -y -s {stack}"
     spec.run(cmd, image=PULUMI_IMAGE)
 
 
@@ -5,28 +5,44 @@ FUNCTION_URL=''
 LOCATION=''
 FUNCTION_APP_URL=''
 FUNCTIONAPP_NAME=''
+# Optional suffix for the trigger and infra stacks of concurrent benchmark instances
+STACK_SUFFIX=''
+# Optional deployment phase: shared (only the shared stack) | trigger (all but the shared stack)
+# Concurrent benchmark instances deploy the shared phase one at a time.
+PHASE=''
 
 deploy_shared_resources() {
-  echo "PULUMI_AZURE_LOCATION=\"$LOCATION\"" >>'./.env'
-  echo "RUNTIME=\"$RUNTIME\"" >>'./.env'
-  
-  cd shared/ && pulumi stack select shared -c && pulumi up -f -y
+  if [ "$PHASE" != 'trigger' ]; then
+    echo "PULUMI_AZURE_LOCATION=\"$LOCATION\"" >>'./.env'
+    echo "RUNTIME=\"$RUNTIME\"" >>'./.env'
+
+    cd shared/ && pulumi stack select shared -c && pulumi up -f -y -s shared
+
+    # Create API key to be able to use Azure Insights REST API TODO use it with REST API
+    az config set extension.use_dynamic_install=yes_without_prompt # Required to install and use app-insights module
+
+    # Navigate back to parent directory
+    cd ..
+  fi
+  if [ "$PHASE" = 'shared' ]; then
+    return
+  fi
+
+  # Read the outputs without selecting the shared stack
+  cd shared/
 
   echo "PULUMI_AZURE_LOCATION=\"$LOCATION\"" >>$FILE_NAME
   echo "RUNTIME=\"$RUNTIME\"" >>$FILE_NAME
 
   # Get App Id
-  APP_ID=$(pulumi stack output insightsAppId)
+  APP_ID=$(pulumi stack output -s shared insightsAppId)
   # Get Insights name
-  INSIGHTS_NAME=$(pulumi stack output insightsName)
+  INSIGHTS_NAME=$(pulumi stack output -s shared insightsName)
   # Get Resource group name
-  RESOURCE_GROUP=$(pulumi stack output resourceGroupName)
+  RESOURCE_GROUP=$(pulumi stack output -s shared resourceGroupName)
   # Get Function app name
-  FUNCTION_APP_URL=$(pulumi stack output functionAppUrl)
-  FUNCTIONAPP_NAME=$(pulumi stack output functionAppName)
-
-  # Create API key to be able to use Azure Insights REST API TODO use it with REST API
-  az config set extension.use_dynamic_install=yes_without_prompt # Required to install and use app-insights module
+  FUNCTION_APP_URL=$(pulumi stack output -s shared functionAppUrl)
+  FUNCTIONAPP_NAME=$(pulumi stack output -s shared functionAppName)
 
   # Navigate back to parent directory
   cd ..
@@ -36,19 +52,19 @@ deploy_http_trigger() {
   deploy_shared_resources
 
   # Deploy HTTP trigger
-  cd http/ && pulumi stack select trigger -c && pulumi up -f -y
+  cd http/ && pulumi stack select "trigger$STACK_SUFFIX" -c && pulumi up -f -y -s "trigger$STACK_SUFFIX"
 
   # Get url to HTTP trigger gateway
-  TRIGGER_URL=$(pulumi stack output url)
-  FUNCTION_APP=$(pulumi stack output functionApp)
+  TRIGGER_URL=$(pulumi stack output url -s "trigger$STACK_SUFFIX")
+  FUNCTION_APP=$(pulumi stack output functionApp -s "trigger$STACK_SUFFIX")
 
   cd ..
 
   # Deploy infrastructure
-  cd infra/ && pulumi stack select infra -c && pulumi up -f -y
+  cd infra/ && pulumi stack select "infra$STACK_SUFFIX" -c && pulumi up -f -y -s "infra$STACK_SUFFIX"
 
   # Get url to benchmark gateway
-  BENCHMARK_URL=$(pulumi stack output url)
+  BENCHMARK_URL=$(pulumi stack output url -s "infra$STACK_SUFFIX")
 
   echo "Write URL to .env"
   echo "BENCHMARK_URL=\"$BENCHMARK_URL?trigger=http&input=$TRIGGER_URL\"" >>$FILE_NAME
@@ -67,12 +83,12 @@ deploy_storage_trigger() {
   deploy_shared_resources
 
   # Deploy storage trigger
-  cd storage/ && pulumi stack select trigger -c && pulumi up -f -y
+  cd storage/ && pulumi stack select "trigger$STACK_SUFFIX" -c && pulumi up -f -y -s "trigger$STACK_SUFFIX"
 
   # Assign required roles, get storage account name and container name
-  STORAGE_ACCOUNT_NAME=$(pulumi stack output storageAccountName)
-  CONTAINER_NAME=$(pulumi stack output containerName)
-  FUNCTION_APP=$(pulumi stack output functionApp)
+  STORAGE_ACCOUNT_NAME=$(pulumi stack output storageAccountName -s "trigger$STACK_SUFFIX")
+  CONTAINER_NAME=$(pulumi stack output containerName -s "trigger$STACK_SUFFIX")
+  FUNCTION_APP=$(pulumi stack output functionApp -s "trigger$STACK_SUFFIX")
   ##
   # assign role "Storage Blob Data Contributor" to relevant asignees
   ##
@@ -80,10 +96,10 @@ deploy_storage_trigger() {
   cd ..
 
   # Deploy infrastructure
-  cd infra/ && pulumi stack select infra -c && pulumi up -f -y
+  cd infra/ && pulumi stack select "infra$STACK_SUFFIX" -c && pulumi up -f -y -s "infra$STACK_SUFFIX"
 
   # Get url to benchmark gateway
-  BENCHMARK_URL=$(pulumi stack output url)
+  BENCHMARK_URL=$(pulumi stack output url -s "infra$STACK_SUFFIX")
 
   echo "Write URL to .env"
   echo "BENCHMARK_URL=\"$BENCHMARK_URL?trigger=storage&input=$CONTAINER_NAME,$STORAGE_ACCOUNT_NAME\"" >>$FILE_NAME
@@ -98,12 +114,12 @@ deploy_queue_trigger() {
   deploy_shared_resources
 
   # Deploy queue trigger
-  cd queue/ && pulumi stack select trigger -c && pulumi up -f -y
+  cd queue/ && pulumi stack select "trigger$STACK_SUFFIX" -c && pulumi up -f -y -s "trigger$STACK_SUFFIX"
 
   # Get storage account name and queue name
-  STORAGE_ACCOUNT_NAME=$(pulumi stack output storageAccountName)
-  QUEUE_NAME=$(pulumi stack output queueName)
-  FUNCTION_APP=$(pulumi stack output functionApp)
+  STORAGE_ACCOUNT_NAME=$(pulumi stack output storageAccountName -s "trigger$STACK_SUFFIX")
+  QUEUE_NAME=$(pulumi stack output queueName -s "trigger$STACK_SUFFIX")
+  FUNCTION_APP=$(pulumi stack output functionApp -s "trigger$STACK_SUFFIX")
 
   ##
   # assign role "Storage Blob Data Contributor" to relevant asignees
@@ -112,10 +128,10 @@ deploy_queue_trigger() {
   cd ..
 
   # Deploy infrastructure
-  cd infra/ && pulumi stack select infra -c && pulumi up -f -y
+  cd infra/ && pulumi stack select "infra$STACK_SUFFIX" -c && pulumi up -f -y -s "infra$STACK_SUFFIX"
 
   # Get url to benchmark gateway
-  BENCHMARK_URL=$(pulumi stack output url)
+  BENCHMARK_URL=$(pulumi stack output url -s "infra$STACK_SUFFIX")
 
   echo "Write URL to .env"
   echo "BENCHMARK_URL=\"$BENCHMARK_URL?trigger=queue&input=$QUEUE_NAME,$STORAGE_ACCOUNT_NAME\"" >>$FILE_NAME
@@ -130,11 +146,11 @@ deploy_database_trigger() {
   deploy_shared_resources
 
   # Deploy database trigger
-  cd database/ && pulumi stack select trigger -c && pulumi up -f -y
+  cd database/ && pulumi stack select "trigger$STACK_SUFFIX" -c && pulumi up -f -y -s "trigger$STACK_SUFFIX"
 
   # Get storage account name and database name
-  CONTAINER_NAME=$(pulumi stack output containerName)
-  DATABASE_NAME=$(pulumi stack output databaseName)
+  CONTAINER_NAME=$(pulumi stack output containerName -s "trigger$STACK_SUFFIX")
+  DATABASE_NAME=$(pulumi stack output databaseName -s "trigger$STACK_SUFFIX")
 
   cd runtimes/node
   
@@ -145,10 +161,10 @@ deploy_database_trigger() {
   cd ..
 
   # Deploy infrastructure
-  cd infra/ && pulumi stack select infra -c && pulumi up -f -y
+  cd infra/ && pulumi stack select "infra$STACK_SUFFIX" -c && pulumi up -f -y -s "infra$STACK_SUFFIX"
 
   # Get url to benchmark gateway
-  BENCHMARK_URL=$(pulumi stack output url)
+  BENCHMARK_URL=$(pulumi stack output url -s "infra$STACK_SUFFIX")
 
   echo "Write URL to .env"
   echo "BENCHMARK_URL=\"$BENCHMARK_URL?trigger=database&input=$DATABASE_NAME,$CONTAINER_NAME\"" >>$FILE_NAME
@@ -163,19 +179,19 @@ deploy_timer_trigger() {
   deploy_shared_resources
 
   # Deploy database trigger
-  cd timer/ && pulumi stack select trigger -c && pulumi up -f -y
+  cd timer/ && pulumi stack select "trigger$STACK_SUFFIX" -c && pulumi up -f -y -s "trigger$STACK_SUFFIX"
 
   # Get timer function app name and trigger name
-  TIMER_FUNCTION_APP_NAME=$(pulumi stack output timerFunctionAppName)
-  TIMER_TRIGGER_NAME=$(pulumi stack output timerTriggerAppName)
+  TIMER_FUNCTION_APP_NAME=$(pulumi stack output timerFunctionAppName -s "trigger$STACK_SUFFIX")
+  TIMER_TRIGGER_NAME=$(pulumi stack output timerTriggerAppName -s "trigger$STACK_SUFFIX")
 
   cd ..
 
   # Deploy infrastructure
-  cd infra/ && pulumi stack select infra -c && pulumi up -f -y
+  cd infra/ && pulumi stack select "infra$STACK_SUFFIX" -c && pulumi up -f -y -s "infra$STACK_SUFFIX"
 
   # Get url to benchmark gateway
-  BENCHMARK_URL=$(pulumi stack output url)
+  BENCHMARK_URL=$(pulumi stack output url -s "infra$STACK_SUFFIX")
 
   echo "Write URL to .env"
   echo "BENCHMARK_URL=\"$BENCHMARK_URL?trigger=timer&input=https://$TIMER_FUNCTION_APP_NAME/admin/functions/$TIMER_TRIGGER_NAME\"" >>$FILE_NAME
@@ -189,20 +205,20 @@ deploy_serviceBus_trigger() {
   deploy_shared_resources
 
   # Deploy serviceBus trigger
-  cd serviceBus/ && pulumi stack select trigger -c && pulumi up -f -y
+  cd serviceBus/ && pulumi stack select "trigger$STACK_SUFFIX" -c && pulumi up -f -y -s "trigger$STACK_SUFFIX"
 
   # Get storage account name and serviceBus name
-  SERVICE_BUS_NAMESPACE=$(pulumi stack output serviceBusNamespace)
-  TOPIC_NAME=$(pulumi stack output topicName)
-  FUNCTION_APP=$(pulumi stack output functionApp)
+  SERVICE_BUS_NAMESPACE=$(pulumi stack output serviceBusNamespace -s "trigger$STACK_SUFFIX")
+  TOPIC_NAME=$(pulumi stack output topicName -s "trigger$STACK_SUFFIX")
+  FUNCTION_APP=$(pulumi stack output functionApp -s "trigger$STACK_SUFFIX")
 
   cd ..
 
   # Deploy infrastructure
-  cd infra/ && pulumi stack select infra -c && pulumi up -f -y
+  cd infra/ && pulumi stack select "infra$STACK_SUFFIX" -c && pulumi up -f -y -s "infra$STACK_SUFFIX"
 
   # Get url to benchmark gateway
-  BENCHMARK_URL=$(pulumi stack output url)
+  BENCHMARK_URL=$(pulumi stack output url -s "infra$STACK_SUFFIX")
 
   echo "Write URL to .env"
   echo "BENCHMARK_URL=\"$BENCHMARK_URL?trigger=serviceBus&input=$SERVICE_BUS_NAMESPACE,$TOPIC_NAME\"" >>$FILE_NAME
@@ -217,20 +233,20 @@ deploy_eventHub_trigger() {
   deploy_shared_resources
 
   # Deploy database trigger
-  cd eventHub/ && pulumi stack select trigger -c && pulumi up -f -y
+  cd eventHub/ && pulumi stack select "trigger$STACK_SUFFIX" -c && pulumi up -f -y -s "trigger$STACK_SUFFIX"
 
   # Get timer function app name and trigger name
-  EVENT_HUB_NAME=$(pulumi stack output eventHubName)
-  EVENT_HUB_NAMESPACE=$(pulumi stack output eventHubNamespace)
-  FUNCTION_APP=$(pulumi stack output functionApp)
+  EVENT_HUB_NAME=$(pulumi stack output eventHubName -s "trigger$STACK_SUFFIX")
+  EVENT_HUB_NAMESPACE=$(pulumi stack output eventHubNamespace -s "trigger$STACK_SUFFIX")
+  FUNCTION_APP=$(pulumi stack output functionApp -s "trigger$STACK_SUFFIX")
 
   cd ..
 
   # Deploy infrastructure
-  cd infra/ && pulumi stack select infra -c && pulumi up -f -y
+  cd infra/ && pulumi stack select "infra$STACK_SUFFIX" -c && pulumi up -f -y -s "infra$STACK_SUFFIX"
 
   # Get url to benchmark gateway
-  BENCHMARK_URL=$(pulumi stack output url)
+  BENCHMARK_URL=$(pulumi stack output url -s "infra$STACK_SUFFIX")
 
   echo "Write URL to .env"
   echo "BENCHMARK_URL=\"$BENCHMARK_URL?trigger=eventHub&input=$EVENT_HUB_NAME,$EVENT_HUB_NAMESPACE\"" >>$FILE_NAME
@@ -245,20 +261,20 @@ deploy_eventGrid_trigger() {
   deploy_shared_resources
 
   # Deploy event grid trigger
-  cd eventGrid/ && pulumi stack select trigger -c && pulumi up -f -y
+  cd eventGrid/ && pulumi stack select "trigger$STACK_SUFFIX" -c && pulumi up -f -y -s "trigger$STACK_SUFFIX"
 
   # Get timer function app name and trigger name
-  EVENT_GRID_STORAGE_NAME=$(pulumi stack output eventGridStorageAccountName)
-  EVENT_GRID_CONTAINER_NAME=$(pulumi stack output eventGridStorageContainerName)
-  FUNCTION_APP=$(pulumi stack output functionApp)
+  EVENT_GRID_STORAGE_NAME=$(pulumi stack output eventGridStorageAccountName -s "trigger$STACK_SUFFIX")
+  EVENT_GRID_CONTAINER_NAME=$(pulumi stack output eventGridStorageContainerName -s "trigger$STACK_SUFFIX")
+  FUNCTION_APP=$(pulumi stack output functionApp -s "trigger$STACK_SUFFIX")
 
   cd ..
 
   # Deploy infrastructure
-  cd infra/ && pulumi stack select infra -c && pulumi up -f -y
+  cd infra/ && pulumi stack select "infra$STACK_SUFFIX" -c && pulumi up -f -y -s "infra$STACK_SUFFIX"
 
   # Get url to benchmark gateway
-  BENCHMARK_URL=$(pulumi stack output url)
+  BENCHMARK_URL=$(pulumi stack output url -s "infra$STACK_SUFFIX")
 
   echo "Write URL to .env"
   echo "BENCHMARK_URL=\"$BENCHMARK_URL?trigger=eventGrid&input=$EVENT_GRID_STORAGE_NAME,$EVENT_GRID_CONTAINER_NAME\"" >>$FILE_NAME
@@ -269,11 +285,14 @@ deploy_eventGrid_trigger() {
 }
 
 # Read input flags
-while getopts 't:r:l:' flag; do
+while getopts 't:r:l:i:e:p:' flag; do
   case "${flag}" in
   t) TRIGGER_TYPE="${OPTARG}" ;;
   r) RUNTIME="${OPTARG}" ;;
   l) LOCATION="${OPTARG}" ;;
+  i) STACK_SUFFIX="-${OPTARG}" ;;
+  e) FILE_NAME="../${OPTARG}" ;;
+  p) PHASE="${OPTARG}" ;;
   *) exit 1 ;;
   esac
 done
@@ -299,7 +318,9 @@ else
 fi
 
 # Decide which trigger to deploy based on input flag
-if [ "$TRIGGER_TYPE" = 'http' ]; then
+if [ "$PHASE" = 'shared' ]; then
+  deploy_shared_resources
+elif [ "$TRIGGER_TYPE" = 'http' ]; then
   deploy_http_trigger
 elif [ "$TRIGGER_TYPE" = 'storage' ]; then
   deploy_storage_trigger
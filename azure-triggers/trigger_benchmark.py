@@ -1,5 +1,6 @@
 import os
 import logging
+from contextlib import nullcontext
 from dotenv import load_dotenv
 
 
@@ -23,42 +24,72 @@ DO_INIT = True
 
 
 def prepare(spec):
-    # The DB trigger requires the Azure `func` tool we install in the official Pulumi image.
-    spec.build(PULUMI_FUNC_IMAGE)
-    # Initialization
-    if DO_INIT:
-        init = ['shared', spec['trigger'], 'infra']
-        init_cmd = ' && '.join([f"cd {i} && npm install && cd .." for i in init])
-        spec.run(init_cmd, image='node12.x')
-        if spec['trigger'] == 'database':
-            db_init_cmd = 'cd database/runtimes/node && npm install && npm run build'
-            spec.run(db_init_cmd, image='node12.x')
-    # Deployment
     deploy_cmd = f"bash deploy.sh -t {spec['trigger']} -l {spec['region']} -r {spec['runtime']}"
-    spec.run(deploy_cmd, image=PULUMI_FUNC_IMAGE)
+    if spec.instance():
+        deploy_cmd += f" -i {spec.instance()} -e {env_file(spec)}"
+    # The lock serializes the image build, npm installs, and shared stack updates
+    # across concurrent instances. The trigger and infra stacks deploy concurrently.
+    with spec.lock('shared'):
+        # The DB trigger requires the Azure `func` tool we install in the official Pulumi image.
+        spec.build(PULUMI_FUNC_IMAGE)
+        # Initialization
+        if DO_INIT:
+            # Skips projects with an unchanged package-lock.json
+            spec.npm_install(['shared', spec['trigger'], 'infra'])
+            if spec['trigger'] == 'database':
+                db_init_cmd = 'cd database/runtimes/node && npm install && npm run build'
+                spec.run(db_init_cmd, image='node12.x')
+        # Deploy shared resources
+        spec.run(f"{deploy_cmd} -p shared", image=PULUMI_FUNC_IMAGE)
+    # The DB trigger publishes its function into the function app of the shared stack
+    lock = spec.lock('shared') if spec['trigger'] == 'database' else nullcontext()
+    with lock:
+        spec.run(f"{deploy_cmd} -p trigger", image=PULUMI_FUNC_IMAGE)
     # Local mode:
     # run_cmd(deploy_cmd)
 
 
 def invoke(spec):
-    load_dotenv(override=True)
+    load_dotenv(env_file(spec), override=True)
     envs = {
-        'BENCHMARK_URL': os.getenv('BENCHMARK_URL')
+        'BENCHMARK_URL': os.getenv('BENCHMARK_URL'),
+        # Composite workloads can only target the deployed trigger
+        **spec.endpoint_envs({spec['trigger']: os.getenv('BENCHMARK_URL')})
     }
     spec.run_k6(envs)
 
 
 def cleanup(spec):
+    # Instances remove their stacks. Keep the shared stack for other instances.
+    remove = bool(spec.instance())
     destroy_cmd = (
-        'cd infra && pulumi destroy -f -y; cd ..'
-        f"; cd {spec['trigger']} && pulumi destroy -f -y; cd .."
-        '; cd shared && pulumi destroy -f -y; cd ..'
+        f"{pulumi_destroy_cmd('infra', spec.stack_name('infra'), remove)}"
+        f"; {pulumi_destroy_cmd(spec['trigger'], spec.stack_name('trigger'), remove)}"
     )
+    # The default instance destroys the shared stack last as it is a dependency.
+    if not spec.instance():
+        destroy_cmd += f"; {pulumi_destroy_cmd('shared', 'shared')}"
     spec.run(destroy_cmd, image=PULUMI_IMAGE)
     # Local mode:
     # run_cmd(cmd)
 
 
+def pulumi_destroy_cmd(project, stack, remove=False) -> str:
+    """Returns a command destroying a Pulumi `stack` of the `project` directory
+    and optionally removing the stack."""
+    cmd = f"cd {project} && pulumi destroy -f -y -s {stack}"
+    if remove:
+        cmd += f" && pulumi stack rm -y -s {stack}"
+    return f"{cmd}; cd .."
+
+
+def env_file(spec) -> str:
+    """Returns the .env file with the deployment outputs of a benchmark instance."""
+    if spec.instance():
+        return f".env.{spec.instance()}"
+    return '.env'
+
+
 def run_cmd(cmd):
     """Runs a given shell command locally.
     Requires all dependencies installed including:
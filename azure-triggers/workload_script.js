@@ -1,12 +1,31 @@
-import { check } from 'k6'
+import { check, sleep } from 'k6'
 import http from 'k6/http'
 import crypto from 'k6/crypto'
+import exec from 'k6/execution'
+import { SharedArray } from 'k6/data'
 
 const benchmark_url = __ENV.BENCHMARK_URL
 
-export default function() {
+// Precomputed request timestamps in milliseconds since the scenario start (uint32)
+// for open-loop replay of an arrival process (see WorkloadGenerator arrival_process)
+const arrivals = new SharedArray('arrivals', function () {
+    if (!__ENV.ARRIVALS_FILE) {
+        return []
+    }
+    return Array.from(new Uint32Array(open(__ENV.ARRIVALS_FILE, 'b')))
+})
+
+export function replayArrivals() {
+    const delay = arrivals[exec.scenario.iterationInTest] - (Date.now() - exec.scenario.startTime)
+    if (delay > 0) {
+        sleep(delay / 1000)
+    }
+    benchmarkRequest()
+}
+
+export default function benchmarkRequest() {
     const trace_header = getTraceHeader()
-    const res = http.get(benchmark_url, {
+    const res = http.get(endpointUrl(), {
         headers: {
             'traceparent': trace_header.header
         },	
@@ -25,6 +44,12 @@ export default function() {
     })
 }
 
+// Composite workloads select the URL of their scenario endpoint (e.g., BENCHMARK_URL_QUEUE)
+function endpointUrl() {
+    const endpoint = __ENV.ENDPOINT
+    return (endpoint && __ENV[`BENCHMARK_URL_${endpoint.toUpperCase()}`]) || benchmark_url
+}
+
 function getTraceHeader() {
     const trace_id = crypto.hexEncode(crypto.randomBytes(16))
     const parent_id = crypto.hexEncode(crypto.randomBytes(8))
@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 
-"""Script to analyze new traces.json files.
+"""Script to analyze new (compressed) traces.json files.
 Requires a Python environment with sb installed.
 """
 
@@ -10,6 +10,7 @@ import logging
 import sys
 import yaml
 from sb.sb import Sb
+from sb.trace_io import is_traces_file
 from data_importer import parse_provider
 
 
@@ -25,7 +26,7 @@ data_path = os.environ.get('SB_DATA_DIR') or default_data_path
 always_analyze = False
 
 print(f"Analyze new traces.json files in {data_path}")
-traces = list(data_path.glob('**/traces.json'))
+traces = [p for p in data_path.glob('**/traces.json*') if is_traces_file(p)]
 sb = Sb()
 for trace in traces:
     log_dir = trace.parent
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+# Usage:
+# 1) Open tmux
+# 2) Activate virtualenv: source sb-env/bin/activate
+# 3) Run ./burst.py 2>&1 | tee -a burst.log
+
+"""Burst workload
+Runs an experiment with bursts of simultaneous invocations separated by idle periods
+that force cold starts (e.g., 3 bursts of 100 invocations every 15 minutes).
+Triggers run concurrently as isolated benchmark instances (see sb.experiment_runner).
+"""
+
+import logging
+import sys
+from pathlib import Path
+from sb.sb import Sb
+from sb.experiment_runner import ExperimentRunner
+
+logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
+
+# IMPORTANT: Select provider here!
+PROVIDER = 'aws'  # aws or azure
+# Number of triggers tested at the same time. Use 1 to test triggers in succession.
+MAX_CONCURRENCY = 4
+
+
+# Path configuration
+aws_trigger_bench = Path('../aws-triggers/trigger_benchmark.py').resolve()
+azure_trigger_bench = Path('../azure-triggers/trigger_benchmark.py').resolve()
+trigger_bench = aws_trigger_bench if PROVIDER == 'aws' else azure_trigger_bench
+
+# Trigger configuration
+supported_triggers = {
+    'aws': ['http', 'storage', 'queue'],
+    'azure': ['http', 'storage', 'queue', 'database', 'serviceBus', 'eventHub', 'eventGrid', 'timer'],
+}
+logging.info(f"Using provider {PROVIDER}.")
+triggers = supported_triggers['aws'] if PROVIDER == 'aws' else supported_triggers['azure']
+
+# Burst workload (see WorkloadGenerator.burst_options)
+BURST_SIZES = [100]
+BURST_INTERVAL = 15 * 60  # seconds
+BURST_REPETITIONS = 3
+
+MINUTE = 60
+
+
+def experiment(sb):
+    """Tests a single trigger instance with a burst size."""
+    trigger = sb.bench.spec['trigger']
+    logging.info(f"Testing {trigger} trigger with bursts of {sb.bench.spec['burst_size']} ...")
+    try:
+        sb.prepare()
+        sb.wait(1 * MINUTE)
+        sb.invoke('burst', burst_size=sb.bench.spec['burst_size'],
+                  burst_interval=BURST_INTERVAL, burst_repetitions=BURST_REPETITIONS)
+        # Wait until traces are recorded and processed by the tracing infrastructure.
+        # * AWS X-Ray tends to be ready within 1-2 minutes for small bursts
+        # * Azure Insights can take over 5-10 minutes until the traces appear
+        sb.wait_for_traces(timeout=15 * MINUTE)
+        sb.get_traces()
+        # Save bandwidth by analyzing after downloading from the cloud host
+        # sb.analyze_traces()
+    finally:
+        # Destroy the trigger-specific resources of this instance
+        sb.cleanup()
+
+
+if __name__ == '__main__':
+    # Test all triggers concurrently with one isolated instance per trigger
+    runner = ExperimentRunner(trigger_bench, max_concurrency=MAX_CONCURRENCY,
+                              log_level='DEBUG', debug=True)
+    instances = {f"{t}{size}": {'label': f"burst_{size}_{t}", 'trigger': t, 'burst_size': size}
+                 for t in triggers for size in BURST_SIZES}
+    try:
+        runner.run(experiment, instances)
+    finally:
+        logging.info('Destroying all resources ...')
+        # The default instance also destroys the shared resources
+        sb = Sb(trigger_bench, log_level='DEBUG', debug=True)
+        sb.cleanup()
@@ -7,17 +7,21 @@
 
 """Constant workload
 Runs an experiment with a constant workload of 1 invocation per second for 60 minutes (3600 samples).
+Triggers run concurrently as isolated benchmark instances (see sb.experiment_runner).
 """
 
 import logging
 import sys
 from pathlib import Path
 from sb.sb import Sb
+from sb.experiment_runner import ExperimentRunner
 
 logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
 
 # IMPORTANT: Select provider here!
 PROVIDER = 'aws'  # aws or azure
+# Number of triggers tested at the same time. Use 1 to test triggers in succession.
+MAX_CONCURRENCY = 4
 
 
 # Path configuration
@@ -47,25 +51,38 @@ options = {
     }
 }
 
-# Initialize sb SDK
-sb = Sb(trigger_bench, log_level='DEBUG', debug=True)
-
-# Test all triggers in succession
 MINUTE = 60
-for trigger in triggers:
+
+
+def experiment(sb):
+    """Tests a single trigger instance."""
+    trigger = sb.bench.spec['trigger']
     logging.info(f"Testing {trigger} trigger ...")
-    sb.config.set('label', f"constant_1rps_60min_{trigger}")
-    sb.config.set('trigger', trigger)
-    sb.prepare()
-    sb.wait(1 * MINUTE)
-    sb.invoke('custom', workload_options=options)
-    # Wait until traces are recorded and processed by the tracing infrastructure.
-    # * AWS X-Ray tends to be ready within 1-2 minutes for small bursts
-    # * Azure Insights can take over 5-10 minutes until the traces appear
-    sb.wait(10 * MINUTE)
-    sb.get_traces()
-    # Save bandwidth by analyzing after downloading from the cloud host
-    # sb.analyze_traces()
+    try:
+        sb.prepare()
+        sb.wait(1 * MINUTE)
+        sb.invoke('custom', workload_options=options)
+        # Wait until traces are recorded and processed by the tracing infrastructure.
+        # * AWS X-Ray tends to be ready within 1-2 minutes for small bursts
+        # * Azure Insights can take over 5-10 minutes until the traces appear
+        sb.wait_for_traces(timeout=15 * MINUTE)
+        sb.get_traces()
+        # Save bandwidth by analyzing after downloading from the cloud host
+        # sb.analyze_traces()
+    finally:
+        # Destroy the trigger-specific resources of this instance
+        sb.cleanup()
+
 
-logging.info('Destroying all resources ...')
-sb.cleanup()
+if __name__ == '__main__':
+    # Test all triggers concurrently with one isolated instance per trigger
+    runner = ExperimentRunner(trigger_bench, max_concurrency=MAX_CONCURRENCY,
+                              log_level='DEBUG', debug=True)
+    instances = {t: {'label': f"constant_1rps_60min_{t}", 'trigger': t} for t in triggers}
+    try:
+        runner.run(experiment, instances)
+    finally:
+        logging.info('Destroying all resources ...')
+        # The default instance also destroys the shared resources
+        sb = Sb(trigger_bench, log_level='DEBUG', debug=True)
+        sb.cleanup()
@@ -5,6 +5,10 @@ import csv
 from datetime import datetime, timedelta
 import networkx as nx
 from more_itertools import peekable
+from sb.trace_io import open_traces
+import sb.trace_errors as te
+from sb.clock_skew import correct_clock_skew, estimate_offsets
+from sb.shape_index import SIGNATURE_FIELD, ShapeIndex, shape_index_file, topology_signature
 
 
 """
@@ -42,14 +46,15 @@ def timediff(start_time, end_time) -> timedelta:
     return t(end_time) - t(start_time)
 
 
-def create_span_graph(trace):
+def create_span_graph(trace, clock_offsets=None):
     """Returns a Networkx graph representing a single trace where
     each node represents a span (or trace segment in XRay terminology) and
     each edge represents a casual relationship.
+    clock_offsets: optional clock => offset (see clock_skew) to correct timestamps.
     """
     # Detect missing trace duration
     if 'Duration' not in trace:
-        raise Exception('Missing trace duration.')
+        raise te.TraceError(te.MISSING_DURATION, 'Missing trace duration.')
     # Parse double JSON-encoded XRay segments
     segments = parse_trace_segments(trace)
     graph_attr = {
@@ -64,7 +69,7 @@ def create_span_graph(trace):
         #     continue
         # Trace is not completed and hence some end_time is missing
         if segment.get('in_progress', False):
-            raise Exception(f"Segment {segment['id']} in progress.")
+            raise te.TraceError(te.IN_PROGRESS, f"Segment {segment['id']} in progress.")
         node_attr = {
             'doc': segment,
             'duration': duration(segment)
@@ -79,6 +84,9 @@ def create_span_graph(trace):
             G.graph['start'] = segment['id']
         add_subsegments_recursive(G, segment)
 
+    if clock_offsets:
+        # Keep the trace duration consistent with the corrected timestamps
+        G.graph['duration'] += timedelta(seconds=correct_clock_skew(segments, clock_offsets))
     add_global_stats(G)
     return G
 
@@ -125,7 +133,7 @@ def add_subsegments_recursive(G, segment):
         for subsegment in segment['subsegments']:
             # Trace is not completed and hence some end_time is missing
             if subsegment.get('in_progress', False):
-                raise Exception(f"Subsegment {subsegment['id']} in progress.")
+                raise te.TraceError(te.IN_PROGRESS, f"Subsegment {subsegment['id']} in progress.")
             attr = {
                 'doc': subsegment,
                 'duration': duration(subsegment),
@@ -160,7 +168,7 @@ def add_global_stats(G):
     # Iterate over all nodes to calculate global trace metrics
     for id, attr in G.nodes(data=True):
         if not attr:
-            raise Exception(f"Node {id} has empty attributes.")
+            raise te.TraceError(te.EMPTY_NODE, f"Node {id} has empty attributes.")
         doc = attr['doc']
         # Guess invocation type (i.e., how this trace has been invoked by its parent)
         # This cannot be done during graph construction due potentially missing parent.
@@ -176,7 +184,7 @@ def add_global_stats(G):
                     f"Incomplete trace {G.graph['trace_id']} because"
                     f" the parent node {parent_id} of node {id} is empty."
                 )
-                raise Exception(msg)
+                raise te.TraceError(te.MISSING_PARENT, msg)
         else:  # trace root
             attr['invocation_type'] = 'client'
         # Identify trace start and end times
@@ -201,7 +209,7 @@ def add_global_stats(G):
 
     # Validate if root node exists
     if 'start' not in G.graph:
-        raise Exception('Logical root node missing.')
+        raise te.TraceError(te.MISSING_ROOT, 'Logical root node missing.')
         # Alternative to exception: flag trace as incomplete and workaround the issue
         # Logical root missing. Assigning the earliest start time is the best we can do here.
         # logging.warning(msg)
@@ -216,7 +224,7 @@ def add_global_stats(G):
             f" does not match the earliest time (sub)segment {start}."
             ' Ensure that the trace is fully connected and there are no clock issues.'
         )
-        raise Exception(msg)
+        raise te.TraceError(te.START_MISMATCH, msg)
     # Validate trace duration against calculated trace duration but allowing for small margin
     if abs(G.graph['duration'] - timediff(start_time, end_time)) > TIMESTAMP_MARGIN:
         msg = (
@@ -225,7 +233,7 @@ def add_global_stats(G):
             ' based on start and end times.'
             ' Ensure that the trace is fully connected and there are no clock issues.'
         )
-        raise Exception(msg)
+        raise te.TraceError(te.DURATION_MISMATCH, msg)
 
     # Assign globals
     G.graph['end'] = end
@@ -249,7 +257,7 @@ def call_stack(G, end):
             loop_start_index = stack.index(node)
             loop = stack[loop_start_index:]
             logging.debug(f"Infinite loop: {loop}")
-            raise Exception(f"Detected infinite loop starting from node {node}")
+            raise te.TraceError(te.CYCLE, f"Detected infinite loop starting from node {node}")
         stack.append(node)
         node = next(G.predecessors(node), None)
     # Could indicate missing connection
@@ -369,8 +377,8 @@ def calculate_breakdown(G):
             #         })
 
     # Identify unique paths
-    # NOTE: currently treats cold-start as a different path.
-    # We might need some heuristic to identify services (alike in the XRay service map)
+    # NOTE: longest_path_names treats cold-start as a different path whereas
+    # the topology signature (see shape_index) folds cold starts in.
     G.graph['longest_path_arns'] = []
     G.graph['longest_path_names'] = []
     G.graph['longest_path_details'] = []
@@ -402,7 +410,9 @@ def calculate_breakdown(G):
         critical_path_details.append(f"{e['duration']} {e['type']}:{e['category']} \t{e['resource']}:{G.nodes[e['resource']]['doc']['name'] if e['resource'] else ''} \t{e.get('source', '')}=>{e.get('target', '')}")  # noqa: E501
         # Validation
         curr_duration += e['duration']
-        assert curr_duration == timediff(start, e['end_time']), f"Summed duration {curr_duration} does not match difference to trace start_time."  # noqa: E501
+        if curr_duration != timediff(start, e['end_time']):
+            msg = f"Summed duration {curr_duration} does not match difference to trace start_time."  # noqa: E501
+            raise te.TraceInvariantError(te.BREAKDOWN_MISMATCH, msg)
     G.graph['critical_path'] = critical_path
     G.graph['critical_path_details'] = critical_path_details
     # Checks
@@ -424,14 +434,18 @@ def calculate_breakdown(G):
     # potential clock synchronization issues.
     if cp_last_target != G.graph['end'] and cp_last_target != G.graph['start'] and G.nodes[cp_last_target]['doc']['end_time'] != G.graph['end_time']:  # noqa: E501
         msg = f"Segment with latest end time ({G.graph['end']}) does not match last target ({cp_last_target}) of critical path."  # noqa: E501
-        raise Exception(msg)
-    assert abs(G.graph['duration'] - curr_duration) < TIMESTAMP_MARGIN, f"Trace duration {G.graph['duration']} does not match latency breakdown {curr_duration} within margin {TIMESTAMP_MARGIN}."  # noqa: E501
+        raise te.TraceError(te.END_MISMATCH, msg)
+    if abs(G.graph['duration'] - curr_duration) >= TIMESTAMP_MARGIN:
+        msg = f"Trace duration {G.graph['duration']} does not match latency breakdown {curr_duration} within margin {TIMESTAMP_MARGIN}."  # noqa: E501
+        raise te.TraceInvariantError(te.BREAKDOWN_MISMATCH, msg)
     # NOTE: Possible false positive if custom instrumentation uses the name 'Initialization'
     # Checking the origin for AWS::Lambda::Function and only looking at the first subsegment
     # could make this more robust if needed
     num_init_segments = G.graph['longest_path_names'].count('Initialization')
-    err_msg = f"num_cold_starts ({G.graph['num_cold_starts']}) does not match the number of initialization segments ({num_init_segments})."  # noqa: E501
-    assert G.graph['num_cold_starts'] == num_init_segments, err_msg
+    if G.graph['num_cold_starts'] != num_init_segments:
+        err_msg = f"num_cold_starts ({G.graph['num_cold_starts']}) does not match the number of initialization segments ({num_init_segments})."  # noqa: E501
+        raise te.TraceInvariantError(te.COLD_START_MISMATCH, err_msg)
+    G.graph[SIGNATURE_FIELD] = topology_signature(G)
     return G
 
 
@@ -563,7 +577,7 @@ def pair_path(G, peek_iter, node, next_node):
         # This check ensures that time monotonically increases along the critical path
         # within a given tolerance threshold, hence avoiding negative timediff.
         if next_doc['start_time'] - doc['start_time'] + TIMESTAMP_THRESHOLD.total_seconds() < 0:
-            raise Exception(f"Negative time difference between current ({doc['id']}) and next ({next_doc['id']}) segment.")  # noqa: E501
+            raise te.TraceError(te.CLOCK_SKEW, f"Negative time difference between current ({doc['id']}) and next ({next_doc['id']}) segment.")  # noqa: E501
 
         # async doc transition to next_doc span
         critical_path.append({
@@ -760,8 +774,8 @@ CSV_FIELDS = [
 ]
 
 
-def extract_trace_breakdown(trace, fields=CSV_FIELDS):
-    G = create_span_graph(trace)
+def extract_trace_breakdown(trace, fields=CSV_FIELDS, clock_offsets=None):
+    G = create_span_graph(trace, clock_offsets)
     G = calculate_breakdown(G)
     trace_breakdown = []
     for field in fields:
@@ -770,44 +784,84 @@ def extract_trace_breakdown(trace, fields=CSV_FIELDS):
 
 
 class AwsTraceAnalyzer:
-    """Parses traces.json files downloaded by the AwsTraceDownloader:
+    """Parses (compressed) traces.json files downloaded by the AwsTraceDownloader:
     1) Saves a trace summary into trace_breakdown.csv
     2) Saves a log of invalid trace into invalid_traces.csv
+    3) Saves the number of invalid traces per error code into invalid_summary.csv
+    4) Saves the learned clock offsets into clock_offsets.csv (see clock_skew)
+    5) Saves trace ids and latency statistics per topology signature into shape_index.json
     """
 
-    def __init__(self, log_path) -> None:
+    def __init__(self, log_path, correct_clock_skew=True) -> None:
         self.log_path = log_path
+        self.correct_clock_skew = correct_clock_skew
 
     def analyze_traces(self):
+        clock_offsets = None
+        if self.correct_clock_skew:
+            clock_offsets = self.estimate_clock_offsets()
+        with open_traces(self.log_path) as traces_json:
+            self.analyze_lines(traces_json, clock_offsets)
+
+    def estimate_clock_offsets(self) -> dict:
+        """Learns clock offsets across all traces in a first pass over the traces file."""
+        return estimate_offsets(self.log_path)
+
+    def analyze_lines(self, lines, clock_offsets=None):
+        """Analyzes an iterable of JSON-formatted trace lines
+        (e.g., streamed from a trace downloader, see trace_pipeline).
+        Streamed traces are analyzed without clock skew correction because
+        learning the clock offsets requires all traces beforehand. The trace pipeline
+        re-analyzes them with correction once the download completes if necessary."""
+        # Avoid circular import because trace_shapes builds upon the general engine
+        from sb.trace_shapes import BatchBreakdown, BATCH_SIZE
         file = Path(self.log_path)
         breakdown_file = file.parent / 'trace_breakdown.csv'
         invalid_file = file.parent / 'invalid_traces.csv'
+        summary_file = file.parent / 'invalid_summary.csv'
 
         num_valid_traces = 0
         num_invalid_traces = 0
-        with open(file, 'r') as traces_json, \
-             open(breakdown_file, 'w') as traces_csv, \
+        summary = te.InvalidTraceSummary()
+        with open(breakdown_file, 'w') as traces_csv, \
              open(invalid_file, 'w') as invalid_csv:
             trace_writer = csv.writer(traces_csv, quoting=csv.QUOTE_MINIMAL)
-            trace_headers = CSV_FIELDS
+            trace_headers = [*CSV_FIELDS, SIGNATURE_FIELD]
             trace_writer.writerow(trace_headers)
             invalid_writer = csv.writer(invalid_csv, quoting=csv.QUOTE_MINIMAL)
-            invalid_headers = ['trace_id', 'message']
+            invalid_headers = ['trace_id', 'code', 'message']
             invalid_writer.writerow(invalid_headers)
-            for line in traces_json:
-                try:
-                    trace = json.loads(line)
-                    trace_breakdown = extract_trace_breakdown(trace, trace_headers)
-                    trace_writer.writerow(trace_breakdown)
-                    num_valid_traces += 1
-                except Exception as e:
+            # Vectorized breakdown for traces of known shapes (see trace_shapes)
+            batch = BatchBreakdown(trace_headers, clock_offsets)
+            shape_index = ShapeIndex()
+
+            def write_results():
+                nonlocal num_valid_traces, num_invalid_traces
+                for trace, result in batch.flush():
+                    if not isinstance(result, Exception):
+                        trace_writer.writerow(result)
+                        shape_index.add(dict(zip(trace_headers, result)))
+                        num_valid_traces += 1
+                        continue
                     trace_id = trace.get('Id')
-                    message = str(e)
-                    invalid_writer.writerow([trace_id, message])
+                    code = te.error_code(result)
+                    message = str(result)
+                    invalid_writer.writerow([trace_id, code, message])
+                    summary.add(code, trace_id)
                     logging.debug(f"Skip invalid trace {trace_id}. {message}")
                     num_invalid_traces += 1
 
-        logging.info(f"Analyzed {num_valid_traces} valid traces. Written to {breakdown_file}.")
+            for line in lines:
+                batch.add(line)
+                if len(batch) >= BATCH_SIZE:
+                    write_results()
+            write_results()
+
+        logging.info(f"Analyzed {num_valid_traces} valid traces ({batch.num_fast} via trace shapes). Written to {breakdown_file}.")  # noqa: E501
+        index_file = shape_index_file(self.log_path)
+        shape_index.save(index_file)
+        logging.info(f"Found {len(shape_index)} distinct trace topologies. Written to {index_file}.")  # noqa: E501
         if num_invalid_traces > 0:
             invalid_rate = round(num_invalid_traces / (num_valid_traces + num_invalid_traces) * 100, 2)  # noqa: E501
             logging.warning(f"Detected {num_invalid_traces} ({invalid_rate}%) invalid traces. Written to {invalid_file}.")  # noqa: E501
+        summary.save(summary_file, num_valid_traces + num_invalid_traces)
@@ -1,49 +1,86 @@
 import logging
 import json
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+from functools import partial
 import boto3
 from botocore.config import Config
 
+from sb.trace_waiter import wait_for_stable_count, expected_trace_count
+from sb.trace_io import traces_file, find_traces
+from sb.trace_index import IndexedTraceWriter
+from sb.trace_pipeline import open_pipeline
+
+# Time slices enumerated concurrently because get_trace_summaries paginates serially
+# and limits the time range per call (6 hours)
+SLICE_DURATION = timedelta(minutes=15)
+MAX_SLICE_DURATION = timedelta(hours=6)
+SLICE_WORKERS = 4
+# Concurrent batch_get_traces calls with at most 5 trace ids each
+FETCH_WORKERS = 4
+BATCH_SIZE = 5
+# Traces with in-progress segments are re-fetched after an exponential backoff
+RETRY_DELAY = 60
+RETRIES = 2
+
 
 class AwsTraceDownloader:
     """Implements get_traces(self) to download X-Ray traces using the AWS Python library boto3:
     https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/xray.html
     More documentation on getting data from X-Ray including example trace:
     https://docs.aws.amazon.com/xray/latest/devguide/xray-api-gettingdata.html
+    Config options:
+    * trace_filter: X-Ray FilterExpression selecting the traces of the benchmark, see:
+      https://docs.aws.amazon.com/xray/latest/devguide/xray-console-filters.html
+    * trace_services: list of service names (e.g., Lambda function names) used to derive
+      a trace_filter if none is configured. Benchmarks can set them in prepare.
+    * trace_sample_rate: fraction of traces to download (default: 1). Sampling is
+      deterministic and keeps connected traces together (see sample_key).
+    * trace_slice_minutes: duration of time slices enumerated concurrently (default: 15).
+    * trace_slice_workers: number of time slices enumerated concurrently (default: 4).
+    * trace_fetch_workers: number of concurrent batch_get_traces calls (default: 4).
+    * trace_retries: number of re-fetches for traces with in-progress segments (default: 2).
+    * trace_retry_delay: seconds before the first re-fetch, doubling for each retry (default: 60).
     """
 
     def __init__(self, spec) -> None:
         self.spec = spec
         # Configure AWS XRay client
         region = self.spec['region']
+        # Adaptive retries back off when concurrent slices exceed the X-Ray request rate
         my_config = Config(
-            region_name=region
+            region_name=region,
+            retries={'mode': 'adaptive', 'max_attempts': 10}
         )
         self.client = boto3.client('xray', config=my_config)
+        self.sleep = time.sleep
 
-    def get_traces(self):
+    def get_traces(self, analyzer_class=None):
         """Retrieves X-Ray traces from the last invocation:
         1. saves all trace ids in a trace_ids.txt
-        2. saves all actual trace data in traces.json
+        2. saves all actual trace data in traces.json.zst (see trace_compression)
+           and their positions in trace_index.db (see trace_index)
         3. saves unprocessed trace ids in unprocessed_trace_ids.txt
+        analyzer_class: optional trace analyzer (e.g., AwsTraceTriggerAnalyzer)
+                        analyzing the traces while downloading (see trace_pipeline).
         """
         start, end = self.spec.event_log.get_invoke_timespan()
         log_path = self.spec.logs_directory()
         trace_ids_file = log_path.joinpath('trace_ids.txt')
-        trace_file = log_path.joinpath('traces.json')
-        if trace_file.exists():
-            logging.error(f"Traces already exist under {trace_file} for this \
+        existing_file = find_traces(log_path)
+        if existing_file:
+            logging.error(f"Traces already exist under {existing_file} for this \
 invocation starting time. Aborting.")
             return None
+        trace_file = traces_file(log_path, self.spec['trace_compression'])
 
-        trace_ids = self.retrieve_trace_ids(start, end, trace_ids_file)
-
-        # Remove potential duplicates because boto3 BatchGetTraces fails if
-        # a chunk contains duplicate trace IDs, which can be common with 10000s of trace ids.
-        unique_trace_ids = list(set(trace_ids))
-        num_duplicate_ids = len(trace_ids) - len(unique_trace_ids)
-        logging.info(f"Removed {num_duplicate_ids} duplicate trace ids.")
+        sample_rate = self.spec['trace_sample_rate']
+        trace_ids = self.retrieve_trace_ids(start, end, trace_ids_file, sample_rate)
 
-        unprocessed_ids = self.retrieve_traces(unique_trace_ids, trace_file)
+        with open_pipeline(analyzer_class, trace_file) as pipeline:
+            unprocessed_ids = self.retrieve_traces(trace_ids, trace_file, pipeline)
         # Check and log for potential unprocessed trace ids
         if unprocessed_ids:
             logging.warning(f"Found {len(unprocessed_ids)} unprocessed trace ids.")
@@ -53,47 +90,225 @@ invocation starting time. Aborting.")
                     f.write("%s\n" % id)
 
         # Inform user
-        logging.info(f"Downloaded {len(trace_ids)} traces for invocations between \
+        sampled = f" (sample rate {sample_rate})" if sample_rate is not None else ''
+        logging.info(f"Downloaded {len(trace_ids)} traces{sampled} for invocations between \
 {start} and {end} into {trace_file}.")
 
-    def retrieve_trace_ids(self, start, end, trace_ids_file):
-        """Retrieve and save trace ids from X-Ray.
-        Returns a list of trace ids."""
-        # Configure trace summaries (ts) iterator using pagination
+    def wait_for_traces(self, expected=None, **kwargs) -> int:
+        """Waits until the number of X-Ray traces of the last invocation stabilizes near
+        the `expected` count (defaults to the number of k6 requests) and returns the count.
+        Supports the options of trace_waiter.wait_for_stable_count (e.g., timeout).
+        NOTE: Disconnected triggers (e.g., queue) produce two traces per request."""
+        start, end = self.spec.event_log.get_invoke_timespan()
+        if expected is None:
+            expected = expected_trace_count(self.spec)
+        return wait_for_stable_count(lambda: self.count_traces(start, end), expected, **kwargs)
+
+    def count_traces(self, start, end) -> int:
+        """Returns the number of X-Ray trace summaries between `start` and `end`
+        matching the trace_filter."""
+        slices = self.map_summaries(start, end, lambda page: len(page['TraceSummaries']))
+        return sum(sum(page_counts) for page_counts in slices)
+
+    def map_summaries(self, start, end, extract):
+        """Enumerates the pages of X-Ray trace summaries between `start` and `end`
+        in concurrent time slices. Yields a list with the result of `extract(page)`
+        for each page of a time slice as soon as the slice completes."""
+        slice_duration = SLICE_DURATION
+        if self.spec['trace_slice_minutes']:
+            slice_duration = timedelta(minutes=self.spec['trace_slice_minutes'])
+        slices = time_slices(start, end, min(slice_duration, MAX_SLICE_DURATION))
+        workers = self.spec['trace_slice_workers'] or SLICE_WORKERS
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(self.map_slice, s, e, extract) for s, e in slices]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def map_slice(self, start, end, extract) -> list:
         paginator = self.client.get_paginator('get_trace_summaries')
-        ts_iter = paginator.paginate(StartTime=start, EndTime=end)
+        return [extract(page) for page in paginator.paginate(**self.summary_params(start, end))]
+
+    def summary_params(self, start, end) -> dict:
+        """Returns the get_trace_summaries parameters with the optional FilterExpression."""
+        params = {'StartTime': start, 'EndTime': end}
+        expression = filter_expression(self.spec)
+        if expression:
+            params['FilterExpression'] = expression
+        return params
 
-        # Save trace ids to file
+    def retrieve_trace_ids(self, start, end, trace_ids_file, sample_rate=None):
+        """Retrieve and save unique trace ids from X-Ray matching the trace_filter.
+        Keeps a deterministic sample of `sample_rate` traces (default: all).
+        Returns a list of unique trace ids in the order of their retrieval."""
+        logging.info(f"Filtering trace summaries with {filter_expression(self.spec)}.")
+        # Remove duplicates because boto3 BatchGetTraces fails if a chunk contains
+        # duplicate trace IDs, which can be common with 10000s of trace ids
+        # (e.g., traces at the boundaries of time slices).
+        seen = set()
         trace_ids = []
+        num_duplicate_ids = 0
+        # Save trace ids to file while the time slices complete
         with open(trace_ids_file, 'w') as f:
-            for trace_summary in ts_iter:
-                batch_trace_ids = extract_trace_ids(trace_summary)
-                trace_ids.extend(batch_trace_ids)
-                for trace_id in batch_trace_ids:
-                    f.write(f"{trace_id}\n")
+            extract = partial(extract_trace_ids, sample_rate=sample_rate)
+            for pages in self.map_summaries(start, end, extract):
+                for batch_trace_ids in pages:
+                    for trace_id in batch_trace_ids:
+                        key = compact_trace_id(trace_id)
+                        if key in seen:
+                            num_duplicate_ids += 1
+                            continue
+                        seen.add(key)
+                        trace_ids.append(trace_id)
+                        f.write(f"{trace_id}\n")
+        logging.info(f"Removed {num_duplicate_ids} duplicate trace ids.")
         return trace_ids
 
-    def retrieve_traces(self, unique_trace_ids, trace_file):
+    def retrieve_traces(self, unique_trace_ids, trace_file, pipeline=None):
         """Retrieve and save full trace details in chunks from X-Ray.
         Returns a list of unprocessed trace ids.
+        Streams each trace line into the optional TracePipeline `pipeline`.
+        Defers traces with in-progress segments and re-fetches them later (see retry_in_progress).
         Output format: Every line contains a single JSON-formatted trace.
         Example output of a single trace (partial data):
         {"Id": "1-60be2454-2cb82d1221d24201751ea2e3", "Duration": 9.315, "LimitExceeded": false, "Segments": [{"Id": "050793ca38bd8ff2", "Document": "{\"id\":\"050793ca38bd8ff2\",..."}]}  # noqa: E501
         """
         unprocessed_ids = []
-        with open(trace_file, 'w') as f:
-            for trace_ids_batch in chunks(unique_trace_ids, 5):
-                paginator = self.client.get_paginator('batch_get_traces')
-                trace_iterator = paginator.paginate(TraceIds=trace_ids_batch)
-                for trace_batch in trace_iterator:
-                    unprocessed_ids.extend(trace_batch['UnprocessedTraceIds'])
-                    for trace in trace_batch['Traces']:
-                        f.write(json.dumps(trace) + '\n')
+        in_progress = []
+        with IndexedTraceWriter(trace_file) as f:
+            def write(trace):
+                line = json.dumps(trace) + '\n'
+                f.write(line)
+                if pipeline:
+                    pipeline.put(line)
+
+            for traces, batch_unprocessed_ids in self.fetch_traces(unique_trace_ids):
+                unprocessed_ids.extend(batch_unprocessed_ids)
+                for trace in traces:
+                    if is_in_progress(trace):
+                        in_progress.append(trace)
+                    else:
+                        write(trace)
+            # Merge completed versions of deferred traces into the same file
+            for trace in self.retry_in_progress(in_progress):
+                write(trace)
         return unprocessed_ids
 
+    def fetch_traces(self, trace_ids):
+        """Fetches traces with concurrent batch_get_traces calls and yields tuples of
+        (traces, unprocessed trace ids) per batch as they complete."""
+        workers = self.spec['trace_fetch_workers'] or FETCH_WORKERS
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(self.fetch_batch, batch)
+                       for batch in chunks(trace_ids, BATCH_SIZE)]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def fetch_batch(self, trace_ids) -> tuple:
+        traces = []
+        unprocessed_ids = []
+        paginator = self.client.get_paginator('batch_get_traces')
+        for trace_batch in paginator.paginate(TraceIds=trace_ids):
+            traces.extend(trace_batch['Traces'])
+            unprocessed_ids.extend(trace_batch['UnprocessedTraceIds'])
+        return traces, unprocessed_ids
+
+    def retry_in_progress(self, traces):
+        """Re-fetches `traces` with in-progress segments (typically fetched too early)
+        after an exponential backoff and yields their completed versions.
+        Finally yields the latest versions of traces still in progress such that
+        analyzers report them as invalid (error code in_progress)."""
+        pending = {trace['Id']: trace for trace in traces}
+        retries = self.spec['trace_retries'] if self.spec['trace_retries'] is not None else RETRIES  # noqa: E501
+        delay = self.spec['trace_retry_delay'] or RETRY_DELAY
+        num_recovered = 0
+        for _ in range(retries):
+            if not pending:
+                break
+            logging.info(f"Re-fetching {len(pending)} traces in progress after {delay}s ...")
+            self.sleep(delay)
+            for fetched, _ in self.fetch_traces(list(pending)):
+                for trace in fetched:
+                    if is_in_progress(trace):
+                        pending[trace['Id']] = trace
+                    elif pending.pop(trace['Id'], None) is not None:
+                        num_recovered += 1
+                        yield trace
+            delay *= 2
+        if num_recovered > 0:
+            logging.info(f"Recovered {num_recovered} traces that were in progress.")
+        if pending:
+            logging.warning(f"{len(pending)} traces remain in progress.")
+        yield from pending.values()
+
+
+def is_in_progress(trace) -> bool:
+    """Returns True if any (sub)segment of a trace is in progress.
+    Searches the compact JSON segment documents without parsing them."""
+    return any('"in_progress":true' in segment['Document'] for segment in trace['Segments'])
+
+
+def extract_trace_ids(trace_summaries, sample_rate=None):
+    return [trace['Id'] for trace in trace_summaries['TraceSummaries']
+            if is_sampled(sample_key(trace), sample_rate)]
+
+
+def time_slices(start, end, duration) -> list:
+    """Splits the timespan between `start` and `end` into (start, end) tuples of
+    at most `duration` each."""
+    slices = []
+    while start < end:
+        slice_end = min(start + duration, end)
+        slices.append((start, slice_end))
+        start = slice_end
+    return slices
+
+
+def compact_trace_id(trace_id):
+    """Returns the 96-bit X-Ray trace id (e.g., 1-5759e988-bd862e3fe1be46a994272793)
+    as integer, which takes about half the memory of the string in a set.
+    Returns other formats unchanged."""
+    parts = trace_id.split('-')
+    if len(parts) == 3 and parts[0] == '1':
+        try:
+            return int(parts[1] + parts[2], 16)
+        except ValueError:
+            pass
+    return trace_id
+
+
+def filter_expression(spec):
+    """Returns the X-Ray FilterExpression for the configured trace_filter or
+    trace_services or None if neither is configured.
+    Example: trace_services: [fn1, fn2] => service("fn1") OR service("fn2")"""
+    if spec['trace_filter']:
+        return spec['trace_filter']
+    services = spec['trace_services']
+    if services:
+        return ' OR '.join(f"service(\"{service}\")" for service in services)
+    return None
+
+
+def sample_key(trace_summary) -> str:
+    """Returns the key for sampling a trace summary: the root_trace_id annotation of
+    disconnected traces (see aws_trace_trigger_analyzer) or otherwise the trace id.
+    Hence, a disconnected child trace is sampled together with its parent trace."""
+    values = trace_summary.get('Annotations', {}).get('root_trace_id', [])
+    for value in values:
+        root_trace_id = value.get('AnnotationValue', {}).get('StringValue')
+        if root_trace_id:
+            return root_trace_id
+    return trace_summary['Id']
+
 
-def extract_trace_ids(trace_summaries):
-    return [trace['Id'] for trace in trace_summaries['TraceSummaries']]
+def is_sampled(key, sample_rate=None) -> bool:
+    """Deterministically keeps a `sample_rate` fraction of keys by hashing them with CRC32.
+    The same key is always sampled the same way such that repeated downloads are consistent
+    and samples with a lower rate are subsets of samples with a higher rate."""
+    if sample_rate is None or sample_rate >= 1:
+        return True
+    if sample_rate <= 0:
+        raise ValueError(f"Invalid trace_sample_rate {sample_rate}. Must be in (0, 1].")
+    return zlib.crc32(key.encode()) < sample_rate * 2**32
 
 
 # Source: https://stackoverflow.com/a/312464/6875981
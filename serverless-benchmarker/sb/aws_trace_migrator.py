@@ -1,7 +1,8 @@
 import json
-from pathlib import Path
 import shutil
 
+from sb.trace_io import open_traces, with_stem
+
 
 def migrate_traces(traces_path, replace=False):
     """Migrates a traces.json file in the old single line JSON format
@@ -12,10 +13,11 @@ def migrate_traces(traces_path, replace=False):
     After:
     {"Id": "1-60be2454-2cb82d1221d24201751ea2e3", ... }
     {"Id": "1-60be244d-29f4c8461b7effa2caaa0848", ... }
+    Compressed files (e.g., traces.json.zst) are migrated into the same compression.
     """
-    with open(traces_path) as traces_file:
-        new_traces_path = Path(traces_path).parent / 'traces_v2.json'
-        with open(new_traces_path, 'w') as new_traces_file:
+    with open_traces(traces_path) as traces_file:
+        new_traces_path = with_stem(traces_path, 'traces_v2')
+        with open_traces(new_traces_path, 'w') as new_traces_file:
             # NOTE: Loading potentially large (GBs) file into memory
             traces = json.load(traces_file)
             for trace in traces.values():
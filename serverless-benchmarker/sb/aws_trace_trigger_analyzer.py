@@ -4,6 +4,9 @@ from datetime import datetime
 import csv
 import re
 from sb.aws_trace_analyzer import parse_trace_segments
+from sb.clock_skew import correct_clock_skew, estimate_offsets
+from sb.trace_io import open_traces
+import sb.trace_errors as te
 import logging
 
 
@@ -49,14 +52,17 @@ def extract_trace_id(trace_line) -> str:
 # 2) Add "parent_id" to first document in child trace without parent_id
 #    (e.g., 40cfcf43ef5ae6ab in Queue example from 2022-04-01_01-11-31)
 # 3) Update duration with as rounded timediff between earliest and latest timestamp
-def merge_and_analyze_traces(parent_line, child_line) -> dict():
+def merge_and_analyze_traces(parent_line, child_line, clock_offsets=None) -> dict():
     """Merges two disconnected traces into a single parsed trace document.
     Notice that the subsegments are already parsed unlike the traces from the API.
+    clock_offsets: optional clock => offset (see clock_skew) to correct timestamps.
     """
     parent_trace = json.loads(parent_line)
     parent_segments = parse_trace_segments(parent_trace)
     child_trace = json.loads(child_line)
     child_segments = parse_trace_segments(child_trace)
+    if clock_offsets:
+        correct_clock_skew(parent_segments + child_segments, clock_offsets)
 
     acc = dict()
     acc['root_trace_id'] = parent_trace.get('Id')
@@ -72,10 +78,12 @@ def merge_and_analyze_traces(parent_line, child_line) -> dict():
     return acc
 
 
-def analyze_trace(line) -> dict():
+def analyze_trace(line, clock_offsets=None) -> dict():
     """Analyzes a single trace line."""
     trace = json.loads(line)
     segments = parse_trace_segments(trace)
+    if clock_offsets:
+        correct_clock_skew(segments, clock_offsets)
 
     acc = dict()
     acc['root_trace_id'] = trace.get('Id')
@@ -129,9 +137,9 @@ def extract_result(segment, acc):
             # Function2: coldstart flag
             acc['coldstart_f2'] = is_coldstart(segment)
     if segment.get('in_progress'):
-        raise Exception(f"Segment {segment.get('id')} in progress.")
+        raise te.TraceError(te.IN_PROGRESS, f"Segment {segment.get('id')} in progress.")
     if segment.get('error'):
-        raise Exception(f"Segment {segment.get('id')} has an error.")
+        raise te.TraceError(te.SEGMENT_ERROR, f"Segment {segment.get('id')} has an error.")
 
     return acc
 
@@ -156,9 +164,11 @@ def is_coldstart(segment) -> bool:
 
 # TODO: Add unit tests. Suggested execution: 2022-04-01_01-11-31
 class AwsTraceTriggerAnalyzer:
-    """Parses traces.json files downloaded by the AwsTraceDownloader:
+    """Parses (compressed) traces.json files downloaded by the AwsTraceDownloader:
     1) Saves a trace trigger summary into trigger.csv
     2) Saves a log of invalid trace into trigger_invalid_traces.csv
+    3) Saves the number of invalid traces per error code into trigger_invalid_summary.csv
+    4) Saves the learned clock offsets into clock_offsets.csv (see clock_skew)
 
     Limitation: This analyzer is not generic. It expects a custom trace
     with two Lambda functions where Function1 (F1) triggers Function2 (F2)
@@ -168,13 +178,27 @@ class AwsTraceTriggerAnalyzer:
     for correlating disconnected traces through a common `root_trace_id`.
     """
 
-    def __init__(self, log_path) -> None:
+    def __init__(self, log_path, correct_clock_skew=True) -> None:
         self.log_path = log_path
+        self.correct_clock_skew = correct_clock_skew
 
     def analyze_traces(self):
+        clock_offsets = None
+        if self.correct_clock_skew:
+            clock_offsets = estimate_offsets(self.log_path)
+        with open_traces(self.log_path) as traces_json:
+            self.analyze_lines(traces_json, clock_offsets)
+
+    def analyze_lines(self, lines, clock_offsets=None):
+        """Analyzes an iterable of JSON-formatted trace lines
+        (e.g., streamed from a trace downloader, see trace_pipeline).
+        Streamed traces are analyzed without clock skew correction because
+        learning the clock offsets requires all traces beforehand. The trace pipeline
+        re-analyzes them with correction once the download completes if necessary."""
         file = Path(self.log_path)
         trigger_file = file.parent / 'trigger.csv'
         invalid_file = file.parent / 'trigger_invalid_traces.csv'
+        summary_file = file.parent / 'trigger_invalid_summary.csv'
 
         # Dictionary: trace_id (str) => parent trace payload (str)
         # for caching unmatched parent traces. This typically refers to
@@ -186,8 +210,8 @@ class AwsTraceTriggerAnalyzer:
         children = dict()
         num_valid_traces = 0
         num_invalid_traces = 0
-        with open(file, 'r') as traces_json, \
-             open(trigger_file, 'w') as traces_csv, \
+        summary = te.InvalidTraceSummary()
+        with open(trigger_file, 'w') as traces_csv, \
              open(invalid_file, 'w') as invalid_csv:
 
             receiver_timestamps = [f"t{n+4}" for n in range(1, NUM_RECEIVER_TIMESTAMPS + 1)]
@@ -198,15 +222,15 @@ class AwsTraceTriggerAnalyzer:
                                           fieldnames=trace_headers)
             trace_writer.writeheader()
             invalid_writer = csv.writer(invalid_csv, quoting=csv.QUOTE_MINIMAL)
-            invalid_headers = ['trace_id', 'message']
+            invalid_headers = ['trace_id', 'code', 'message']
             invalid_writer.writerow(invalid_headers)
-            for line in traces_json:
+            for line in lines:
                 try:
                     root_trace_id = extract_root_trace_id(line)
                     if root_trace_id:  # child trace
                         if root_trace_id in parents:
                             # logging.debug('Found matching parent for this child trace.')
-                            trigger = merge_and_analyze_traces(parents[root_trace_id], line)
+                            trigger = merge_and_analyze_traces(parents[root_trace_id], line, clock_offsets)  # noqa: E501
                             trace_writer.writerow(trigger)
                             num_valid_traces += 1
                             del parents[root_trace_id]
@@ -216,7 +240,7 @@ class AwsTraceTriggerAnalyzer:
                         trace_id = extract_trace_id(line)
                         if trace_id in children:
                             # logging.debug('Found matching child for this parent trace.')
-                            trigger = merge_and_analyze_traces(line, children[trace_id])
+                            trigger = merge_and_analyze_traces(line, children[trace_id], clock_offsets)  # noqa: E501
                             trace_writer.writerow(trigger)
                             num_valid_traces += 1
                             del children[trace_id]
@@ -224,24 +248,27 @@ class AwsTraceTriggerAnalyzer:
                             parents[trace_id] = line
                 except Exception as e:
                     trace_id = extract_trace_id(line)
-                    message = str(e)
-                    invalid_writer.writerow([trace_id, message])
+                    code = te.error_code(e)
+                    invalid_writer.writerow([trace_id, code, str(e)])
+                    summary.add(code, trace_id)
                     num_invalid_traces += 1
 
             # Analyze fully connected traces (i.e., no children found)
             if len(parents) > 0:
                 for trace_line in parents.values():
                     try:
-                        trigger = analyze_trace(trace_line)
+                        trigger = analyze_trace(trace_line, clock_offsets)
                         trace_writer.writerow(trigger)
                         num_valid_traces += 1
                     except Exception as e:
-                        trace_id = extract_trace_id(line)
-                        message = str(e)
-                        invalid_writer.writerow([trace_id, message])
+                        trace_id = extract_trace_id(trace_line)
+                        code = te.error_code(e)
+                        invalid_writer.writerow([trace_id, code, str(e)])
+                        summary.add(code, trace_id)
                         num_invalid_traces += 1
 
         logging.info(f"Analyzed {num_valid_traces} valid trigger traces. Written to {trigger_file}.")  # noqa: E501
         if num_invalid_traces > 0:
             invalid_rate = round(num_invalid_traces / (num_valid_traces + num_invalid_traces) * 100, 2)  # noqa: E501
             logging.warning(f"Detected {num_invalid_traces} ({invalid_rate}%) invalid traces. Written to {invalid_file}.")  # noqa: E501
+        summary.save(summary_file, num_valid_traces + num_invalid_traces)
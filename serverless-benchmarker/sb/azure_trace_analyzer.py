@@ -4,6 +4,8 @@ from pathlib import Path
 import csv
 import pandas as pd
 from sb.azure_trace_downloader import convert_insights_json_to_df
+from sb.trace_io import open_traces
+import sb.trace_errors as te
 
 
 # Number of additional timestamps in Function2
@@ -63,8 +65,10 @@ def extract_trigger_results(trace) -> dict:
 
 # TODO: Unify naming with AWS trigger => clarify that for TriggerBench
 class AzureTraceAnalyzer:
-    """Parses traces.json files downloaded by the AzureTraceDownloader:
+    """Parses (compressed) traces.json files downloaded by the AzureTraceDownloader:
     1) Saves a trigger results summary into `trigger.csv`
+    2) Saves a log of invalid traces into `invalid_traces.csv`
+    3) Saves the number of invalid traces per error code into `invalid_summary.csv`
     Limitation: A generic breakdown analyzer is currently not implemented.
     """
 
@@ -72,15 +76,22 @@ class AzureTraceAnalyzer:
         self.log_path = log_path
 
     def analyze_traces(self):
+        with open_traces(self.log_path) as traces_json:
+            self.analyze_lines(traces_json)
+
+    def analyze_lines(self, lines):
+        """Analyzes an iterable of JSON-formatted trace lines
+        (e.g., streamed from a trace downloader, see trace_pipeline)."""
         file = Path(self.log_path)
         # breakdown_file = file.parent / 'trace_breakdown.csv'
         invalid_file = file.parent / 'invalid_traces.csv'
         trigger_file = file.parent / 'trigger.csv'
+        summary_file = file.parent / 'invalid_summary.csv'
 
         num_valid_traces = 0
         num_invalid_traces = 0
-        with open(file, 'r') as traces_json, \
-             open(trigger_file, 'w') as trigger_csv, \
+        summary = te.InvalidTraceSummary()
+        with open(trigger_file, 'w') as trigger_csv, \
              open(invalid_file, 'w') as invalid_csv:
             receiver_timestamps = [f"t{n+4}" for n in range(1, NUM_RECEIVER_TIMESTAMPS + 1)]
             trace_headers = ['root_trace_id', 'child_trace_id', 't1', 't2', 't3', 't4',
@@ -90,9 +101,9 @@ class AzureTraceAnalyzer:
                                           fieldnames=trace_headers)
             trace_writer.writeheader()
             invalid_writer = csv.writer(invalid_csv, quoting=csv.QUOTE_MINIMAL)
-            invalid_headers = ['root_trace_id', 'receiver_trace_id', 'message']
+            invalid_headers = ['root_trace_id', 'receiver_trace_id', 'code', 'message']
             invalid_writer.writerow(invalid_headers)
-            for index, line in enumerate(traces_json):
+            for index, line in enumerate(lines):
                 try:
                     trace = json.loads(line)
                     df = convert_insights_json_to_df(trace)
@@ -105,11 +116,14 @@ class AzureTraceAnalyzer:
                     trace_writer.writerow(trigger_results)
                     num_valid_traces += 1
                 except Exception as e:
-                    invalid_row = [trace['attrs'].get('rootTraceId'), trace['attrs'].get('traceId'), str(e)]  # noqa: E501
+                    code = te.error_code(e)
+                    invalid_row = [trace['attrs'].get('rootTraceId'), trace['attrs'].get('traceId'), code, str(e)]  # noqa: E501
                     invalid_writer.writerow(invalid_row)
+                    summary.add(code, trace['attrs'].get('rootTraceId'))
                     num_invalid_traces += 1
 
         logging.info(f"Analyzed {num_valid_traces} valid trigger traces. Written to {trigger_file}.")  # noqa: E501
         if num_invalid_traces > 0:
             invalid_rate = round(num_invalid_traces / (num_valid_traces + num_invalid_traces) * 100, 2)  # noqa: E501
             logging.warning(f"Detected {num_invalid_traces} ({invalid_rate}%) invalid traces. Written to {invalid_file}.")  # noqa: E501
+        summary.save(summary_file, num_valid_traces + num_invalid_traces)
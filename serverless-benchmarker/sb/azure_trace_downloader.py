@@ -7,6 +7,11 @@ import pandas as pd
 import os
 from dotenv import load_dotenv
 
+from sb.trace_waiter import wait_for_stable_count, expected_trace_count
+from sb.trace_io import traces_file
+from sb.trace_index import IndexedTraceWriter
+from sb.trace_pipeline import open_pipeline
+
 
 def convert_insights_json_to_df(json_data) -> pd.DataFrame:
     """Converts a JSON response from Azure Insights into a Pandas data frame.
@@ -24,6 +29,15 @@ def convert_insights_json_to_df(json_data) -> pd.DataFrame:
     return df
 
 
+def experiment_time_filter(start, end) -> str:
+    """Returns a KQL filter for the timespan between the datetimes `start` and `end`."""
+    # MAYBE: Could probably simplify to .isoformat() as described here:
+    # https://stackoverflow.com/questions/2150739/iso-time-iso-8601-in-python
+    start_time = datetime.fromtimestamp(datetime.timestamp(start), tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")  # noqa: E501
+    end_time = datetime.fromtimestamp(datetime.timestamp(end), tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")  # noqa: E501
+    return f"timestamp between(datetime({start_time}) .. datetime({end_time}))"
+
+
 class AzureTraceDownloader:
     """Implements get_traces(self) to download Microsoft Azure Insights traces using
     * Azure Application Insights API Reference: https://docs.microsoft.com/en-us/rest/api/application-insights/query/get    # noqa: E501
@@ -47,20 +61,18 @@ class AzureTraceDownloader:
         self.api_app_id = os.environ['INSIGHTS_APP_ID']
         self.api_key = os.environ['INSIGHTS_API_KEY']
 
-    def get_traces(self):
+    def get_traces(self, analyzer_class=None):
         """Retrieves Azure Insights traces from the last invocation.
+        analyzer_class: optional trace analyzer (e.g., AzureTraceAnalyzer)
+                        analyzing the traces while downloading (see trace_pipeline).
         """
         start, end = self.spec.event_log.get_invoke_timespan()
         log_path = self.spec.logs_directory()
 
         trace_ids_file = log_path.joinpath('trace_ids.txt')
-        trace_file = log_path.joinpath('traces.json')
+        trace_file = traces_file(log_path, self.spec['trace_compression'])
 
-        # MAYBE: Could probably simplify to .isoformat() as described here:
-        # https://stackoverflow.com/questions/2150739/iso-time-iso-8601-in-python
-        start_time = datetime.fromtimestamp(datetime.timestamp(start), tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")  # noqa: E501
-        end_time = datetime.fromtimestamp(datetime.timestamp(end), tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")  # noqa: E501
-        experiment_time = f"timestamp between(datetime({start_time}) .. datetime({end_time}))"
+        experiment_time = experiment_time_filter(start, end)
 
         # > Retrieve trace ids
 
@@ -88,7 +100,9 @@ class AzureTraceDownloader:
         df.to_csv(trace_ids_file, index=False)
 
         # Retrieve details for each trace
-        with open(trace_file, 'w') as f:
+        # The pipeline exits after the writer completed the traces file (see trace_pipeline)
+        with open_pipeline(analyzer_class, trace_file) as pipeline, \
+             IndexedTraceWriter(trace_file) as f:
             for rootTraceId, traceId in zip(df['rootTraceId'], df['traceId']):
                 # WARNING: This query is computationally very expensive and slow.
                 # It would be faster to download everything, potentially for each
@@ -110,12 +124,35 @@ class AzureTraceDownloader:
                     'rootTraceId': rootTraceId,
                     'traceId': traceId
                 }
-                f.write(json.dumps(trace) + '\n')
+                line = json.dumps(trace) + '\n'
+                f.write(line)
+                if pipeline:
+                    pipeline.put(line)
 
         # Inform user
         logging.info(f"Downloaded {len(df)} traces for invocations between \
 {start} and {end} into {trace_file}.")
 
+    def wait_for_traces(self, expected=None, **kwargs) -> int:
+        """Waits until the number of Insights traces of the last invocation stabilizes near
+        the `expected` count (defaults to the number of k6 requests) and returns the count.
+        Supports the options of trace_waiter.wait_for_stable_count (e.g., timeout)."""
+        start, end = self.spec.event_log.get_invoke_timespan()
+        if expected is None:
+            expected = expected_trace_count(self.spec)
+        return wait_for_stable_count(lambda: self.count_traces(start, end), expected, **kwargs)
+
+    def count_traces(self, start, end) -> int:
+        """Returns the number of receiver traces between `start` and `end`
+        using a cheap count query (see trace ids query in get_traces)."""
+        count_query = f"""
+            dependencies
+            | where {experiment_time_filter(start, end)} and name == "receiver0"
+            | count
+            """
+        df = convert_insights_json_to_df(self.get_query_result_json(count_query))
+        return int(df.iloc[0, 0])
+
     def retrieve_all_details(self, experiment_time):
         """Retrieves json of all detailed traces available during experiment time without correlation.
         Available dimensions:
@@ -10,6 +10,8 @@ from mergedeep import merge
 
 from sb.event_log import EventLog
 from sb.benchmark_spec import BenchmarkSpec
+from sb.workload_analyzer import WorkloadAnalyzer
+from sb.workload_generator import WorkloadGenerator
 
 HOOKS = ['prepare', 'invoke', 'cleanup']
 BENCHMARK_CONFIG = 'BENCHMARK_CONFIG'
@@ -19,11 +21,11 @@ SB_CONFIG = 'config.yml'
 
 class Benchmark:
 
-    def initialize(benchmark_file):
+    def initialize(benchmark_file, instance=None):
         file_path = Path(benchmark_file).resolve()
         module_name = 'benchmark.plugin'
         plugin = Benchmark.load_module(file_path, module_name)
-        bench = Benchmark(plugin, file_path)
+        bench = Benchmark(plugin, file_path, instance=instance)
         bench.validate()
         bench.load_spec(plugin.BENCHMARK_CONFIG)
         return bench
@@ -34,11 +36,14 @@ class Benchmark:
         module_spec.loader.exec_module(mod)
         return mod
 
-    def __init__(self, plugin, file_path, spec=None):
+    def __init__(self, plugin, file_path, spec=None, instance=None):
         self.plugin = plugin
         self.file_path = file_path
         self.path = self.file_path.parent
         self.spec = spec
+        # Optional name to run multiple isolated copies of the same benchmark concurrently.
+        # Each instance has its own sb config, logs directory, and cloud stacks.
+        self.instance = instance
 
     @property
     def name(self):
@@ -80,7 +85,8 @@ class Benchmark:
                scale_factor=1, scale_type='linear',
                workload_trace=None, workload_options=None,
                scale_rate_per_second=None,
-               seconds_to_skip=3 * 60):
+               seconds_to_skip=3 * 60,
+               **generator_options):
         logging.info('invoke()')
         start = self.log_start('invoke')
         # string comparison handles Docker-mode case where None is passed as string
@@ -93,6 +99,12 @@ class Benchmark:
         self.spec['workload_trace'] = workload_trace
         self.spec['scale_rate_per_second'] = scale_rate_per_second
         self.spec['seconds_to_skip'] = seconds_to_skip
+        # Optional generator options overwrite the config only if specified
+        unknown_options = set(generator_options) - set(WorkloadGenerator.OPTIONS)
+        if unknown_options:
+            raise TypeError(f"invoke() got unexpected keyword arguments {sorted(unknown_options)}")
+        for key, value in generator_options.items():
+            self.spec[key] = value
 
         self.save_config()
         self.spec.create_workload_options_file(self.path, workload_options)
@@ -100,6 +112,19 @@ class Benchmark:
         end = self.log_end('invoke')
         self.save_config()
         logging.info(f"[{self.spec.name}]invoke_time={end - start}")
+        self.analyze_workload()
+
+    def analyze_workload(self):
+        """Validates the achieved k6 arrival rates of the last invocation if available.
+        Never fails because the validation is only informative."""
+        metrics_file = self.spec.workload_log_file()
+        if not metrics_file.is_file():
+            return
+        _, options_file = self.spec.workload_file_paths()
+        try:
+            WorkloadAnalyzer(metrics_file, self.path / options_file).analyze_workload()
+        except Exception as e:
+            logging.warning(f"Failed to validate the workload: {e}")
 
     def cleanup(self):
         logging.info('cleanup()')
@@ -152,6 +177,8 @@ class Benchmark:
                 'host_user_group': self.host_user_group()
             }
         }
+        if self.instance:
+            sb_config['sb']['instance'] = self.instance
         return sb_config
 
     def host_user_group(self):
@@ -186,7 +213,7 @@ class Benchmark:
         if path:
             config_file = path
         config_dir = config_file.parent
-        config_dir.mkdir(exist_ok=True)
+        config_dir.mkdir(parents=True, exist_ok=True)
         with open(config_file, 'w') as file:
             yaml.dump(self.spec.config, file)
 
@@ -224,4 +251,8 @@ class Benchmark:
             logging.warning(f"No sb config exists to remove at {self.config_path()}.")
 
     def config_path(self) -> Path:
+        """Returns the path to the sb config, which is separate for each instance.
+        Example: .sb/config.yml or .sb/http/config.yml for the instance `http`"""
+        if self.instance:
+            return self.path.joinpath(SB_DIR, self.instance, SB_CONFIG).resolve()
         return self.path.joinpath(SB_DIR, SB_CONFIG).resolve()
@@ -1,13 +1,18 @@
 import json
+import hashlib
+from fractions import Fraction
 from pathlib import Path, PurePosixPath, PureWindowsPath
 from sb.event_log import EventLog
-import subprocess
 import os
 import shutil
-import platform
 import logging
 from subprocess import TimeoutExpired
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import networkx as nx
 
+from sb.file_lock import file_lock
+from sb.k6_metrics import K6MetricsFollower, merge_metrics
+from sb.executor import EXECUTORS, DockerExecutor, SshExecutor, win_vol  # noqa: F401
 from sb.provider import Provider
 from sb.workload_generator import WorkloadGenerator
 
@@ -16,18 +21,16 @@ logger = logging.getLogger('run')
 DEFAULT_TIMEOUT = 30  # seconds
 
 
-def win_vol(path) -> str:
-    r"""Converts a Windows path into a Docker-compatible path
-    without a colon. Returns Posix paths unchanged.
-    Example: win_vol(PureWindowsPath("C:\Users\joe\Projects"))
-    => "/C/Users/joe/Projects"
+def execution_segments(num_segments) -> tuple:
+    """Returns a tuple of a list with k6 execution segments that evenly split
+    a workload into `num_segments` parts and their execution segment sequence.
+    Example: execution_segments(2) => (['0:1/2', '1/2:1'], '0,1/2,1')
     """
-    if(isinstance(path, PureWindowsPath)):
-        posix_path = PurePosixPath(path)
-        path_without_colon = str(posix_path).replace(':\\', '')
-        return f"/{path_without_colon}"
-    else:
-        return path
+    if num_segments < 1:
+        raise ValueError(f"Invalid number of k6 segments {num_segments}. Must be at least 1.")
+    bounds = [str(Fraction(i, num_segments)) for i in range(num_segments + 1)]
+    segments = [f"{start}:{end}" for start, end in zip(bounds, bounds[1:])]
+    return segments, ','.join(bounds)
 
 
 class BenchmarkSpec:
@@ -61,6 +64,16 @@ class BenchmarkSpec:
         # Docs and Tags: https://hub.docker.com/r/loadimpact/k6
         'k6': 'loadimpact/k6:0.37.0'
     }
+    # Named Docker volumes persisting package manager caches across containers and runs.
+    # Mounted automatically for the given image aliases. Disable via `cache_volumes: false`.
+    CACHE_VOLUMES = {
+        'node12.x': {'sb-cache-npm': '/root/.npm'},
+        'python3.8': {'sb-cache-pip': '/root/.cache/pip'},
+        'python3.9': {'sb-cache-pip': '/root/.cache/pip'},
+        'go1.x': {'sb-cache-go-mod': '/go/pkg/mod', 'sb-cache-go-build': '/root/.cache/go-build'}
+    }
+    # Stamp file within node_modules containing the hash of the last successful npm install
+    NPM_INSTALL_STAMP = '.sb-npm-install'
 
     def __init__(self, config, name=None):
         self.config = config
@@ -70,6 +83,15 @@ class BenchmarkSpec:
         # Indicates whether the last `spec.run` command succeeded
         # Used to implement conditional `.sb` cleanup
         self.last_run_success = True
+        # Backend for executing spec.run() commands (Docker by default)
+        self.executor = DockerExecutor(self)
+
+    def set_executor(self, name):
+        """Selects the backend for executing spec.run() commands by `name`.
+        Supported: docker (default) | local
+        Raises a KeyError if the executor is not supported.
+        """
+        self.executor = EXECUTORS[name](self)
 
     def run_k6(self, envs={}, options='', image='k6'):
         """Runs k6 with automated workload injection and csv logging.
@@ -80,17 +102,105 @@ class BenchmarkSpec:
         envs: dict of environment variables
         options: optional k6 command line options https://k6.io/docs/using-k6/options
         image: the Docker image with k6 installation
+        The optional `k6_cpus` config (e.g., '0-3') pins k6 to a CPU set such that
+        concurrent load generators do not compete for the same CPUs.
+        Logs live throughput and latency statistics while k6 runs unless
+        the `k6_live_stats` config is false.
+        Distributes the workload across multiple k6 processes if configured (see run_k6_segments):
+        * k6_segments: number of local k6 processes (e.g., 2)
+        * k6_hosts: list of hosts with one k6 process each. Supports SSH hosts
+                    (e.g., an ~/.ssh/config alias) and 'local' (e.g., ['local', 'lg2'])
         """
         workload_script, workload_options = self.workload_file_paths()
-        cmd = (
+        envs = {**envs, **self.arrivals_envs(workload_script, workload_options)}
+        hosts = self['k6_hosts'] or ['local'] * (self['k6_segments'] or 1)
+        if hosts != ['local']:
+            self.run_k6_segments(hosts, envs, options, image)
+            return
+        cmd = self.k6_command(envs, options, workload_script, workload_options,
+                              self.workload_log_file())
+        follower = None
+        if self['k6_live_stats'] is not False:
+            follower = K6MetricsFollower(self.workload_log_file())
+            follower.start()
+        try:
+            self.run(cmd, image=image, cpus=self['k6_cpus'])
+        finally:
+            if follower:
+                follower.stop()
+
+    def run_k6_segments(self, hosts, envs, options, image):
+        """Splits the workload into one k6 execution segment per host, runs all segments
+        concurrently, and merges their CSV outputs into the k6_metrics.csv file.
+        k6 docs: https://k6.io/docs/using-k6/options/#execution-segment
+        Segments on SSH hosts upload the workload script and options into ~/sb-k6/<benchmark>
+        and download their metrics afterwards. Thus, scripts must not import local modules.
+        Live statistics (see K6MetricsFollower) are unavailable for segmented runs.
+        Raises an exception for failed segments after merging the metrics of all segments.
+        """
+        workload_script, workload_options = self.workload_file_paths()
+        segments, sequence = execution_segments(len(hosts))
+        metrics_file = self.workload_log_file()
+        part_files = [metrics_file.with_name(f"k6_metrics_{i}.csv") for i in range(len(hosts))]
+        logging.info(f"Running k6 in {len(hosts)} execution segments on {', '.join(hosts)} ...")
+        futures = []
+        with ThreadPoolExecutor(max_workers=len(hosts)) as pool:
+            for i, host in enumerate(hosts):
+                segment_options = (f"--execution-segment={segments[i]}"
+                                   f" --execution-segment-sequence={sequence} {options}")
+                if host == 'local':
+                    cmd = self.k6_command(envs, segment_options, workload_script,
+                                          workload_options, part_files[i])
+                    futures.append(pool.submit(self.execute, cmd, image, '/bin/sh',
+                                               f"[k6 {i}] ", self['k6_cpus']))
+                else:
+                    futures.append(pool.submit(self.run_remote_k6, host, i, envs,
+                                               segment_options, image, part_files[i]))
+        results = []
+        for i, future in enumerate(futures):
+            try:
+                results.append((i, *future.result()))
+            except Exception as e:
+                logging.error(f"k6 segment {i} on {hosts[i]} failed: {e}")
+                results.append((i, None, 1))
+        existing_parts = [f for f in part_files if f.is_file()]
+        if existing_parts:
+            merge_metrics(existing_parts, metrics_file)
+            for part_file in existing_parts:
+                part_file.unlink()
+        failed = [f"{i} on {hosts[i]}" for i, _, returncode in results if returncode not in (0, None)]  # noqa: E501
+        self.last_run_success = not failed
+        if failed and BenchmarkSpec.CHECK_RETURNCODE_DEFAULT:
+            raise Exception(f"The k6 execution segments {', '.join(failed)} exited unsuccessfully.")  # noqa: E501
+
+    def run_remote_k6(self, host, index, envs, options, image, part_file):
+        """Runs k6 on an SSH `host` and downloads its metrics into `part_file`.
+        Returns a tuple of the k6 stdout and return code."""
+        workload_script, workload_options = self.workload_file_paths()
+        remote_dir = f"sb-k6/{self.name}{f'_{self.instance()}' if self.instance() else ''}"
+        remote = SshExecutor(self, host, remote_dir)
+        files = [workload_script, workload_options]
+        if 'ARRIVALS_FILE' in envs:
+            files.append(BenchmarkSpec.arrivals_file(workload_options))
+            envs = {**envs, 'ARRIVALS_FILE': BenchmarkSpec.arrivals_file(workload_options).name}
+        remote.upload(files)
+        remote_metrics = f"k6_metrics_{index}.csv"
+        cmd = self.k6_command(envs, options, Path(workload_script).name,
+                              Path(workload_options).name, remote_metrics)
+        output, returncode = self.execute(cmd, image, '/bin/sh', f"[k6 {index}] ",
+                                          self['k6_cpus'], executor=remote)
+        remote.download(remote_metrics, part_file)
+        return output, returncode
+
+    def k6_command(self, envs, options, workload_script, workload_options, metrics_file) -> str:
+        return (
             "k6 run"
             f"{self.key_value_args(envs, '--env')}"
             f' --config "{workload_options}"'
-            f" --out csv={self.workload_log_file()}"
+            f" --out csv={metrics_file}"
             f" {options}"
             f" {workload_script}"
         )
-        self.run(cmd, image=image)
 
     def key_value_args(self, arg_dict, flag) -> str:
         """Converts a dict into key=value cli arguments with a flag.
@@ -103,10 +213,11 @@ class BenchmarkSpec:
         return envs_arg
 
     def run(self, cmd, image='alpine:3.12.0',
-            shell='/bin/sh', check=None) -> str:
+            shell='/bin/sh', check=None, cpus=None) -> str:
         """Runs a given `cmd` in a Docker `image` and returns its stdout.
         Mounts the root directory into the container as well as provider
         secrets if a provider is specified in the BENCHMARK_CONFIG.
+        In local mode (i.e., `--local`), the `cmd` runs directly on the host instead.
         image: supports global aliases as defined in IMAGES.
         Examples:
         * spec.run('pwd', image='alpine:3')
@@ -115,43 +226,30 @@ class BenchmarkSpec:
         * shell: specifies the login shell wherein the `cmd` executes.
         * check: fails upon non-zero exit status if set to True.
                  Defaults: True during prepare phase and False during cleanup.
+        * cpus: pins the `cmd` to a CPU set (e.g., '0-3' or '0,2').
+        """
+        output, returncode = self.execute(cmd, image, shell, cpus=cpus)
+        # Update status flag of last run command unless the process timed out
+        if returncode is not None:
+            self.last_run_success = returncode == 0
+        self.check_returncode(cmd, image, shell, returncode, check)
+        return output
+
+    def execute(self, cmd, image='alpine:3.12.0', shell='/bin/sh', log_prefix='', cpus=None,
+                executor=None):
+        """Executes a given `cmd` in a Docker `image` without any status code check.
+        Returns a tuple of its stdout and return code (None if it timed out).
+        log_prefix: optional prefix for each logged line (e.g., to tell concurrent commands apart)
+        executor: optional executor overriding the spec executor (e.g., an SshExecutor)
         """
         # Resolve image aliases
         if(image in BenchmarkSpec.IMAGES.keys()):
             image = self.image(image)
-        # Set status code check default
-        if(check is None):
-            check = BenchmarkSpec.CHECK_RETURNCODE_DEFAULT
-        # Escape double quotes for shell
-        escaped_cmd = cmd.replace('"', '\\"')
-        # Escape dollar sign ($) for local mode support on Windows
-        if(platform.system() != 'Windows'):
-            escaped_cmd = escaped_cmd.replace('$', r'\$')
-        docker_cmd = (
-            "docker run --rm"
-            # MAYBE: Explore support for M1 and fix warning
-            # ' --platform linux/amdg64'
-            f"{self.secrets_mount()}"
-            f" -v '{win_vol(self.host_root_path())}':{self.mount_dir()}"
-            f"{self.user_permissions()}"
-            f" --entrypoint=''"  # Some containers already have ENTRYPOINTS, remove them
-            f" {image} {shell} -c \"cd '{self.bench_dir()}' && {escaped_cmd}\""
-        )
-        # SHOULD: provide option to execute in full local mode too.
-        # This could speed up development and make SB even more helpful rather than
-        # only supporting relatively slow containerized execution.
-        # Need to make the local flag somehow accessible.
-        # if mode.local:
-        #     cmd = escaped_cmd
-        logging.info(f"docker={docker_cmd}")
-        # See: https://docs.python.org/3/library/subprocess.html#subprocess.Popen.stderr
-        proc = subprocess.Popen(docker_cmd, shell=True, text=True,
-                                stdout=subprocess.PIPE,
-                                stderr=subprocess.STDOUT)
+        proc = (executor or self.executor).popen(cmd, image, shell, cpus)
         log = []
         pulling = False
         for line in iter(proc.stdout.readline, ''):
-            logger.info(line.rstrip())
+            logger.info(f"{log_prefix}{line.rstrip()}")
             # Filter out Docker image pull log if image is unavailable
             # Pulling begins
             if line.startswith('Unable to find image'):
@@ -167,26 +265,120 @@ class BenchmarkSpec:
         # https://docs.python.org/3/library/subprocess.html#subprocess.Popen.communicate
         # Warning: MUST use communicate if stderr is PIPE. See:
         # https://docs.python.org/3/library/subprocess.html#subprocess.Popen.stderr
+        returncode = None
         try:
             _, errs = proc.communicate(DEFAULT_TIMEOUT)
-            # Update status flag of last run command
-            if proc.returncode == 0:
-                self.last_run_success = True
-            else:
-                self.last_run_success = False
-            if(check and proc.returncode != 0):
-                err_msg = (
-                    f"The spec.run() command `{cmd}` exited unsuccessfully."
-                    f" Full Docker command:\n{docker_cmd}"
-                )
-                raise Exception(err_msg)
+            returncode = proc.returncode
         except TimeoutExpired:
             logging.warning(f"Killing process after waiting for {DEFAULT_TIMEOUT}s ...")
             proc.kill()
             _, errs = proc.communicate()
             logging.warning(errs)
 
-        return ''.join(log)
+        return ''.join(log), returncode
+
+    def check_returncode(self, cmd, image, shell, returncode, check=None):
+        """Raises an exception for a non-zero `returncode` if `check` is enabled.
+        check: defaults to CHECK_RETURNCODE_DEFAULT if unspecified."""
+        # Set status code check default
+        if(check is None):
+            check = BenchmarkSpec.CHECK_RETURNCODE_DEFAULT
+        if(check and returncode is not None and returncode != 0):
+            if(image in BenchmarkSpec.IMAGES.keys()):
+                image = self.image(image)
+            err_msg = (
+                f"The spec.run() command `{cmd}` exited unsuccessfully."
+                f" Full {self.executor.name} command:\n"
+                f"{self.executor.command(cmd, image, shell)}"
+            )
+            raise Exception(err_msg)
+
+    def run_many(self, commands, max_workers=None, check=None) -> dict:
+        """Runs multiple named `commands` concurrently as soon as their dependencies succeeded.
+        Returns a dictionary of command names and their stdout.
+        commands: dictionary of command names and spec.run() arguments with the keys
+          * cmd: the command to run (required) or None to skip it as already satisfied
+          * image, shell: optional as in spec.run()
+          * after: optional list of command names that must complete before
+        Example:
+        spec.run_many({
+            'install': {'cmd': 'npm install', 'image': 'node12.x'},
+            'deploy': {'cmd': 'pulumi up -f -y', 'image': 'pulumi_cli', 'after': ['install']}
+        })
+        Optional arguments:
+        * max_workers: maximum number of concurrent commands. Defaults to all ready commands.
+        * check: fails upon non-zero exit status as in spec.run(). Failing commands
+                 skip all their (transitively) dependent commands and re-raise the first
+                 failure after all independent commands completed.
+        Commands that time out always fail because their dependents cannot proceed.
+        """
+        dag = nx.DiGraph()
+        for name, args in commands.items():
+            dag.add_node(name)
+            for dependency in args.get('after', []):
+                if dependency not in commands:
+                    raise ValueError(f"Unknown dependency {dependency} of command {name}.")
+                dag.add_edge(dependency, name)
+        if not nx.is_directed_acyclic_graph(dag):
+            raise ValueError(f"Cyclic dependencies between commands: {nx.find_cycle(dag)}")
+
+        outputs = dict()
+        failures = []
+        skipped = set()
+        all_succeeded = True
+        pending = set(dag.nodes)
+        running = dict()
+        max_workers = max_workers or max(len(commands), 1)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            while pending or running:
+                # Submit all commands whose dependencies completed successfully
+                ready = [n for n in pending if all(p in outputs for p in dag.predecessors(n))]
+                satisfied = False
+                for name in sorted(ready):
+                    args = commands[name]
+                    # Commands without cmd are already satisfied (e.g., up-to-date installs)
+                    if args['cmd'] is None:
+                        outputs[name] = ''
+                        pending.remove(name)
+                        satisfied = True
+                        continue
+                    future = pool.submit(self.execute, args['cmd'],
+                                         args.get('image', 'alpine:3.12.0'),
+                                         args.get('shell', '/bin/sh'),
+                                         f"[{name}] ")
+                    running[future] = name
+                    pending.remove(name)
+                # Satisfied commands might have unblocked dependent commands
+                if satisfied:
+                    continue
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    args = commands[name]
+                    try:
+                        output, returncode = future.result()
+                        if returncode is None:
+                            raise Exception(f"The spec.run() command `{args['cmd']}` timed out.")
+                        if returncode != 0:
+                            all_succeeded = False
+                        self.check_returncode(args['cmd'], args.get('image', 'alpine:3.12.0'),
+                                              args.get('shell', '/bin/sh'), returncode, check)
+                        outputs[name] = output
+                    except Exception as e:
+                        failures.append(e)
+                        # Skip only the commands depending on the failed command
+                        dependents = nx.descendants(dag, name) & pending
+                        pending -= dependents
+                        skipped |= dependents
+        # Update status flag as if the commands ran sequentially
+        self.last_run_success = all_succeeded and not failures
+        if failures:
+            if skipped:
+                logging.warning(f"Skipped commands due to failed dependencies: {sorted(skipped)}")
+            raise failures[0]
+        return outputs
 
     def shell(self, image, shell='/bin/bash'):
         """Starts an interactive `shell` in a Docker `image`
@@ -194,16 +386,7 @@ class BenchmarkSpec:
         # Resolve image aliases
         if(image in BenchmarkSpec.IMAGES.keys()):
             image = self.image(image)
-        docker_cmd = (
-            "docker run --rm -it"
-            f"{self.secrets_mount()}"
-            f" -v '{win_vol(self.host_root_path())}':{self.mount_dir()}"
-            f"{self.user_permissions()}"
-            f" --entrypoint=''"  # Some containers already have ENTRYPOINTS, remove them
-            f" {image} {shell} -c \"cd '{self.bench_dir()}' && {shell}\""
-        )
-        logging.info(f"docker={docker_cmd}")
-        os.system(docker_cmd)
+        self.executor.interactive_shell(image, shell)
 
     def mount_dir(self):
         """Returns the root mount path for apps within containers."""
@@ -215,7 +398,11 @@ class BenchmarkSpec:
         return f"/apps/{self.sub_path()}"
 
     def build(self, image_tag, file='Dockerfile'):
-        """Builds a Dockerfile and tags it with `image_tag`."""
+        """Builds a Dockerfile and tags it with `image_tag`.
+        Skipped in local mode because images are unused."""
+        if not self.executor.containerized:
+            logging.info(f"Skip building {file} for tag {image_tag} in {self.executor.name} mode.")
+            return
         logging.info(f"Building {file} for tag {image_tag} ...")
         build_cmd = f"docker build -f {file} . --tag {image_tag}"
         status = os.system(build_cmd)
@@ -248,6 +435,113 @@ class BenchmarkSpec:
             logging.info('Invalid or unspecified provider. No credentials are injected.')
             return ''
 
+    def secrets_env(self) -> dict:
+        """Returns the provider credential variables for running commands on the host
+        (see LocalExecutor). By default, commands use the host credentials in their default
+        locations (e.g., ~/.aws) or configured through host variables (e.g., AWS_PROFILE).
+        The config `local_credentials: volume` instead uses the same secrets volumes as
+        secrets_mount() (i.e., the credentials of `sb login`)."""
+        try:
+            provider = self['provider']
+            providers = provider if isinstance(provider, list) else [provider]
+            secrets = [Provider(p) for p in providers]
+        except (KeyError, ValueError):
+            logging.info('Invalid or unspecified provider. No credentials are injected.')
+            return dict()
+        env = dict()
+        for p in secrets:
+            if self['local_credentials'] == 'volume':
+                env.update(p.volume_credential_env())
+            else:
+                env.update(p.host_credential_env())
+        return env
+
+    def cache_mount(self, image):
+        """Returns the Docker mount config for the package manager cache volumes
+        of a given image (alias or resolved name) or an empty string otherwise.
+        Starts with a whitespace if present."""
+        if self['cache_volumes'] is False:
+            return ''
+        cache_mount = ''
+        for alias, volumes in BenchmarkSpec.CACHE_VOLUMES.items():
+            if image in (alias, BenchmarkSpec.IMAGES[alias]):
+                for volume, mount_dir in volumes.items():
+                    cache_mount += f" -v {volume}:{mount_dir}"
+                return cache_mount
+        return cache_mount
+
+    def npm_install_command(self, project, image='node12.x'):
+        """Returns the command to install the npm dependencies of a `project` directory
+        or None if its package-lock.json is unchanged since the last successful install.
+        The install records the hash of its package files in a stamp file within node_modules
+        upon success. The hash is computed after the install because npm may rewrite
+        the package-lock.json (see npm_lock_hash)."""
+        lock_hash = self.npm_lock_hash(project, image)
+        cmd = f"cd {project} && npm install"
+        if lock_hash is None:
+            return cmd
+        stamp = self.host_file(project) / 'node_modules' / BenchmarkSpec.NPM_INSTALL_STAMP
+        if stamp.is_file() and stamp.read_text().strip() == lock_hash:
+            logging.info(f"Skip npm install for {project} because package-lock.json is unchanged.")
+            return None
+        # Same hash as npm_lock_hash computed with node, which is available wherever npm is
+        stamp_script = (
+            "const crypto = require('crypto'), fs = require('fs');"
+            f" const hash = crypto.createHash('sha256').update('{image}');"
+            " for (const f of ['package.json', 'package-lock.json'])"
+            " if (fs.existsSync(f)) hash.update(fs.readFileSync(f));"
+            f" fs.writeFileSync('node_modules/{BenchmarkSpec.NPM_INSTALL_STAMP}', hash.digest('hex'));"  # noqa: E501
+        )
+        return f"{cmd} && node -e \"{stamp_script}\""
+
+    def npm_install(self, projects, image='node12.x') -> list:
+        """Installs the npm dependencies of multiple `projects` concurrently
+        and returns the list of projects that were not up-to-date."""
+        commands = dict()
+        for project in projects:
+            commands[project] = {'cmd': self.npm_install_command(project, image), 'image': image}
+        self.run_many(commands)
+        return [p for p, args in commands.items() if args['cmd'] is not None]
+
+    def npm_lock_hash(self, project, image='node12.x'):
+        """Returns a hash over the npm package files of a `project` directory
+        and the install image or None if the project has no package-lock.json."""
+        project_path = self.host_file(project)
+        lock_file = project_path / 'package-lock.json'
+        if not lock_file.is_file():
+            return None
+        digest = hashlib.sha256(image.encode())
+        for file_name in ['package.json', 'package-lock.json']:
+            file = project_path / file_name
+            if file.is_file():
+                digest.update(file.read_bytes())
+        return digest.hexdigest()
+
+    def instance(self):
+        """Returns the name of the benchmark instance or None for the default instance."""
+        return self.config['sb'].get('instance')
+
+    def stack_name(self, base):
+        """Returns an instance-specific name for cloud resources (e.g., Pulumi stacks)
+        such that concurrent instances do not interfere. Example: http-instance1"""
+        if self.instance():
+            return f"{base}-{self.instance()}"
+        return base
+
+    def lock(self, name):
+        """Returns a context manager that holds a lock shared by all sb processes
+        of this benchmark (e.g., concurrent instances) until it exits.
+        Useful for serializing updates of shared resources. Example:
+        with spec.lock('shared_stack'):
+            spec.run('cd shared && pulumi up -f -y', image='pulumi_cli')
+        """
+        return file_lock(self.host_file(f".sb/locks/{name}.lock"))
+
+    def host_file(self, rel_path) -> Path:
+        """Returns the Python Path on the calling host for a path relative
+        to the benchmark directory."""
+        return Path(str(self.host_path())) / rel_path
+
     def user_permissions(self):
         if(self.host_system() == 'Linux'):
             # Need to run container as root until docker supports non-root volumes:
@@ -317,6 +611,8 @@ class BenchmarkSpec:
         if start is None:
             return None
         timestamp = start.strftime('%Y-%m-%d_%H-%M-%S')
+        if self.instance():
+            timestamp += f"_{self.instance()}"
         dirpath = Path(f"logs/{timestamp}")
         dirpath.mkdir(parents=True, exist_ok=True)
         return dirpath
@@ -324,20 +620,25 @@ class BenchmarkSpec:
     def workload_log_file(self):
         return self.logs_directory() / 'k6_metrics.csv'
 
+    def workload_generator(self) -> WorkloadGenerator:
+        options = {key: self[key] for key in WorkloadGenerator.OPTIONS if self[key] is not None}
+        return WorkloadGenerator(self['workload_type'],
+                                 self['scale_factor'], self['scale_type'],
+                                 self['workload_trace'],
+                                 self['scale_rate_per_second'],
+                                 self['seconds_to_skip'],
+                                 **options)
+
     def workload_options(self) -> dict:
         """Returns a k6 options dictionary."""
-        gen = WorkloadGenerator(self['workload_type'],
-                                self['scale_factor'], self['scale_type'],
-                                self['workload_trace'],
-                                self['scale_rate_per_second'],
-                                self['seconds_to_skip'])
-        return gen.generate_trace()
+        return self.workload_generator().generate_trace()
 
     def create_workload_options_file(self, path, workload_options=None):
         script, options = self.workload_file_paths()
         options_path = Path(path) / options
         logger.info(f"Creating k6 options: {options_path}")
         k6_config = None
+        arrivals = None
         # passed options dict takes precedence
         if isinstance(workload_options, dict):
             k6_config = workload_options
@@ -348,11 +649,52 @@ class BenchmarkSpec:
             return
         else:
             # generate via workload generator
-            k6_config = self.workload_options()
+            generator = self.workload_generator()
+            k6_config = generator.generate_trace()
+            arrivals = generator.arrivals
 
         # write k6 config to workload_options.json file
         with open(options_path, 'w') as options_file:
             json.dump(k6_config, options_file)
+        # write precomputed request timestamps or remove stale ones
+        arrivals_path = BenchmarkSpec.arrivals_file(options_path)
+        if arrivals is not None:
+            logger.info(f"Creating k6 arrivals: {arrivals_path}")
+            arrivals.tofile(arrivals_path)
+        elif arrivals_path.is_file():
+            arrivals_path.unlink()
+
+    def arrivals_file(options_path) -> Path:
+        """Returns the path of the binary request timestamps next to the k6 options file.
+        Format: uint32 little-endian milliseconds since the scenario start."""
+        return Path(options_path).with_suffix('.arrivals.bin')
+
+    def arrivals_envs(self, workload_script, workload_options) -> dict:
+        """Returns the k6 env ARRIVALS_FILE (relative to the workload script) if available."""
+        arrivals_path = BenchmarkSpec.arrivals_file(workload_options)
+        if not arrivals_path.is_file():
+            return {}
+        relative_path = os.path.relpath(arrivals_path, Path(workload_script).parent)
+        return {'ARRIVALS_FILE': Path(relative_path).as_posix()}
+
+    def endpoint_envs(self, urls) -> dict:
+        """Returns the k6 envs BENCHMARK_URL_<ENDPOINT> of the workload script for the
+        scenario endpoints of a composite workload (see WorkloadGenerator).
+        urls: dict of the URLs of the deployed endpoints (e.g., {'http': 'https://...'}).
+        Raises an exception if a scenario targets an endpoint without URL because
+        the workload script would silently send its requests to BENCHMARK_URL."""
+        _, workload_options = self.workload_file_paths()
+        if not Path(workload_options).is_file():
+            return {}
+        with open(workload_options) as file:
+            scenarios = json.load(file).get('scenarios', {})
+        endpoints = {s['env']['ENDPOINT'] for s in scenarios.values() if 'ENDPOINT' in s.get('env', {})}  # noqa: E501
+        # The workload script selects the env of the upper case endpoint
+        upper_urls = {endpoint.upper(): url for endpoint, url in urls.items()}
+        missing = sorted(e for e in endpoints if e.upper() not in upper_urls)
+        if missing:
+            raise Exception(f"No deployed URL for the workload endpoints {', '.join(missing)}. Deployed endpoints: {', '.join(urls) or 'none'}.")  # noqa: E501
+        return {f"BENCHMARK_URL_{e.upper()}": upper_urls[e.upper()] for e in endpoints}
 
     def is_existing_json_file(path) -> bool:
         p = Path(path)
@@ -375,6 +717,9 @@ class BenchmarkSpec:
             options_path = script_path.parent / BenchmarkSpec.DEFAULT_OPTIONS
             options = str(options_path)
         # else: use specified config assigned above
+        # Generated options are instance-specific to support concurrent instances
+        if self.instance() and self['workload_options'] is None:
+            options = str(Path(options).with_name(f"workload_options_{self.instance()}.json"))
         return script, options
 
     # Forward square bracket getter and setter to config dictionary namespaced by benchmark name
@@ -0,0 +1,86 @@
+import csv
+import json
+import logging
+import sys
+from pathlib import Path
+
+from sb.aws_trace_analyzer import CSV_FIELDS, AwsTraceAnalyzer, extract_trace_breakdown
+from sb.clock_skew import CLOCK_OFFSETS_FILE, load_offsets
+from sb.shape_index import ShapeIndex, shape_index_file
+from sb.trace_index import TraceIndex, build_index, resolve_trace_file
+
+
+class TraceCmd:
+    """Inspects single traces of a (compressed) traces.json file through its
+    trace_index.db (built on demand). Example:
+    sb trace show 1-5759e988-bd862e3fe1be46a994272793 --breakdown"""
+
+    def __init__(self, bench) -> None:
+        self.bench = bench
+
+    def show(self, trace_id, log_path=None, breakdown=False):
+        """Pretty-prints the trace with the id `trace_id` or the traces with this root trace id.
+        log_path: path to a traces file or logs directory. Defaults to the last invocation.
+        breakdown: prints the trace breakdown (see aws_trace_analyzer) instead of the trace.
+                   Corrects clock skew like the analyzers if clock_offsets.csv exists."""
+        log_path = resolve_log_path(self.bench, log_path)
+        traces = TraceIndex(log_path).traces(trace_id)
+        if not traces:
+            raise KeyError(f"Trace {trace_id} not found.")
+        clock_offsets = None
+        offsets_file = resolve_trace_file(log_path).parent / CLOCK_OFFSETS_FILE
+        if breakdown and offsets_file.is_file():
+            clock_offsets = load_offsets(offsets_file)
+        for trace in traces:
+            if breakdown:
+                print(json.dumps(dict(zip(CSV_FIELDS, extract_trace_breakdown(trace, clock_offsets=clock_offsets))),  # noqa: E501
+                                 indent=2, default=str))
+            else:
+                print(json.dumps(decode_documents(trace), indent=2))
+
+    def index(self, log_path=None):
+        """(Re)builds the trace_index.db for a traces file or logs directory.
+        Defaults to the last invocation."""
+        build_index(resolve_trace_file(resolve_log_path(self.bench, log_path)))
+
+    def shapes(self, *log_paths):
+        """Compares trace topologies across runs based on their shape_index.json
+        (written by `sb analyze_traces --analyzer=breakdown`) without reading traces.
+        Runs without shape_index.json are analyzed with the AwsTraceAnalyzer first.
+        Prints a CSV with the number of traces and mean duration per signature and run.
+        log_paths: traces files or logs directories. Defaults to the last invocation.
+        Example: sb trace shapes logs/2022-04-01_01-11-31 logs/2022-04-02_10-00-00"""
+        paths = [resolve_log_path(self.bench, p) for p in log_paths or [None]]
+        for path in paths:
+            if not shape_index_file(path).is_file():
+                logging.info(f"Building the missing {shape_index_file(path)}.")
+                AwsTraceAnalyzer(resolve_trace_file(path)).analyze_traces()
+        indexes = [ShapeIndex.load(shape_index_file(p)) for p in paths]
+        signatures = dict()
+        for index in indexes:
+            for signature, shape in index.shapes.items():
+                signatures.setdefault(signature, shape)
+        writer = csv.writer(sys.stdout, quoting=csv.QUOTE_MINIMAL)
+        runs = [p.name for p in paths]
+        writer.writerow(['signature', 'services', *[f"{run}_{metric}" for run in runs for metric in ['count', 'mean_duration']]])  # noqa: E501
+        for signature, shape in signatures.items():
+            values = [v for index in indexes
+                      for v in (index.count(signature), index.mean(signature))]
+            writer.writerow([signature, ' '.join(shape['services']), *values])
+
+
+def resolve_log_path(bench, log_path) -> Path:
+    """Returns the `log_path` or the logs directory of the last invocation if None."""
+    if log_path is None:
+        if bench is None:
+            raise Exception('Specify a log_path or run from a benchmark directory.')
+        return bench.spec.logs_directory()
+    return Path(log_path)
+
+
+def decode_documents(trace) -> dict:
+    """Decodes the double-encoded segment documents of an X-Ray trace for readability."""
+    for segment in trace.get('Segments', []):
+        if isinstance(segment.get('Document'), str):
+            segment['Document'] = json.loads(segment['Document'])
+    return trace
@@ -0,0 +1,179 @@
+# Clock-skew correction for X-Ray segment timestamps.
+# Segments of different services (e.g., AWS::Lambda and AWS::Lambda::Function) are
+# timestamped by different clocks. X-Ray does not expose hosts, hence every segment origin
+# is treated as one clock and subsegments share the clock of their enclosing segment.
+# The ClockSkewEstimator learns an offset per clock across all traces of a run from the
+# parent/child boundaries between clocks: a child starts after its parent and
+# a synchronous child ends before its parent. For each boundary, the minimal shift that
+# satisfies both constraints is 0 unless the clocks disagree. The median of these shifts
+# (i.e., a robust L1 regression of a constant offset) only corrects systematic skew and
+# ignores occasional outliers. Offsets are relative to the most common root clock
+# (e.g., AWS::ApiGateway::Stage) and applied before the latency breakdown
+# (see aws_trace_analyzer.create_span_graph) and the trigger timestamps
+# (see aws_trace_trigger_analyzer).
+import csv
+import json
+import logging
+from array import array
+from collections import Counter, defaultdict
+from pathlib import Path
+import networkx as nx
+import numpy as np
+
+from sb.trace_io import open_traces
+
+CLOCK_OFFSETS_FILE = 'clock_offsets.csv'
+CLOCK_OFFSETS_FIELDS = ['clock', 'offset', 'num_samples']
+# Clock of segments without origin
+UNKNOWN_CLOCK = 'unknown'
+# Minimum number of boundaries to estimate the offset between two clocks
+MIN_SAMPLES = 10
+# Offsets below the µs-precision of X-Ray timestamps are ignored
+MIN_OFFSET = 1e-6
+# Children ending later than this (in seconds) after their parent are considered async calls
+ASYNC_THRESHOLD = 0.01
+# Known synchronous invocations irrespective of their end times
+SYNC_ORIGINS = {'AWS::Lambda::Function'}
+
+
+def segment_clocks(segments):
+    """Yields tuples of (doc, clock) for all parsed `segments` and their nested subsegments."""
+    for segment in segments:
+        clock = segment.get('origin', UNKNOWN_CLOCK)
+        stack = [segment]
+        while stack:
+            doc = stack.pop()
+            yield doc, clock
+            stack.extend(doc.get('subsegments', []))
+
+
+def boundary_bounds(parent_doc, child_doc) -> tuple:
+    """Returns the (lower, upper) bounds for the offset of the child clock relative to
+    the parent clock such that the child starts after and (if sync) ends before its parent."""
+    upper = child_doc['start_time'] - parent_doc['start_time']
+    end_gap = parent_doc['end_time'] - child_doc['end_time']
+    if child_doc.get('origin') in SYNC_ORIGINS or end_gap > -ASYNC_THRESHOLD:
+        return -end_gap, upper
+    return -np.inf, upper
+
+
+class ClockSkewEstimator:
+    """Learns per-clock offsets (in seconds) from many traces. Example:
+    estimator = ClockSkewEstimator()
+    for trace in traces:
+        estimator.add_trace(trace)
+    offsets = estimator.offsets()
+    """
+
+    def __init__(self, min_samples=MIN_SAMPLES) -> None:
+        self.min_samples = min_samples
+        # (parent_clock, child_clock) => lower and upper bounds per boundary
+        self.lower = defaultdict(lambda: array('d'))
+        self.upper = defaultdict(lambda: array('d'))
+        self.root_clocks = Counter()
+
+    def add_trace(self, trace):
+        """Adds the boundaries between clocks of an X-Ray trace with double-encoded segments."""
+        segments = [json.loads(s['Document']) for s in trace['Segments']]
+        docs = {doc['id']: (doc, clock) for doc, clock in segment_clocks(segments)}
+        if any(doc.get('in_progress', False) for doc, _ in docs.values()):
+            return
+        for segment in segments:
+            clock = segment.get('origin', UNKNOWN_CLOCK)
+            if 'parent_id' not in segment:
+                self.root_clocks[clock] += 1
+                continue
+            parent_doc, parent_clock = docs.get(segment['parent_id'], (None, None))
+            if parent_doc is None or parent_clock == clock:
+                continue
+            lower, upper = boundary_bounds(parent_doc, segment)
+            self.lower[(parent_clock, clock)].append(lower)
+            self.upper[(parent_clock, clock)].append(upper)
+
+    def pair_offsets(self) -> dict:
+        """Returns (parent_clock, child_clock) => (offset, num_samples) of the child clock
+        relative to the parent clock for all pairs with at least min_samples boundaries."""
+        pairs = dict()
+        for pair, lower in self.lower.items():
+            if len(lower) < self.min_samples:
+                continue
+            lo = np.frombuffer(lower)
+            hi = np.frombuffer(self.upper[pair])
+            # Minimal shift per boundary or the midpoint if both constraints cannot be met
+            shifts = np.where(lo > hi, (lo + hi) / 2, np.clip(0, lo, hi))
+            pairs[pair] = (float(np.median(shifts)), len(lower))
+        return pairs
+
+    def offsets(self) -> dict:
+        """Returns clock => offset in seconds to subtract from its timestamps.
+        Propagates pairwise offsets along the best-observed pairs (maximum spanning tree)
+        starting from the most common root clock with offset 0."""
+        if not self.root_clocks:
+            return dict()
+        reference = self.root_clocks.most_common(1)[0][0]
+        pairs = self.pair_offsets()
+        G = nx.Graph()
+        G.add_node(reference)
+        for (parent, child), (offset, num_samples) in pairs.items():
+            if not G.has_edge(parent, child) or G[parent][child]['weight'] < num_samples:
+                G.add_edge(parent, child, weight=num_samples, parent=parent, offset=offset)
+        tree = nx.maximum_spanning_tree(G)
+        offsets = {reference: 0.0}
+        for known, clock in nx.bfs_edges(tree, reference):
+            edge = tree[known][clock]
+            sign = 1 if edge['parent'] == known else -1
+            offsets[clock] = offsets[known] + sign * edge['offset']
+        return {clock: offset for clock, offset in offsets.items() if abs(offset) >= MIN_OFFSET}
+
+    def save(self, offsets_file):
+        """Writes the learned offsets and logs them."""
+        offsets = self.offsets()
+        num_samples = Counter()
+        for pair, lower in self.lower.items():
+            for clock in pair:
+                num_samples[clock] += len(lower)
+        with open(offsets_file, 'w') as file:
+            writer = csv.writer(file, quoting=csv.QUOTE_MINIMAL)
+            writer.writerow(CLOCK_OFFSETS_FIELDS)
+            for clock, offset in sorted(offsets.items()):
+                writer.writerow([clock, offset, num_samples[clock]])
+        if offsets:
+            corrections = ', '.join(f"{clock}: {offset * 1000:.3f}ms" for clock, offset in offsets.items())  # noqa: E501
+            logging.info(f"Correcting clock skew by {corrections}. Written to {offsets_file}.")
+        return offsets
+
+
+def estimate_offsets(trace_file) -> dict:
+    """Learns clock offsets across all traces of a (compressed) traces file in a first pass
+    and saves them into clock_offsets.csv next to it."""
+    estimator = ClockSkewEstimator()
+    with open_traces(trace_file) as traces_json:
+        for line in traces_json:
+            try:
+                estimator.add_trace(json.loads(line))
+            except Exception as e:
+                logging.debug(f"Skip trace for clock skew estimation. {e}")
+    return estimator.save(Path(trace_file).parent / CLOCK_OFFSETS_FILE)
+
+
+def load_offsets(offsets_file) -> dict:
+    """Returns the clock offsets saved into a clock_offsets.csv (see estimate_offsets)."""
+    with open(offsets_file) as file:
+        return {row['clock']: float(row['offset']) for row in csv.DictReader(file)}
+
+
+def correct_clock_skew(segments, offsets) -> float:
+    """Shifts the timestamps of all parsed `segments` (incl. subsegments) in place by the
+    offsets of their clocks. Durations of (sub)segments remain unchanged.
+    Returns the change of the trace span (latest end - earliest start) in seconds."""
+    docs, clocks = zip(*segment_clocks(segments))
+    shifts = np.array([offsets.get(clock, 0.0) for clock in clocks])
+    if not shifts.any():
+        return 0.0
+    times = np.array([(doc['start_time'], doc['end_time']) for doc in docs])
+    corrected = times - shifts[:, np.newaxis]
+    for doc, (start_time, end_time) in zip(docs, corrected.tolist()):
+        doc['start_time'] = start_time
+        doc['end_time'] = end_time
+    span = times[:, 1].max() - times[:, 0].min()
+    return float(corrected[:, 1].max() - corrected[:, 0].min() - span)
@@ -0,0 +1,196 @@
+import os
+import logging
+import platform
+import shlex
+import shutil
+import subprocess
+from pathlib import PurePosixPath, PureWindowsPath
+
+
+def win_vol(path) -> str:
+    r"""Converts a Windows path into a Docker-compatible path
+    without a colon. Returns Posix paths unchanged.
+    Example: win_vol(PureWindowsPath("C:\Users\joe\Projects"))
+    => "/C/Users/joe/Projects"
+    """
+    if(isinstance(path, PureWindowsPath)):
+        posix_path = PurePosixPath(path)
+        path_without_colon = str(posix_path).replace(':\\', '')
+        return f"/{path_without_colon}"
+    else:
+        return path
+
+
+class DockerExecutor:
+    """Executes spec.run() commands within a Docker container (default).
+    Mounts the benchmark root directory into the container as well as
+    provider secrets if a provider is specified in the BENCHMARK_CONFIG
+    and package manager caches for supported images (see CACHE_VOLUMES).
+    """
+
+    name = 'docker'
+    containerized = True
+
+    def __init__(self, spec) -> None:
+        self.spec = spec
+
+    def command(self, cmd, image, shell, cpus=None) -> str:
+        """Returns the full Docker command that executes `cmd` in `image`."""
+        # Escape double quotes for shell
+        escaped_cmd = cmd.replace('"', '\\"')
+        # Escape dollar sign ($) for local mode support on Windows
+        if(platform.system() != 'Windows'):
+            escaped_cmd = escaped_cmd.replace('$', r'\$')
+        docker_cmd = (
+            "docker run --rm"
+            # MAYBE: Explore support for M1 and fix warning
+            # ' --platform linux/amdg64'
+            f"{self.spec.secrets_mount()}"
+            f" -v '{win_vol(self.spec.host_root_path())}':{self.spec.mount_dir()}"
+            f"{self.spec.cache_mount(image)}"
+            f"{self.spec.user_permissions()}"
+            f"{f' --cpuset-cpus={cpus}' if cpus else ''}"
+            f" --entrypoint=''"  # Some containers already have ENTRYPOINTS, remove them
+            f" {image} {shell} -c \"cd '{self.spec.bench_dir()}' && {escaped_cmd}\""
+        )
+        return docker_cmd
+
+    def popen(self, cmd, image, shell, cpus=None) -> subprocess.Popen:
+        """Starts `cmd` and returns the process with stderr redirected to stdout."""
+        docker_cmd = self.command(cmd, image, shell, cpus)
+        logging.info(f"docker={docker_cmd}")
+        # See: https://docs.python.org/3/library/subprocess.html#subprocess.Popen.stderr
+        return subprocess.Popen(docker_cmd, shell=True, text=True,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT)
+
+    def interactive_shell(self, image, shell):
+        docker_cmd = (
+            "docker run --rm -it"
+            f"{self.spec.secrets_mount()}"
+            f" -v '{win_vol(self.spec.host_root_path())}':{self.spec.mount_dir()}"
+            f"{self.spec.user_permissions()}"
+            f" --entrypoint=''"  # Some containers already have ENTRYPOINTS, remove them
+            f" {image} {shell} -c \"cd '{self.spec.bench_dir()}' && {shell}\""
+        )
+        logging.info(f"docker={docker_cmd}")
+        os.system(docker_cmd)
+
+
+class LocalExecutor:
+    """Executes spec.run() commands directly on the calling host (`--local` flag).
+    Commands run in the benchmark directory (i.e., where the *_benchmark.py file resides)
+    like in the container. The Docker `image` is ignored and all tools (e.g., node, pulumi)
+    must be installed locally. Like in Docker containers, commands run in a clean environment:
+    only the host variables required to locate tools (see HOST_ENVS) and the credential
+    variables of the configured providers are passed through (see spec.secrets_env).
+    Provider credentials are picked up from their default host locations (e.g., ~/.aws)
+    unless `local_credentials: volume` selects the secrets volumes of `sb login`.
+    """
+
+    name = 'local'
+    containerized = False
+    # Host environment variables passed through to local commands
+    HOST_ENVS = ['PATH', 'HOME', 'USER', 'LANG', 'LC_ALL', 'TERM', 'TMPDIR',
+                 # Required by most programs on Windows
+                 'SYSTEMROOT', 'COMSPEC', 'PATHEXT', 'TEMP', 'TMP', 'USERPROFILE', 'APPDATA']
+
+    def __init__(self, spec) -> None:
+        self.spec = spec
+
+    def command(self, cmd, image, shell, cpus=None) -> str:
+        """Returns a shell command equivalent to the local execution of `cmd`."""
+        return f"cd '{self.spec.host_path()}' && {' '.join([*self.taskset(cpus), cmd])}"
+
+    def popen(self, cmd, image, shell, cpus=None) -> subprocess.Popen:
+        """Starts `cmd` and returns the process with stderr redirected to stdout."""
+        logging.info(f"local={self.command(cmd, image, shell, cpus)}")
+        # No escaping needed because the command is not wrapped into another shell
+        args = [*self.taskset(cpus), shell, '-c', cmd]
+        use_shell = False
+        # Fallback to the default shell (i.e., cmd.exe) on Windows
+        if platform.system() == 'Windows':
+            args = cmd
+            use_shell = True
+        return subprocess.Popen(args, shell=use_shell, text=True,
+                                cwd=str(self.spec.host_path()),
+                                env=self.env(),
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT)
+
+    def interactive_shell(self, image, shell):
+        logging.info(f"local={self.command(shell, image, shell)}")
+        subprocess.run(shell, cwd=str(self.spec.host_path()), env=self.env())
+
+    def env(self) -> dict:
+        """Returns the environment of local commands.
+        Raises an exception if the provider credentials are unavailable."""
+        env = {key: os.environ[key] for key in LocalExecutor.HOST_ENVS if key in os.environ}
+        env.update(self.spec.secrets_env())
+        return env
+
+    def taskset(self, cpus) -> list:
+        """Returns the command prefix to pin a process to the CPU set `cpus`
+        or an empty list if unspecified or unsupported (e.g., on macOS)."""
+        if not cpus:
+            return []
+        if shutil.which('taskset') is None:
+            logging.warning(f"Ignoring CPU set {cpus} because taskset is unavailable.")
+            return []
+        return ['taskset', '-c', str(cpus)]
+
+
+class SshExecutor:
+    """Executes commands within a Docker container on a remote `host` via SSH.
+    Used for distributing the k6 load generator across hosts (see spec.run_k6).
+    The host requires Docker and password-less SSH access (e.g., through a key and
+    an ~/.ssh/config alias). Commands run in `remote_dir` (relative to the remote home),
+    which is mounted into the container as working directory. Files must be uploaded first.
+    """
+
+    name = 'ssh'
+    containerized = True
+
+    def __init__(self, spec, host, remote_dir) -> None:
+        self.spec = spec
+        self.host = host
+        self.remote_dir = remote_dir
+
+    def command(self, cmd, image, shell, cpus=None) -> str:
+        """Returns the full SSH command that executes `cmd` in `image` on the remote host."""
+        remote_cmd = (
+            f"mkdir -p {self.remote_dir} && cd {self.remote_dir} &&"
+            " docker run --rm -v \"$PWD\":/sb -w /sb"
+            f"{f' --cpuset-cpus={cpus}' if cpus else ''}"
+            f" --entrypoint=''"
+            f" {image} {shell} -c {shlex.quote(cmd)}"
+        )
+        return f"ssh {self.host} {shlex.quote(remote_cmd)}"
+
+    def popen(self, cmd, image, shell, cpus=None) -> subprocess.Popen:
+        """Starts `cmd` and returns the process with stderr redirected to stdout."""
+        ssh_cmd = self.command(cmd, image, shell, cpus)
+        logging.info(f"ssh={ssh_cmd}")
+        return subprocess.Popen(ssh_cmd, shell=True, text=True,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT)
+
+    def interactive_shell(self, image, shell):
+        raise Exception(f"Interactive shells are unsupported for {self.name} executors.")
+
+    def upload(self, files):
+        """Copies local `files` into the remote directory."""
+        subprocess.run(['ssh', self.host, f"mkdir -p {self.remote_dir}"], check=True)
+        subprocess.run(['scp', '-q', *[str(f) for f in files], f"{self.host}:{self.remote_dir}/"],
+                       check=True)
+
+    def download(self, remote_file, local_path):
+        """Copies `remote_file` from the remote directory to the local path."""
+        subprocess.run(['scp', '-q', f"{self.host}:{self.remote_dir}/{remote_file}",
+                        str(local_path)], check=True)
+
+
+EXECUTORS = {
+    DockerExecutor.name: DockerExecutor,
+    LocalExecutor.name: LocalExecutor
+}
@@ -0,0 +1,126 @@
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+
+from sb.sb import Sb
+
+INSTANCE_LOGS_DIR = 'logs/instances'
+
+
+class ExperimentRunner:
+    """Runs an experiment for multiple instances of a benchmark concurrently.
+    Each instance runs in a separate process because sb changes the working directory.
+    Instances are isolated through their own sb config and event log, logs directory,
+    and cloud stacks (see spec.stack_name). Their output goes to the console prefixed with
+    the instance name and into logs/instances/<instance>.log next to the benchmark file.
+    Caveat: trace downloads query the invocation timespan of an instance. Hence, concurrent
+    instances within the same cloud account and region can see each other's traces unless
+    the benchmark sets a trace_filter or trace_services (e.g., aws-triggers on AWS).
+    Example:
+    def experiment(sb):
+        sb.prepare()
+        sb.invoke('custom', workload_options=options)
+        sb.wait_for_traces()
+        sb.get_traces()
+        sb.cleanup()
+
+    runner = ExperimentRunner('../aws-triggers/trigger_benchmark.py', max_concurrency=3)
+    runner.run(experiment, {'http': {'trigger': 'http'}, 'queue': {'trigger': 'queue'}})
+
+    The experiment function must be defined at module level to be picklable.
+    Scripts must guard their entry point with `if __name__ == '__main__':`
+    on platforms that spawn rather than fork processes (e.g., macOS, Windows).
+    """
+
+    def __init__(self, benchmark_file, max_concurrency=2, pin_k6=True,
+                 log_level='INFO', **sb_options) -> None:
+        """
+        benchmark_file: path to a *_benchmark.py file.
+        max_concurrency: maximum number of instances running at the same time.
+        pin_k6: assigns a disjoint CPU set to the k6 load generator of each concurrently
+                running instance such that they do not starve each other.
+        sb_options: further options passed to Sb (e.g., local=True).
+        """
+        if max_concurrency < 1:
+            raise ValueError(f"Invalid max_concurrency {max_concurrency}. Must be at least 1.")
+        self.benchmark_file = str(Path(benchmark_file).resolve())
+        self.max_concurrency = max_concurrency
+        self.pin_k6 = pin_k6
+        self.sb_options = {'log_level': log_level, **sb_options}
+
+    def run(self, experiment, instances):
+        """Runs `experiment(sb)` for each instance with at most `max_concurrency`
+        instances at the same time and waits until all instances completed.
+        experiment: function receiving an Sb object for an instance.
+        instances: dictionary of instance names and config values set before the experiment.
+        Raises an exception listing all failed instances after the others completed.
+        """
+        slot_cpus = [None] * self.max_concurrency
+        if self.pin_k6:
+            slot_cpus = cpu_sets(self.max_concurrency)
+        free_slots = list(range(self.max_concurrency))
+        pending = list(instances.items())
+        running = dict()
+        failures = dict()
+        with ProcessPoolExecutor(max_workers=self.max_concurrency) as executor:
+            while pending or running:
+                while pending and free_slots:
+                    name, config = pending.pop(0)
+                    slot = free_slots.pop(0)
+                    logging.info(f"Starting instance {name} with k6_cpus={slot_cpus[slot]} ...")
+                    future = executor.submit(run_instance, self.benchmark_file, name, config,
+                                             experiment, slot_cpus[slot], self.sb_options)
+                    running[future] = (name, slot)
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, slot = running.pop(future)
+                    free_slots.append(slot)
+                    try:
+                        future.result()
+                        logging.info(f"Finished instance {name}.")
+                    except Exception as e:
+                        failures[name] = e
+                        logging.error(f"Instance {name} failed: {e}")
+        if failures:
+            raise Exception(f"Experiment failed for {len(failures)} of {len(instances)} instances:"
+                            f" {', '.join(failures)}. See {INSTANCE_LOGS_DIR} for details.")
+
+
+def run_instance(benchmark_file, instance, config, experiment, k6_cpus, sb_options):
+    """Runs the `experiment` for a single benchmark `instance` within a worker process."""
+    log_file = Path(benchmark_file).parent / INSTANCE_LOGS_DIR / f"{instance}.log"
+    configure_logging(instance, log_file, sb_options['log_level'])
+    sb = Sb(benchmark_file, instance=instance, **sb_options)
+    for key, value in config.items():
+        sb.config.set(key, value)
+    if k6_cpus is not None:
+        sb.config.set('k6_cpus', k6_cpus)
+    experiment(sb)
+
+
+def configure_logging(instance, log_file, log_level):
+    """Replaces the root log handlers (potentially inherited from the parent process)
+    with handlers for the console and an instance-specific log file."""
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    formatter = logging.Formatter(f"[{instance}] %(levelname)s:%(name)s:%(message)s")
+    for handler in [logging.StreamHandler(sys.stdout), logging.FileHandler(log_file)]:
+        handler.setFormatter(formatter)
+        root.addHandler(handler)
+    root.setLevel(logging.getLevelName(log_level))
+
+
+def cpu_sets(num_slots, cpu_count=None) -> list:
+    """Partitions the host CPUs into `num_slots` disjoint CPU sets.
+    Slots share CPUs round-robin if there are fewer CPUs than slots.
+    Example: cpu_sets(2, 8) => ['0-3', '4-7']
+    """
+    cpu_count = cpu_count or os.cpu_count() or 1
+    if num_slots >= cpu_count:
+        return [str(i % cpu_count) for i in range(num_slots)]
+    size = cpu_count // num_slots
+    return [f"{i * size}-{(i + 1) * size - 1}" if size > 1 else str(i) for i in range(num_slots)]
@@ -0,0 +1,51 @@
+# On-disk bank of fractional Brownian motion (fBm) samples for the WorkloadGenerator.
+# Sampling fBm for long traces is slow, so each realization is saved once per
+# (hurst, t, length, seed) as .npy file and memory-mapped when reused.
+# The bank directory is configurable via SB_FBM_BANK (default: ~/.cache/sb/fbm)
+# and can be disabled with SB_FBM_BANK=off.
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+from stochastic.processes.continuous import FractionalBrownianMotion
+
+DISABLED = 'off'
+
+
+def bank_dir():
+    """Returns the bank directory or None if disabled."""
+    path = os.getenv('SB_FBM_BANK', str(Path.home() / '.cache' / 'sb' / 'fbm'))
+    if path == DISABLED:
+        return None
+    return Path(path)
+
+
+def bank_file(n, hurst, t, seed) -> Path:
+    return bank_dir() / f"fbm_h{hurst}_t{t}_n{n}_s{seed}.npy"
+
+
+def fbm_samples(n, hurst=0.8, t=10, seed=None) -> np.ndarray:
+    """Returns a realization of fBm with `n` increments (i.e., n + 1 samples including t=0).
+    Identical to FractionalBrownianMotion(hurst, t).sample(n) after seeding the stochastic
+    library with `seed`. Reuses banked realizations unless the seed is None or the bank is
+    disabled. Banked realizations are read-only memory maps."""
+    if seed is None or bank_dir() is None:
+        return sample(n, hurst, t, seed)
+    path = bank_file(n, hurst, t, seed)
+    if path.is_file():
+        return np.load(path, mmap_mode='r')
+    samples = sample(n, hurst, t, seed)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Atomic replace because concurrent sb instances might bank the same realization
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'wb') as file:
+        np.save(file, samples)
+    os.replace(tmp_path, path)
+    logging.debug(f"Banked fBm samples at {path}.")
+    return samples
+
+
+def sample(n, hurst, t, seed) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return FractionalBrownianMotion(hurst=hurst, t=t, rng=rng).sample(n)
@@ -0,0 +1,53 @@
+import logging
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+@contextmanager
+def file_lock(path):
+    """Holds an exclusive inter-process lock on the file at `path` until the context exits.
+    Blocks until the lock becomes available. Creates the file and its parents if missing.
+    The operating system releases the lock if the holding process crashes.
+    Example:
+    with file_lock('.sb/locks/shared.lock'):
+        deploy_shared_stack()
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a+') as file:
+        if not try_lock(file):
+            logging.info(f"Waiting for lock {path} held by another sb process ...")
+            while not try_lock(file):
+                time.sleep(1)
+        try:
+            yield
+        finally:
+            unlock(file)
+
+
+def try_lock(file) -> bool:
+    """Returns True if the exclusive lock on an open `file` was acquired."""
+    try:
+        if fcntl:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def unlock(file):
+    if fcntl:
+        fcntl.flock(file, fcntl.LOCK_UN)
+    else:
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
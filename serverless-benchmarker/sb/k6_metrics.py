@@ -0,0 +1,238 @@
+# Helpers for the k6 CSV metrics output (i.e., k6_metrics.csv):
+# https://k6.io/docs/results-visualization/csv/
+# Format: metric_name,timestamp,metric_value,check,error,error_code,...
+import csv
+import heapq
+import logging
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import ExitStack
+from itertools import chain
+from pathlib import Path
+
+import numpy as np
+
+HTTP_REQS = 'http_reqs'
+HTTP_REQ_FAILED = 'http_req_failed'
+HTTP_REQ_DURATION = 'http_req_duration'
+DROPPED_ITERATIONS = 'dropped_iterations'
+LIVE_METRICS = {HTTP_REQS, HTTP_REQ_FAILED, HTTP_REQ_DURATION, DROPPED_ITERATIONS}
+
+
+def count_requests(metrics_file) -> int:
+    """Returns the number of HTTP requests in a k6 CSV metrics file."""
+    prefix = f"{HTTP_REQS},"
+    with open(metrics_file) as file:
+        return sum(1 for line in file if line.startswith(prefix))
+
+
+def request_latencies(metrics_file) -> np.ndarray:
+    """Returns the http_req_duration samples of a k6 CSV metrics file in seconds."""
+    prefix = f"{HTTP_REQ_DURATION},"
+    with open(metrics_file) as file:
+        # Format: metric_name,timestamp,metric_value,...
+        durations_ms = [float(line.split(',', 3)[2]) for line in file if line.startswith(prefix)]
+    return np.array(durations_ms) / 1000
+
+
+def merge_metrics(part_files, metrics_file):
+    """Merges the k6 CSV metrics files of multiple load generators (e.g., execution segments)
+    into a single `metrics_file` ordered by timestamp. Timestamps from different hosts are only
+    aligned if their clocks are synchronized (e.g., via NTP).
+    k6 writes its samples only nearly in chronological order, so parts out of order are sorted
+    one at a time into temporary files before streaming the merge.
+    Raises an exception if the files have different columns."""
+    with ExitStack() as stack:
+        files = [stack.enter_context(open(f, newline='')) for f in part_files]
+        headers = [next(csv.reader(f), None) for f in files]
+        header = next((h for h in headers if h), None)
+        if header is None:
+            raise Exception(f"No k6 metrics found in {', '.join(str(f) for f in part_files)}.")
+        if any(h and h != header for h in headers):
+            raise Exception(f"Cannot merge k6 metrics with different columns: {headers}")
+        ts = header.index('timestamp')
+
+        def key(row):
+            return float(row[ts])
+
+        readers = []
+        for part_file, file in zip(part_files, files):
+            if not is_sorted(csv.reader(file), key):
+                logging.info(f"Sorting the k6 metrics of {part_file} by timestamp.")
+                file.seek(0)
+                rows = csv.reader(file)
+                sorted_file = stack.enter_context(tempfile.TemporaryFile('w+', newline=''))
+                csv.writer(sorted_file).writerows([next(rows, []), *sorted(rows, key=key)])
+                file = sorted_file
+            file.seek(0)
+            reader = csv.reader(file)
+            # Skip the header
+            next(reader, None)
+            readers.append(reader)
+        with open(metrics_file, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(header)
+            writer.writerows(heapq.merge(*readers, key=key))
+
+
+def is_sorted(rows, key) -> bool:
+    """Returns whether the `rows` are in ascending order of their `key`."""
+    previous = float('-inf')
+    for row in rows:
+        current = key(row)
+        if current < previous:
+            return False
+        previous = current
+    return True
+
+
+class SecondStats:
+    """Aggregated k6 metrics of a single second."""
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.failures = 0
+        self.dropped = 0
+        self.durations = []
+
+
+class K6MetricsFollower:
+    """Follows a growing k6 CSV metrics file while k6 runs and periodically logs rolling
+    statistics over a sliding window of the last `window` seconds:
+    achieved requests per second (rps), http_req_duration percentiles, error rate,
+    and dropped iterations (i.e., an over-driven load generator running out of VUs).
+    Memory is bounded by the window because older seconds are evicted.
+    Example:
+    follower = K6MetricsFollower('logs/2022-04-01_12-00-00/k6_metrics.csv')
+    follower.start()
+    run_k6()
+    follower.stop()
+    """
+
+    def __init__(self, metrics_file, window=60, interval=10, poll_interval=1) -> None:
+        self.metrics_file = Path(metrics_file)
+        self.window = window
+        self.interval = interval
+        self.poll_interval = poll_interval
+        # Ordered by second because k6 writes samples in (roughly) chronological order
+        self.seconds = OrderedDict()
+        self.columns = None
+        self.partial_line = ''
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.follow, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        """Stops following after reading the remaining lines and logs the final statistics."""
+        self.stopped.set()
+        self.thread.join()
+        self.report()
+
+    def follow(self):
+        file = None
+        next_report = time.monotonic() + self.interval
+        try:
+            while True:
+                # Read once more after stopping to catch the final lines
+                stopping = self.stopped.is_set()
+                if file is None and self.metrics_file.is_file():
+                    file = open(self.metrics_file)
+                if file is not None:
+                    self.read_available(file)
+                if stopping:
+                    break
+                if time.monotonic() >= next_report:
+                    self.report()
+                    next_report += self.interval
+                self.stopped.wait(self.poll_interval)
+        finally:
+            if file is not None:
+                file.close()
+
+    def read_available(self, file):
+        """Processes all complete lines appended to the `file` since the last read."""
+        lines = (self.partial_line + file.read()).split('\n')
+        # The last line is incomplete unless the chunk ends with a newline
+        self.partial_line = lines.pop()
+        for line in lines:
+            self.process_line(line)
+
+    def process_line(self, line):
+        if not line:
+            return
+        row = next(csv.reader([line]))
+        if self.columns is None:
+            self.columns = {name: i for i, name in enumerate(row)}
+            return
+        metric = row[self.columns['metric_name']]
+        if metric not in LIVE_METRICS:
+            return
+        second = int(float(row[self.columns['timestamp']]))
+        value = float(row[self.columns['metric_value']])
+        stats = self.second_stats(second)
+        if stats is None:
+            return
+        if metric == HTTP_REQS:
+            stats.requests += 1
+        elif metric == HTTP_REQ_FAILED:
+            stats.failures += value
+        elif metric == HTTP_REQ_DURATION:
+            stats.durations.append(value)
+        elif metric == DROPPED_ITERATIONS:
+            stats.dropped += value
+
+    def second_stats(self, second):
+        """Returns the stats of a `second` or None if it is outside the sliding window."""
+        if second in self.seconds:
+            return self.seconds[second]
+        latest = next(reversed(self.seconds)) if self.seconds else second
+        if second <= latest - self.window:
+            return None
+        self.seconds[second] = SecondStats()
+        # Keep ordering for rare out-of-order samples
+        if second < latest:
+            self.seconds = OrderedDict(sorted(self.seconds.items()))
+        # Evict seconds that fell out of the sliding window
+        latest = max(latest, second)
+        while next(iter(self.seconds)) <= latest - self.window:
+            self.seconds.popitem(last=False)
+        return self.seconds[second]
+
+    def snapshot(self):
+        """Returns a dict with the statistics of the sliding window or None if empty."""
+        if not self.seconds:
+            return None
+        stats = list(self.seconds.values())
+        first, last = next(iter(self.seconds)), next(reversed(self.seconds))
+        span = last - first + 1
+        requests = sum(s.requests for s in stats)
+        failures = sum(s.failures for s in stats)
+        durations = np.fromiter(chain.from_iterable(s.durations for s in stats), dtype=float)
+        p50, p95, p99 = np.nan, np.nan, np.nan
+        if len(durations) > 0:
+            p50, p95, p99 = np.percentile(durations, [50, 95, 99])
+        return {
+            'seconds': span,
+            'rps': requests / span,
+            'max_rps': max(s.requests for s in stats),
+            'p50': p50,
+            'p95': p95,
+            'p99': p99,
+            'error_rate': failures / requests if requests > 0 else 0.0,
+            'dropped_iterations': sum(s.dropped for s in stats)
+        }
+
+    def report(self):
+        stats = self.snapshot()
+        if stats is None:
+            return
+        logging.info(
+            f"k6 last {stats['seconds']}s: rps={stats['rps']:.1f} (max {stats['max_rps']})"
+            f" http_req_duration p50={stats['p50']:.0f}ms p95={stats['p95']:.0f}ms"
+            f" p99={stats['p99']:.0f}ms errors={stats['error_rate']:.1%}"
+            f" dropped_iterations={stats['dropped_iterations']:.0f}"
+        )
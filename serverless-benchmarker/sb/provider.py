@@ -1,6 +1,7 @@
 import os
 import logging
 import subprocess
+from pathlib import Path
 
 
 class Provider:
@@ -45,6 +46,28 @@ class Provider:
         # Slimmer image alternatives: https://www.pulumi.com/blog/introducing-new-docker-images/
         'pulumi': 'pulumi/pulumi:3.28.0'
     }
+    # Host environment variables configuring provider credentials, which are passed through
+    # to local commands. Otherwise, CLIs and SDKs use their default locations under HOME
+    # (i.e., the host directories of MOUNT_DIRS such as ~/.aws).
+    HOST_CREDENTIAL_ENVS = {
+        'aws': ['AWS_PROFILE', 'AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY', 'AWS_SESSION_TOKEN',
+                'AWS_REGION', 'AWS_DEFAULT_REGION', 'AWS_SHARED_CREDENTIALS_FILE', 'AWS_CONFIG_FILE'],  # noqa: E501
+        'azure': ['AZURE_CONFIG_DIR', 'ARM_CLIENT_ID', 'ARM_CLIENT_SECRET', 'ARM_TENANT_ID',
+                  'ARM_SUBSCRIPTION_ID'],
+        'google': ['CLOUDSDK_CONFIG', 'GOOGLE_APPLICATION_CREDENTIALS', 'GOOGLE_PROJECT'],
+        'ibm': ['IBMCLOUD_HOME', 'IBMCLOUD_API_KEY'],
+        'pulumi': ['PULUMI_HOME', 'PULUMI_ACCESS_TOKEN', 'PULUMI_CONFIG_PASSPHRASE',
+                   'PULUMI_BACKEND_URL']
+    }
+    # Environment variables pointing provider CLIs and SDKs to their credentials relative to
+    # the secrets volume for local execution with `local_credentials: volume`.
+    # IBM Cloud only supports relocating the parent of ~/.bluemix (IBMCLOUD_HOME).
+    VOLUME_CREDENTIAL_ENVS = {
+        'aws': {'AWS_SHARED_CREDENTIALS_FILE': 'credentials', 'AWS_CONFIG_FILE': 'config'},
+        'azure': {'AZURE_CONFIG_DIR': '.'},
+        'google': {'CLOUDSDK_CONFIG': '.'},
+        'pulumi': {'PULUMI_HOME': '.'}
+    }
 
     def __init__(self, name) -> None:
         if name in Provider.SUPPORTED:
@@ -86,6 +109,45 @@ class Provider:
     def mount_dir(self) -> str:
         return Provider.MOUNT_DIRS[self.name]
 
+    def secrets_dir(self):
+        """Returns the host directory of the secrets volume or None if it does not exist."""
+        cmd = ['docker', 'volume', 'inspect', '--format', '{{ .Mountpoint }}', self.volume_name()]
+        try:
+            proc = subprocess.run(cmd, capture_output=True, text=True)
+        except FileNotFoundError:
+            return None
+        if proc.returncode != 0:
+            return None
+        return Path(proc.stdout.strip())
+
+    def host_credential_env(self) -> dict:
+        """Returns the credential variables of the host environment (see HOST_CREDENTIAL_ENVS).
+        Logs a warning if neither these variables nor the default credentials directory exist."""
+        env = {key: os.environ[key] for key in Provider.HOST_CREDENTIAL_ENVS[self.name]
+               if key in os.environ}
+        host_dir = Path.home() / Path(self.mount_dir()).relative_to('/root')
+        if not env and not host_dir.exists():
+            logging.warning(f"No local {self.name} credentials found in {host_dir} or the environment.")  # noqa: E501
+        return env
+
+    def volume_credential_env(self) -> dict:
+        """Returns the environment variables pointing to the credentials of the
+        secrets volume (i.e., the credentials of `sb login`) on the host.
+        Requires a Docker daemon and read access to the volume directory, which is
+        root-only on Linux and unavailable on hosts running Docker in a VM (e.g., macOS).
+        Raises an exception if the credentials are missing or inaccessible."""
+        if self.name not in Provider.VOLUME_CREDENTIAL_ENVS:
+            raise Exception(f"Local execution does not support {self.name} credentials of the secrets volume.")  # noqa: E501
+        secrets_dir = self.secrets_dir()
+        if secrets_dir is None:
+            raise Exception(f"No {self.name} credentials found. Run `sb login {self.name}` first.")
+        if not os.access(secrets_dir, os.R_OK | os.X_OK):
+            raise Exception(f"Cannot read the {self.name} credentials of the secrets volume"
+                            f" {self.volume_name()} at {secrets_dir}."
+                            " Grant the current user read access or use the host credentials.")
+        return {env: str((secrets_dir / path).resolve())
+                for env, path in Provider.VOLUME_CREDENTIAL_ENVS[self.name].items()}
+
     def login_cmd(self) -> str:
         return Provider.LOGIN_CMDS[self.name]
 
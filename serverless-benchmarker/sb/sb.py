@@ -8,6 +8,7 @@ import time
 import fire
 
 from sb.cli.config_cmd import ConfigCmd
+from sb.cli.trace_cmd import TraceCmd
 from sb.benchmark import Benchmark
 from sb.benchmark_spec import BenchmarkSpec, win_vol
 from sb.provider import Provider
@@ -15,14 +16,42 @@ from sb.aws_trace_analyzer import AwsTraceAnalyzer
 from sb.aws_trace_trigger_analyzer import AwsTraceTriggerAnalyzer
 from sb.azure_trace_analyzer import AzureTraceAnalyzer
 from sb.aws_trace_downloader import AwsTraceDownloader
+from sb.workload_analyzer import WorkloadAnalyzer
 from sb.azure_trace_downloader import AzureTraceDownloader
 import sb.aws_trace_migrator as aws_trace_migrator
+import sb.workload_trace as workload_trace
+import sb.trace_io as trace_io
 
 
 SB_IMAGE = 'serverless-benchmarker'
 WAIT_AFTER_PREPARE = 0  # seconds
 
 
+# Trace analyzers for AWS selectable by name. The trigger analysis is the default.
+AWS_TRACE_ANALYZERS = {
+    'trigger': AwsTraceTriggerAnalyzer,
+    'breakdown': AwsTraceAnalyzer
+}
+
+
+def trace_analyzer_class(provider, analyzer=None):
+    """Returns the trace analyzer class for a `provider` string or list of providers.
+    analyzer: name of an AWS trace analyzer (trigger|breakdown). Defaults to trigger.
+    Raises an exception for unsupported providers or analyzers."""
+    # NOTE: support both strings and lists of providers
+    if provider and 'aws' in provider:
+        # TODO: The trigger analyzer replaces the original AwsTraceAnalyzer (breakdown)
+        # for the trigger-bench study!
+        if (analyzer or 'trigger') not in AWS_TRACE_ANALYZERS:
+            raise Exception(f"Unsupported trace analyzer {analyzer}. Supported: {', '.join(AWS_TRACE_ANALYZERS)}.")  # noqa: E501
+        return AWS_TRACE_ANALYZERS[analyzer or 'trigger']
+    elif provider and 'azure' in provider:
+        if analyzer is not None:
+            raise Exception(f"Unsupported trace analyzer {analyzer} for provider {provider}.")
+        return AzureTraceAnalyzer
+    raise Exception(f"Unsupported provider {provider} for trace analyzer.")
+
+
 def main():
     """sb.sb entry point"""
     # Default config for non-member methods (e.g., login and logout)
@@ -71,6 +100,13 @@ class Sb:
         """Migrates traces from old single-line format to new one trace-per-line format."""
         aws_trace_migrator.migrate_traces(log_path, replace)
 
+    @staticmethod
+    def convert_trace(output, *csv_files, id_columns=workload_trace.AZURE_ID_COLUMNS):
+        """Converts CSV workload traces into a memory-mapped binary trace directory.
+        Concatenates the CSV files in time (e.g., daily files of the Azure Functions dataset).
+        Example: sb convert_trace azure.sbtrace invocations_per_function_md.anon.d0*.csv"""
+        workload_trace.convert_trace(csv_files, output, id_columns)
+
     @staticmethod
     def detect_file(file):
         """Returns a detected *_benchmark.py file or None otherwise."""
@@ -105,7 +141,7 @@ Explicitly specify a unique file using `--file=FILE|pattern`.')
     # local code is directly linked into the container (which might run another Python version).
     # To keep development easy, we want to avoid re-building the container after each change.
     def __init__(self, file='*_benchmark.py', local=False, debug=True,
-                 log_level='INFO', docker=False):
+                 log_level='INFO', docker=False, instance=None, executor=None):
         """Inits the Serverless Benchmarker CLI API.
 
         Args:
@@ -117,26 +153,38 @@ Explicitly specify a unique file using `--file=FILE|pattern`.')
             log_level: Python log level: https://docs.python.org/3/library/logging.html#levels
             docker: Flag to enable experimental docker mode, which runs sb itself within Docker.
                 Important: Unsupported on Linux host (might only work with root user).
+            instance: Optional name to run multiple isolated copies of the same benchmark
+                concurrently (e.g., one per trigger). Each instance has its own sb config,
+                logs directory, and cloud stacks. See sb.experiment_runner.
+            executor: Backend for spec.run() commands: docker|local.
+                Defaults to local in local execution mode and docker otherwise.
         """
         level = logging.getLevelName(log_level)
         logging.basicConfig(stream=sys.stdout, level=level)
+        self.instance = instance
         self.initialize(file)
         # Python Fire command groups:
         # https://github.com/google/python-fire/blob/master/docs/guide.md#grouping-commands
         # Only available when properly initialized
         if self.bench:
             self.config = ConfigCmd(self.bench)
+        # Also available without benchmark for explicit log paths
+        self.trace = TraceCmd(self.bench)
         # Flags
         self.local = local
         self.debug = debug
         self.log_level = log_level
         self.docker = docker
+        # Local mode executes spec.run() commands directly on the host
+        executor = executor or ('local' if self.local else None)
+        if self.bench and executor:
+            self.bench.spec.set_executor(executor)
 
     def initialize(self, file):
         """Detects and bootstraps the sb benchmark with its configuration (i.e., benchmark spec)"""
         bench_file = Sb.detect_file(file)
         if bench_file is not None:
-            self.bench = Benchmark.initialize(bench_file)
+            self.bench = Benchmark.initialize(bench_file, self.instance)
         else:
             self.bench = None
 
@@ -211,6 +259,8 @@ Use --log_level=DEBUG to get more details.")
                          * default: single
                          * supported patterns: steady|fluctuating|spikes|jump
                          * numeric value for sequential iterations: e.g., 10
+                         * composite: multiple concurrent workloads (see workloads)
+                         * burst: simultaneous requests after idle periods (see burst_size)
                          * custom: when providing a custom workload_trace CSV
                                    or a custom k6 workload_options JSON
         Optional arguments:
@@ -221,8 +271,35 @@ Use --log_level=DEBUG to get more details.")
           workload_trace=None: path to a CSV file with per minute invocation rates.
                                Format: single column called "InvocationsPerMinute".
                                Examples: see data/workload_traces.
+                               Alternatively: path to a binary trace directory of many
+                               functions created by `sb convert_trace`.
+          trace_function=None: function id within a multi-function binary trace.
+          trace_start=0, trace_end=None: window [start, end) of the trace in minutes.
+          workloads=None: list of workload entries for the workload_type `composite`
+                          with one time-aligned k6 scenario per entry.
+                          Example: --workloads='[{"workload_type": "steady", "endpoint": "http"},
+                                   {"workload_type": "spikes", "endpoint": "queue"}]'
+          arrival_process=None: replays precomputed request timestamps of a poisson|gamma
+                                process to reproduce sub-second bursts (open loop).
+                                Requires expected_latency for sizing the VUs.
+          arrival_cv=2: coefficient of variation of gamma inter-arrival times.
+          burst_size=None: number of simultaneous requests per burst (required for burst).
+          burst_interval=900: seconds between the starts of bursts (idle time for cold starts).
+          burst_repetitions=1: number of bursts.
+          hurst=0.8: Hurst parameter in (0, 1) of the fractional Brownian motion distributing
+                     the requests of a minute across seconds. Lower values are more volatile.
+                     The seed is configurable via the env SB_WORKLOADGEN_SEED (default 11).
           seconds_to_skip=3 * 60: number of seconds of a workload trace that are skipped to
                                   alleviate the bootstrapping issue of 0 rps at t=0 seconds.
+          expected_latency=None: expected request latency in seconds or path to the
+                                 k6_metrics.csv of a previous run for sizing the k6 VUs
+                                 (preAllocatedVUs and maxVUs) of a workload trace.
+          stage_tolerance=None: encodes a workload trace into compact k6 stages with linear
+                                ramps that deviate at most this many requests per second
+                                and at most 1% in total invocations. Rate changes beyond the
+                                tolerance step within one second like the default encoding.
+                                Reduces the startup time and memory of k6 for long traces.
+          max_stages=None: caps the number of compact k6 stages by raising the tolerance.
         """
         self.check_bench_init()
         if(self.docker):
@@ -235,55 +312,91 @@ Use --log_level=DEBUG to get more details.")
             self.bench.invoke(workload_type, **kwargs)
         return self
 
-    def get_traces(self):
-        """Downloads distributed request traces for the previous invocation."""
+    def get_traces(self, analyze=False, analyzer=None):
+        """Downloads distributed request traces for the previous invocation.
+        Saves compressed traces into traces.json.zst by default. The config option
+        trace_compression selects another compression (zst|gz|none).
+        analyze: analyzes the traces in a worker process while downloading them such that
+                 the results of analyze_traces (e.g., trigger.csv) are ready afterwards.
+        analyzer: trace analyzer for analyze (see analyze_traces).
+        Example: sb get_traces --analyze"""
         self.check_bench_init()
         if(not self.local):
-            self.run_in_docker('get_traces', local=True)
+            analyzer_arg = f" --analyzer={analyzer}" if analyzer else ''
+            self.run_in_docker(f"get_traces --analyze={analyze}{analyzer_arg}", local=True)
         else:
             self.bench.chdir()
             self.bench.save_config_to_logs()
             self.bench.save_workload_options_to_logs()
-            trace_downloader = None
-            # NOTE: support both strings and lists of providers
-            provider = self.bench.spec['provider']
-            if provider and 'aws' in provider:
-                trace_downloader = AwsTraceDownloader(self.bench.spec)
-            elif provider and 'azure' in provider:
-                trace_downloader = AzureTraceDownloader(self.bench.spec)
-            else:
-                logging.error('Unsupported provider for trace downloader')
-            trace_downloader.get_traces()
+            analyzer_class = None
+            if analyze:
+                analyzer_class = trace_analyzer_class(self.bench.spec['provider'], analyzer)
+            self.trace_downloader().get_traces(analyzer_class)
             self.bench.fix_permissions()
         return self
 
+    def wait_for_traces(self, timeout=15 * 60, interval=30):
+        """Waits until the traces of the previous invocation are available.
+        Polls the number of traces until it stabilizes near the number of k6 requests.
+        Replaces fixed waits before get_traces. For example:
+        sb invoke custom wait_for_traces get_traces
+        timeout: maximum number of seconds to wait.
+        interval: number of seconds between polls."""
+        self.check_bench_init()
+        if(not self.local):
+            self.run_in_docker(f"wait_for_traces --timeout={timeout} --interval={interval}",
+                               local=True)
+        else:
+            self.bench.chdir()
+            self.trace_downloader().wait_for_traces(timeout=timeout, interval=interval)
+        return self
+
+    def trace_downloader(self):
+        """Returns the trace downloader for the provider of the benchmark."""
+        # NOTE: support both strings and lists of providers
+        provider = self.bench.spec['provider']
+        if provider and 'aws' in provider:
+            return AwsTraceDownloader(self.bench.spec)
+        elif provider and 'azure' in provider:
+            return AzureTraceDownloader(self.bench.spec)
+        else:
+            raise Exception(f"Unsupported provider {provider} for trace downloader.")
+
     # TODO: Change default provider to aws to maintain same behavior
     # MAYBE: Expose provider option to user or auto-detect based on trace
-    def analyze_traces(self, log_path=None, provider='azure'):
+    def analyze_traces(self, log_path=None, provider='azure', analyzer=None):
         """Creates a trace breakdown analysis with the output files:
         * trace_breakdown.csv for valid traces
         * invalid_traces.csv for invalid traces (e.g., incomplete)
         log_path: path to `traces.json` file with one trace per line.
-                  Defaults to last invocation if not provided."""
+                  Supports compressed `traces.json.zst` and `traces.json.gz` files.
+                  Defaults to last invocation if not provided.
+        analyzer: AWS trace analyzer: trigger (default, trigger.csv) or breakdown
+                  (trace_breakdown.csv and shape_index.json for `sb trace shapes`).
+        Example: sb analyze_traces --analyzer=breakdown"""
         # Default to last execution if no log path provided
         if log_path is None:
             self.check_bench_init()
             logs_directory = self.bench.spec.logs_directory()
-            log_path = logs_directory.joinpath('traces.json')
+            log_path = trace_io.find_traces(logs_directory) or logs_directory / trace_io.TRACES_FILE
             provider = self.bench.spec['provider']
-        # Instantiate trace analyzer
-        trace_analyzer = None
-        # NOTE: support both strings and lists of providers
-        if provider and 'aws' in provider:
-            # TODO: This overwrites the original analyzer for the trigger-bench study!
-            trace_analyzer = AwsTraceAnalyzer(log_path)
-            trace_analyzer = AwsTraceTriggerAnalyzer(log_path)
-        elif provider and 'azure' in provider:
-            trace_analyzer = AzureTraceAnalyzer(log_path)
-        else:
-            logging.error('Unsupported provider for trace analyzer')
         # Run trace analysis
-        trace_analyzer.analyze_traces()
+        trace_analyzer_class(provider, analyzer)(log_path).analyze_traces()
+        return self
+
+    def analyze_workload(self, metrics_file=None, workload_options=None):
+        """Compares the achieved k6 request rate with the target arrival rates and saves
+        the deviation, dropped iterations, and VU exhaustion per stage into
+        workload_validation.csv. Runs automatically after invoke.
+        metrics_file: path to a k6_metrics.csv file.
+        workload_options: path to the k6 options JSON file used for the invocation.
+        Both default to the last invocation if not provided."""
+        if metrics_file is None or workload_options is None:
+            self.check_bench_init()
+            self.bench.chdir()
+            metrics_file = metrics_file or self.bench.spec.workload_log_file()
+            workload_options = workload_options or self.bench.spec.workload_file_paths()[1]
+        WorkloadAnalyzer(metrics_file, workload_options).analyze_workload()
         return self
 
     def fix_permissions(self):
@@ -364,6 +477,9 @@ Use --log_level=DEBUG to get more details.")
         local_flag = self.local
         if local is not None:
             local_flag = local
+        instance_flag = ''
+        if self.instance:
+            instance_flag = f" --instance={self.instance}"
         docker_cmd = (
             f"docker run --rm"
             f"{interactive_tty}"  # Allows attaching an interactive debug console
@@ -374,7 +490,10 @@ Use --log_level=DEBUG to get more details.")
             f"{user_permissions}"
             f" {SB_IMAGE}"
             f" sb {method} --file='{bench_file}' --log_level={self.log_level}"
-            f" --local={local_flag} --docker=False"
+            f" --local={local_flag} --docker=False{instance_flag}"
+            # The local flag only prevents re-entering Docker. Commands within the sb container
+            # run in sibling containers rather than on the host paths of the benchmark.
+            " --executor=docker"
         )
         logging.info(f"docker={docker_cmd}")
         # MAYBE: implement more robust subprocess invocation with log streaming and
@@ -0,0 +1,129 @@
+# Topology signatures of traces and an incremental index of trace shapes.
+# The signature hashes the canonical topology of a trace: the tree of (sub)segments labelled
+# by origin and normalized name (without random suffixes of generated resource names)
+# with sorted siblings. Cold and warm starts share a signature because the
+# Initialization subsegments of Lambda functions are omitted.
+# The ShapeIndex maps signatures to trace ids and per-category latency statistics.
+# The AwsTraceAnalyzer updates it while analyzing traces and saves it as shape_index.json
+# next to the traces such that execution paths of different runs can be compared
+# without re-scanning their traces (see `sb trace shapes`).
+import hashlib
+import json
+import re
+from datetime import timedelta
+from pathlib import Path
+
+SHAPE_INDEX_FILE = 'shape_index.json'
+SIGNATURE_FIELD = 'signature'
+SIGNATURE_LENGTH = 16
+# Random suffix of generated names (e.g., wildrydes-FaceDetectionFunction-UB72KZMWRLCF)
+RANDOM_SUFFIX = re.compile(r'-(?=[A-Za-z0-9]*\d)[A-Za-z0-9]{7,}$')
+# Breakdown fields aggregated per signature
+STAT_FIELDS = [
+    'duration',
+    'orchestration',
+    'trigger',
+    'container_initialization',
+    'runtime_initialization',
+    'computation',
+    'queing',
+    'overhead',
+    'external_service',
+    'unclassified'
+]
+
+
+def normalize_name(name) -> str:
+    """Replaces random suffixes of generated resource names with a wildcard."""
+    return RANDOM_SUFFIX.sub('-*', name or '')
+
+
+def is_cold_start_segment(parent_doc, doc) -> bool:
+    return doc.get('name') == 'Initialization' and \
+        parent_doc.get('origin') == 'AWS::Lambda::Function'
+
+
+def topology(G, node) -> list:
+    """Returns the canonical topology of the span graph G below `node` as nested lists of
+    [label, children] where label is origin:name and children are sorted."""
+    doc = G.nodes[node]['doc']
+    children = [topology(G, child) for child in G.successors(node)
+                if not is_cold_start_segment(doc, G.nodes[child]['doc'])]
+    return [f"{doc.get('origin', '')}:{normalize_name(doc.get('name'))}", sorted(children)]
+
+
+def topology_signature(G) -> str:
+    """Returns a short hash of the canonical topology of the span graph G from its root."""
+    canonical = json.dumps(topology(G, G.graph['start']), separators=(',', ':'))
+    return hashlib.sha1(canonical.encode()).hexdigest()[:SIGNATURE_LENGTH]
+
+
+def seconds(value):
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    return value
+
+
+class ShapeIndex:
+    """Incremental index: signature => trace ids and latency statistics (count, sum, min, max
+    in seconds) per breakdown category. Example:
+    index = ShapeIndex.load('logs/2022-04-01_01-11-31/shape_index.json')
+    index.add(dict(zip(fields, trace_breakdown)))
+    index.save('logs/2022-04-01_01-11-31/shape_index.json')
+    """
+
+    def __init__(self, shapes=None) -> None:
+        self.shapes = shapes or dict()
+
+    @classmethod
+    def load(cls, index_file):
+        with open(index_file) as file:
+            return cls(json.load(file))
+
+    def save(self, index_file):
+        with open(index_file, 'w') as file:
+            json.dump(self.shapes, file)
+
+    def __len__(self) -> int:
+        return len(self.shapes)
+
+    def add(self, breakdown):
+        """Adds a trace breakdown (dict of CSV_FIELDS and signature) to the index."""
+        shape = self.shapes.setdefault(breakdown[SIGNATURE_FIELD], {
+            'services': sorted(set(breakdown['services'])),
+            'longest_path_names': breakdown['longest_path_names'],
+            'trace_ids': [],
+            'stats': dict()
+        })
+        shape['trace_ids'].append(breakdown['trace_id'])
+        for field in STAT_FIELDS:
+            value = seconds(breakdown.get(field))
+            if value is None:
+                continue
+            stats = shape['stats'].get(field)
+            if stats is None:
+                shape['stats'][field] = {'count': 1, 'sum': value, 'min': value, 'max': value}
+            else:
+                stats['count'] += 1
+                stats['sum'] += value
+                stats['min'] = min(stats['min'], value)
+                stats['max'] = max(stats['max'], value)
+
+    def count(self, signature) -> int:
+        shape = self.shapes.get(signature)
+        return len(shape['trace_ids']) if shape else 0
+
+    def mean(self, signature, field='duration'):
+        """Returns the mean of a breakdown field in seconds or None if unavailable."""
+        stats = self.shapes.get(signature, {}).get('stats', {}).get(field)
+        if not stats:
+            return None
+        return stats['sum'] / stats['count']
+
+
+def shape_index_file(log_path) -> Path:
+    """Returns the shape index next to a traces file or within a logs directory."""
+    path = Path(log_path)
+    if path.is_dir():
+        return path / SHAPE_INDEX_FILE
+    return path.parent / SHAPE_INDEX_FILE
@@ -0,0 +1,84 @@
+import csv
+import logging
+from collections import Counter
+
+# Error codes of invalid traces
+MISSING_DURATION = 'missing_duration'
+IN_PROGRESS = 'in_progress'
+SEGMENT_ERROR = 'segment_error'
+EMPTY_NODE = 'empty_node'
+MISSING_PARENT = 'missing_parent'
+MISSING_ROOT = 'missing_root'
+START_MISMATCH = 'start_mismatch'
+END_MISMATCH = 'end_mismatch'
+DURATION_MISMATCH = 'duration_mismatch'
+BREAKDOWN_MISMATCH = 'breakdown_mismatch'
+COLD_START_MISMATCH = 'cold_start_mismatch'
+CLOCK_SKEW = 'clock_skew'
+CYCLE = 'cycle'
+# Number of example trace ids per error code
+NUM_EXAMPLES = 3
+SUMMARY_FIELDS = ['code', 'count', 'percent', 'example_trace_ids']
+
+
+class TraceError(Exception):
+    """Invalid trace with a structured error `code` (e.g., IN_PROGRESS) for aggregation."""
+
+    def __init__(self, code, message) -> None:
+        super().__init__(message)
+        self.code = code
+
+
+class TraceInvariantError(TraceError, AssertionError):
+    """Violated invariant of the trace breakdown (previously raised as assertion)."""
+
+
+def error_code(e) -> str:
+    """Returns the code of a TraceError or the class name of other exceptions (e.g., KeyError)."""
+    if isinstance(e, TraceError):
+        return e.code
+    return type(e).__name__
+
+
+class InvalidTraceSummary:
+    """Streaming aggregation of invalid traces into counts per error code with
+    a few example trace ids. Uses constant memory per error code.
+    Example:
+    summary = InvalidTraceSummary()
+    summary.add(error_code(e), trace_id)
+    summary.save('invalid_summary.csv', num_traces)
+    """
+
+    def __init__(self, num_examples=NUM_EXAMPLES) -> None:
+        self.num_examples = num_examples
+        self.counts = Counter()
+        self.examples = dict()
+
+    def add(self, code, trace_id):
+        self.counts[code] += 1
+        examples = self.examples.setdefault(code, [])
+        if len(examples) < self.num_examples:
+            examples.append(trace_id)
+
+    def __len__(self) -> int:
+        return sum(self.counts.values())
+
+    def rows(self, num_traces) -> list:
+        """Returns rows of SUMMARY_FIELDS ordered by decreasing count.
+        num_traces: total number of valid and invalid traces for the percentage."""
+        return [
+            [code, count, round(count / num_traces * 100, 2) if num_traces else None,
+             ' '.join(str(id) for id in self.examples[code])]
+            for code, count in self.counts.most_common()
+        ]
+
+    def save(self, summary_file, num_traces):
+        """Writes the summary CSV and logs the most common error codes."""
+        rows = self.rows(num_traces)
+        with open(summary_file, 'w') as file:
+            writer = csv.writer(file, quoting=csv.QUOTE_MINIMAL)
+            writer.writerow(SUMMARY_FIELDS)
+            writer.writerows(rows)
+        if rows:
+            reasons = ', '.join(f"{code}: {count} ({percent}%)" for code, count, percent, _ in rows)
+            logging.warning(f"Invalid traces by error code: {reasons}. Written to {summary_file}.")
@@ -0,0 +1,212 @@
+# Sidecar index for random access into (compressed) traces.json files.
+# The index trace_index.db next to the traces file is a SQLite table that maps each trace id
+# to its root trace id and byte position: `offset` and `length` of the trace line within the
+# decompressed data starting at the compressed byte offset `frame`.
+# B-tree indexes on trace_id and root_trace_id make lookups logarithmic in the number of
+# traces instead of scanning the whole index. Indexing a traces file on demand (build_index)
+# still reads all traces once.
+# * traces.json: frame is 0 and the offset is the file offset (read via mmap)
+# * traces.json.zst: written in independent frames of about FRAME_SIZE decompressed bytes
+#   such that reading a trace decompresses at most one frame
+# * traces.json.gz: frame is 0. Reading a trace decompresses all preceding data.
+import gzip
+import json
+import logging
+import mmap
+import os
+import sqlite3
+from pathlib import Path
+
+from sb.aws_trace_trigger_analyzer import extract_trace_id, extract_root_trace_id
+from sb.trace_io import find_traces, open_traces, ZSTD_LEVEL
+
+INDEX_FILE = 'trace_index.db'
+INDEX_FIELDS = ['trace_id', 'root_trace_id', 'frame', 'offset', 'length']
+# Rows keep the order of the traces file (rowid)
+CREATE_TABLE = 'CREATE TABLE traces (trace_id TEXT, root_trace_id TEXT, frame INTEGER, offset INTEGER, length INTEGER)'  # noqa: E501
+# Created after inserting all rows, which is faster than updating them on every insert
+CREATE_INDEXES = [
+    'CREATE INDEX traces_trace_id ON traces (trace_id)',
+    'CREATE INDEX traces_root_trace_id ON traces (root_trace_id)'
+]
+INSERT_ENTRY = 'INSERT INTO traces VALUES (?, ?, ?, ?, ?)'
+# Decompressed bytes per zstd frame
+FRAME_SIZE = 1 << 20
+
+
+def index_file(trace_file) -> Path:
+    return Path(trace_file).parent / INDEX_FILE
+
+
+class IndexDatabase:
+    """Writes index entries into a new SQLite index at `index_path`.
+    Replaces an existing index only once closed such that readers never see partial indexes."""
+
+    def __init__(self, index_path) -> None:
+        self.index_path = Path(index_path)
+        self.tmp_path = self.index_path.with_name(f"{self.index_path.name}.tmp")
+        if self.tmp_path.exists():
+            self.tmp_path.unlink()
+        self.db = sqlite3.connect(self.tmp_path)
+        # No rollback journal needed because the index is only used once complete
+        self.db.execute('PRAGMA journal_mode = OFF')
+        self.db.execute(CREATE_TABLE)
+
+    def add(self, trace_id, root_trace_id, frame, offset, length):
+        self.db.execute(INSERT_ENTRY, (trace_id, root_trace_id, frame, offset, length))
+
+    def close(self):
+        for statement in CREATE_INDEXES:
+            self.db.execute(statement)
+        self.db.commit()
+        self.db.close()
+        os.replace(self.tmp_path, self.index_path)
+
+
+def trace_keys(line) -> tuple:
+    """Returns the trace id and root trace id (or None) of a JSON-formatted trace line.
+    Supports AWS X-Ray traces and Azure Insights traces with `attrs` (see AzureTraceDownloader).
+    """
+    trace_id = extract_trace_id(line)
+    if trace_id:
+        return trace_id, extract_root_trace_id(line)
+    trace = json.loads(line)
+    if 'attrs' in trace:
+        return trace['attrs'].get('traceId'), trace['attrs'].get('rootTraceId')
+    return trace.get('Id'), None
+
+
+class IndexedTraceWriter:
+    """Writes trace lines into a (compressed) traces file and its index (see module docs).
+    Drop-in replacement for open_traces(trace_file, 'w') in trace downloaders."""
+
+    def __init__(self, trace_file, frame_size=FRAME_SIZE) -> None:
+        self.trace_file = Path(trace_file)
+        self.frame_size = frame_size
+        self.file = open(self.trace_file, 'wb')
+        self.zstd = None
+        suffix = self.trace_file.suffix
+        if suffix == '.zst':
+            import zstandard
+            self.zstd = zstandard
+            compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, threads=-1)
+            self.stream = compressor.stream_writer(self.file, closefd=False)
+        elif suffix == '.gz':
+            self.stream = gzip.GzipFile(fileobj=self.file, mode='wb')
+        else:
+            self.stream = self.file
+        self.index = IndexDatabase(index_file(self.trace_file))
+        self.frame = 0
+        self.offset = 0
+
+    def write(self, line):
+        data = line.encode()
+        trace_id, root_trace_id = trace_keys(line)
+        self.index.add(trace_id, root_trace_id, self.frame, self.offset, len(data))
+        self.stream.write(data)
+        self.offset += len(data)
+        if self.zstd and self.offset >= self.frame_size:
+            self.stream.flush(self.zstd.FLUSH_FRAME)
+            self.frame = self.file.tell()
+            self.offset = 0
+
+    def close(self):
+        if self.stream is not self.file:
+            self.stream.close()
+        self.file.close()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def resolve_trace_file(log_path) -> Path:
+    """Returns the traces file at `log_path` or within the logs directory `log_path`.
+    Raises a FileNotFoundError if there is none."""
+    path = Path(log_path)
+    if path.is_dir():
+        trace_file = find_traces(path)
+        if trace_file is None:
+            raise FileNotFoundError(f"No traces file found in {path}.")
+        return trace_file
+    return path
+
+
+def build_index(trace_file) -> Path:
+    """Builds the index for an existing traces file on demand and returns its path.
+    Compressed files are indexed as a single frame (i.e., reading decompresses
+    all preceding data) because their frame boundaries are unknown."""
+    path = index_file(trace_file)
+    offset = 0
+    index = IndexDatabase(path)
+    with open_traces(trace_file) as traces:
+        for line in traces:
+            length = len(line.encode())
+            trace_id, root_trace_id = trace_keys(line)
+            index.add(trace_id, root_trace_id, 0, offset, length)
+            offset += length
+    index.close()
+    logging.info(f"Indexed {trace_file} into {path}.")
+    return path
+
+
+def find_entries(index_path, trace_id) -> list:
+    """Returns the index entries (dicts of INDEX_FIELDS) of the trace `trace_id` or,
+    if there is none, the entries of traces with the root trace id `trace_id`."""
+    # Read-only such that a missing index raises an error instead of creating an empty one
+    db = sqlite3.connect(f"{Path(index_path).resolve().as_uri()}?mode=ro", uri=True)
+    db.row_factory = sqlite3.Row
+    try:
+        for field in ['trace_id', 'root_trace_id']:
+            rows = db.execute(f"SELECT * FROM traces WHERE {field} = ? ORDER BY rowid",
+                              (trace_id,)).fetchall()
+            if rows:
+                return [dict(row) for row in rows]
+        return []
+    finally:
+        db.close()
+
+
+def read_trace(trace_file, entry) -> str:
+    """Reads the trace line of an index `entry` from a (compressed) traces file."""
+    frame, offset, length = entry['frame'], entry['offset'], entry['length']
+    suffix = Path(trace_file).suffix
+    with open(trace_file, 'rb') as file:
+        if suffix == '.zst':
+            import zstandard
+            file.seek(frame)
+            stream = zstandard.ZstdDecompressor().stream_reader(file, read_across_frames=True)
+            stream.seek(offset)
+            data = stream.read(length)
+        elif suffix == '.gz':
+            stream = gzip.GzipFile(fileobj=file, mode='rb')
+            stream.seek(offset)
+            data = stream.read(length)
+        else:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                data = mm[offset:offset + length]
+    return data.decode()
+
+
+class TraceIndex:
+    """Looks up traces by trace id or root trace id in a traces file.
+    Builds the index on demand if the traces file has none.
+    Example:
+    trace = TraceIndex('logs/2022-04-01_01-11-31').traces('1-5759e988-bd862e3fe1be46a994272793')[0]
+    """
+
+    def __init__(self, log_path) -> None:
+        """log_path: path to a traces file or the logs directory containing it."""
+        self.trace_file = resolve_trace_file(log_path)
+        self.index_path = index_file(self.trace_file)
+        if not self.index_path.is_file():
+            build_index(self.trace_file)
+
+    def traces(self, trace_id) -> list:
+        """Returns the parsed traces with the id or root trace id `trace_id`."""
+        return [json.loads(read_trace(self.trace_file, e))
+                for e in find_entries(self.index_path, trace_id)]
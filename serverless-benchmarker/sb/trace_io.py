@@ -0,0 +1,136 @@
+# Transparent compression for traces.json files with one JSON-formatted trace per line.
+# Trace downloaders write traces.json.zst (default), traces.json.gz, or plain traces.json
+# depending on the `trace_compression` config and all trace readers accept any of them.
+# Writers compress while streaming (zstd uses multiple worker threads) and readers
+# decompress ahead in a background thread such that decompression overlaps with parsing.
+import gzip
+import io
+import queue
+import threading
+from pathlib import Path
+
+TRACES_FILE = 'traces.json'
+# Compression name => file suffix
+COMPRESSIONS = {
+    'zst': '.zst',
+    'gz': '.gz',
+    'none': ''
+}
+DEFAULT_COMPRESSION = 'zst'
+ZSTD_LEVEL = 3
+# Size of decompressed blocks and number of blocks to decompress ahead
+BLOCK_SIZE = 1 << 20
+PREFETCH_BLOCKS = 8
+
+
+def traces_file(log_path, compression=None) -> Path:
+    """Returns the path of the traces file to write into the directory `log_path`.
+    compression: zst|gz|none (default: zst)"""
+    compression = compression or DEFAULT_COMPRESSION
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unsupported trace compression {compression}. Supported: {', '.join(COMPRESSIONS)}")  # noqa: E501
+    return Path(log_path) / f"{TRACES_FILE}{COMPRESSIONS[compression]}"
+
+
+def find_traces(log_path):
+    """Returns the path of an existing (compressed) traces file within
+    the directory `log_path` or None if there is none."""
+    for suffix in COMPRESSIONS.values():
+        path = Path(log_path) / f"{TRACES_FILE}{suffix}"
+        if path.is_file():
+            return path
+    return None
+
+
+def is_traces_file(path) -> bool:
+    return Path(path).name in {f"{TRACES_FILE}{suffix}" for suffix in COMPRESSIONS.values()}
+
+
+def with_stem(path, stem) -> Path:
+    """Renames a traces file while keeping its compression suffix.
+    Example: with_stem('logs/traces.json.zst', 'traces_v2') => logs/traces_v2.json.zst"""
+    path = Path(path)
+    return path.with_name(stem + path.name[len(path.name.split('.')[0]):])
+
+
+def open_traces(path, mode='r'):
+    """Opens a traces file in text mode for reading ('r') or writing ('w').
+    Chooses the compression based on the file suffix (.zst, .gz, or none)."""
+    if mode not in {'r', 'w'}:
+        raise ValueError(f"Unsupported mode {mode}. Use 'r' or 'w'.")
+    suffix = Path(path).suffix
+    if suffix == '.zst':
+        import zstandard
+        if mode == 'w':
+            compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, threads=-1)
+            return zstandard.open(path, 'wt', cctx=compressor)
+        # Traces files can consist of multiple independent frames (see trace_index)
+        file = open(path, 'rb')
+        stream = zstandard.ZstdDecompressor().stream_reader(file, read_across_frames=True, closefd=True)  # noqa: E501
+    elif suffix == '.gz':
+        if mode == 'w':
+            return gzip.open(path, 'wt')
+        stream = gzip.open(path, 'rb')
+    else:
+        return open(path, mode)
+    return io.TextIOWrapper(io.BufferedReader(PrefetchReader(stream), BLOCK_SIZE))
+
+
+class PrefetchReader(io.RawIOBase):
+    """Reads blocks from a (decompressing) binary stream ahead in a background thread.
+    zstandard and zlib release the GIL while decompressing, so decompression runs
+    in parallel with the consumer (e.g., JSON parsing)."""
+
+    def __init__(self, stream, block_size=BLOCK_SIZE, depth=PREFETCH_BLOCKS) -> None:
+        self.stream = stream
+        self.block_size = block_size
+        self.blocks = queue.Queue(maxsize=depth)
+        self.block = memoryview(b'')
+        self.eof = False
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.prefetch, daemon=True)
+        self.thread.start()
+
+    def prefetch(self):
+        try:
+            while not self.stopped.is_set():
+                block = self.stream.read(self.block_size)
+                self.put(block)
+                if not block:
+                    return
+        except Exception as e:
+            self.put(e)
+
+    def put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.blocks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if not self.block:
+            if self.eof:
+                return 0
+            item = self.blocks.get()
+            if isinstance(item, Exception):
+                raise item
+            if not item:
+                self.eof = True
+                return 0
+            self.block = memoryview(item)
+        n = min(len(buffer), len(self.block))
+        buffer[:n] = self.block[:n]
+        self.block = self.block[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            self.stopped.set()
+            self.thread.join()
+            self.stream.close()
+        super().close()
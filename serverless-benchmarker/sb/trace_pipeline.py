@@ -0,0 +1,94 @@
+# Analyze-while-downloading pipeline for traces.json files.
+# Trace downloaders write each trace line into the traces file and put it into a bounded
+# queue consumed by a trace analyzer (e.g., AwsTraceTriggerAnalyzer) in a worker process.
+# Hence, analysis overlaps with the (network-bound) download and its results
+# (e.g., trigger.csv) are ready when the download completes.
+# Analyzers correcting clock skew re-analyze the traces file once the download completes
+# if the clock offsets learned across all traces are non-zero (see clock_skew).
+import logging
+import multiprocessing
+import queue
+from contextlib import nullcontext
+
+from sb.clock_skew import estimate_offsets
+from sb.trace_io import open_traces
+
+# Maximum number of trace lines buffered between downloader and analyzer
+QUEUE_SIZE = 1000
+# Seconds between liveness checks of the analyzer while the queue is full
+PUT_TIMEOUT = 1
+DONE = None
+
+
+class TracePipeline:
+    """Context manager that streams trace lines into `analyzer.analyze_lines` running
+    in a worker process. The analyzer must be picklable and its log_path should point to
+    the traces file being downloaded because it writes its results next to it.
+    The traces file must be complete when the pipeline exits (see correct_clock_skew).
+    Example:
+    with TracePipeline(AwsTraceTriggerAnalyzer(trace_file)) as pipeline:
+        for line in download():
+            pipeline.put(line)
+    Raises an exception on exit if the analyzer failed.
+    """
+
+    def __init__(self, analyzer, maxsize=QUEUE_SIZE) -> None:
+        self.analyzer = analyzer
+        self.lines = multiprocessing.Queue(maxsize=maxsize)
+        self.process = multiprocessing.Process(target=analyze_lines,
+                                               args=(analyzer, self.lines), daemon=True)
+
+    def __enter__(self):
+        self.process.start()
+        return self
+
+    def put(self, line):
+        """Puts a trace line into the queue. Blocks while the queue is full (backpressure).
+        Raises an exception if the analyzer process terminated early."""
+        while True:
+            try:
+                self.lines.put(line, timeout=PUT_TIMEOUT)
+                return
+            except queue.Full:
+                if not self.process.is_alive():
+                    raise Exception(f"Trace analyzer {type(self.analyzer).__name__} terminated with exit code {self.process.exitcode}.")  # noqa: E501
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not self.process.is_alive():
+            self.process.join()
+        else:
+            # Let the analyzer finish the traces downloaded so far, even after a failed download
+            self.put(DONE)
+            self.process.join()
+        if self.process.exitcode != 0 and exc_type is None:
+            raise Exception(f"Trace analyzer {type(self.analyzer).__name__} failed with exit code {self.process.exitcode}.")  # noqa: E501
+        if exc_type is None:
+            correct_clock_skew(self.analyzer)
+        return False
+
+
+def open_pipeline(analyzer_class, trace_file):
+    """Returns a TracePipeline into an `analyzer_class(trace_file)` or
+    a null context yielding None if `analyzer_class` is None."""
+    if analyzer_class is None:
+        return nullcontext()
+    return TracePipeline(analyzer_class(trace_file))
+
+
+def analyze_lines(analyzer, lines):
+    """Runs the `analyzer` on the lines of the queue `lines` until DONE within a worker process."""
+    logging.debug(f"Analyzing traces with {type(analyzer).__name__} while downloading.")
+    analyzer.analyze_lines(iter(lines.get, DONE))
+
+
+def correct_clock_skew(analyzer):
+    """Re-analyzes the downloaded traces with clock skew correction if the `analyzer` corrects
+    clock skew because streamed traces are analyzed without the offsets learned across all traces.
+    Keeps the streamed results if all clocks agree. Saves the offsets into clock_offsets.csv."""
+    if not getattr(analyzer, 'correct_clock_skew', False):
+        return
+    clock_offsets = estimate_offsets(analyzer.log_path)
+    if clock_offsets:
+        logging.info(f"Re-analyzing the traces with clock skew correction using {type(analyzer).__name__}.")  # noqa: E501
+        with open_traces(analyzer.log_path) as traces_json:
+            analyzer.analyze_lines(traces_json, clock_offsets)
@@ -0,0 +1,270 @@
+# Shape-aware batched latency breakdown for X-Ray traces.
+# Benchmark traces typically share a handful of shapes (e.g., F1 -> service -> F2).
+# The shape key of a trace captures everything the general graph engine of aws_trace_analyzer
+# (create_span_graph and calculate_breakdown) decides on besides timestamp magnitudes:
+# the (sub)segment tree with names and origins in canonical order, the order of all
+# timestamps (incl. ties), the async invocation heuristic per edge, and the end node.
+# The first trace of a shape is analyzed by the general engine and its critical path is
+# recorded as a template of (category, start slot, end slot) into the timestamps.
+# Further traces of a known shape are packed into a 2-D array of µs timestamps such that
+# the category durations of a whole batch are computed with vectorized subtraction.
+# Traces of other shapes or failing any validation of the general engine
+# (e.g., duration mismatch) fall back to the general engine.
+import json
+from collections import defaultdict
+from datetime import timedelta
+import numpy as np
+
+from sb.aws_trace_analyzer import CSV_FIELDS, TIMESTAMP_MARGIN, TIMESTAMP_THRESHOLD, calculate_breakdown, create_span_graph, extract_trace_breakdown, is_async_call, parse_trace_segments  # noqa: E501
+from sb.clock_skew import correct_clock_skew
+from sb.shape_index import SIGNATURE_FIELD
+
+# Number of traces computed together
+BATCH_SIZE = 1000
+# Fields computed by the fast path
+FAST_FIELDS = {*CSV_FIELDS, SIGNATURE_FIELD}
+MARGIN_US = TIMESTAMP_MARGIN // timedelta(microseconds=1)
+
+
+def to_micros(times) -> np.ndarray:
+    """Converts epoch seconds into integer µs rounded like datetime.fromtimestamp (half-even)
+    such that differences exactly match aws_trace_analyzer.timediff."""
+    frac, whole = np.modf(times)
+    return whole.astype(np.int64) * 1_000_000 + np.round(frac * 1e6).astype(np.int64)
+
+
+def parse_shape(trace, clock_offsets=None):
+    """Returns a tuple (shape key, timestamps, per-trace fields) of a trace or
+    None if the trace needs the general engine (e.g., missing parents or in progress).
+    Timestamps are start and end times per node in canonical order."""
+    if 'Duration' not in trace:
+        return None
+    segments = parse_trace_segments(trace)
+    # Node ids in insertion order of create_span_graph (determines ties of start and end)
+    order = dict()
+    docs = dict()
+    parents = dict()
+    roots = []
+    stack = []
+    for segment in segments:
+        order[segment['id']] = None
+        if 'parent_id' in segment:
+            order.setdefault(segment['parent_id'])
+            parents[segment['id']] = segment['parent_id']
+        else:
+            roots.append(segment['id'])
+        stack.append(segment)
+        while stack:
+            doc = stack.pop()
+            if doc.get('in_progress', False) or doc['id'] in docs:
+                return None
+            docs[doc['id']] = doc
+            order.setdefault(doc['id'])
+            for subsegment in reversed(doc.get('subsegments', [])):
+                parents[subsegment['id']] = doc['id']
+                stack.append(subsegment)
+    if len(roots) != 1 or len(order) != len(docs):
+        return None
+    duration = timedelta(seconds=trace['Duration'])
+    if clock_offsets:
+        duration += timedelta(seconds=correct_clock_skew(segments, clock_offsets))
+
+    # Canonical order: depth-first from the root with siblings sorted by name, origin, and time
+    children = defaultdict(list)
+    for id, parent_id in parents.items():
+        children[parent_id].append(docs[id])
+    nodes = []
+    index = dict()
+    stack = [docs[roots[0]]]
+    while stack:
+        doc = stack.pop()
+        index[doc['id']] = len(nodes)
+        nodes.append(doc)
+        siblings = children[doc['id']]
+        # Fully tied siblings are ordered by insertion in the general engine
+        if len({(s['end_time'], s['start_time']) for s in siblings}) < len(siblings):
+            return None
+        siblings = sorted(siblings, key=lambda s: (s.get('name', ''), s.get('origin', ''), s['start_time'], s['end_time']))  # noqa: E501
+        stack.extend(reversed(siblings))
+    if len(nodes) != len(docs):  # cycle
+        return None
+
+    times = np.array([t for doc in nodes for t in (doc['start_time'], doc['end_time'])])
+    ranks = np.unique(times, return_inverse=True)[1]
+    parent_index = [index[parents[doc['id']]] if doc['id'] in parents else -1 for doc in nodes]
+    is_async = [is_async_call(docs[parents[doc['id']]], doc) for doc in nodes[1:]]
+
+    # Per-trace fields in insertion order as in add_global_stats
+    fields = {
+        'trace_id': trace['Id'],
+        'duration': duration,
+        'url': None,
+        'services': [],
+        'errors': 0,
+        'faults': 0,
+        'throttles': 0
+    }
+    start = end = None
+    for id in order:
+        doc = docs[id]
+        if start is None or doc['start_time'] < docs[start]['start_time']:
+            start = id
+        if end is None or doc['end_time'] > docs[end]['end_time']:
+            end = id
+        if 'origin' in doc:
+            fields['services'].append(doc['origin'])
+            if doc['origin'] == 'AWS::ApiGateway::Stage':
+                fields['url'] = doc['http']['request']['url']
+        for flag in ['error', 'fault', 'throttle']:
+            if doc.get(flag):
+                fields[f"{flag}s"] += 1
+    # The general engine rejects traces starting before their root (START_MISMATCH)
+    if start != roots[0]:
+        return None
+
+    key = (
+        tuple((doc.get('name'), doc.get('origin')) for doc in nodes),
+        tuple(parent_index),
+        tuple(ranks.tolist()),
+        tuple(is_async),
+        index[end]
+    )
+    return key, times.tolist(), fields
+
+
+class ShapeTemplate:
+    """Critical path of a trace shape as (category, start slot, end slot) entries."""
+
+    def __init__(self, G, times) -> None:
+        # Timestamps tied in one trace are tied in all traces of its shape
+        slots = dict()
+        for slot, time in enumerate(times):
+            slots.setdefault(time, slot)
+        entries = [(e['category'], slots[e['start_time']], slots[e['end_time']])
+                   for e in G.graph['critical_path']]
+        self.start_slots = np.array([start for _, start, _ in entries])
+        self.end_slots = np.array([end for _, _, end in entries])
+        self.categories = sorted({category for category, _, _ in entries} | {'unclassified'})
+        # Entries (rows) per category (columns) for summing durations by matrix product
+        self.category_matrix = np.zeros((len(entries), len(self.categories)), dtype=np.int64)
+        for i, (category, _, _) in enumerate(entries):
+            self.category_matrix[i, self.categories.index(category)] = 1
+        # Async transitions checked for extreme time shifts (see pair_path)
+        async_sends = [(G.nodes[e['source']]['doc'], G.nodes[e['target']]['doc'])
+                       for e in G.graph['critical_path'] if e['type'] == 'async-send']
+        self.source_slots = np.array([slots[s['start_time']] for s, _ in async_sends], dtype=int)
+        self.target_slots = np.array([slots[t['start_time']] for _, t in async_sends], dtype=int)
+        self.end_slot = slots[G.graph['end_time']]
+        self.num_cold_starts = G.graph['num_cold_starts']
+        self.longest_path_names = G.graph['longest_path_names']
+        self.signature = G.graph[SIGNATURE_FIELD]
+
+    def rows(self, times, traces_fields, fields):
+        """Returns a breakdown row per trace or None if it needs the general engine."""
+        F = np.array(times)
+        T = to_micros(F)
+        durations = T[:, self.end_slots] - T[:, self.start_slots]
+        sums = durations @ self.category_matrix
+        span = T[:, self.end_slot] - T[:, 0]
+        breakdown = T[:, self.end_slots[-1]] - T[:, self.start_slots[0]]
+        trace_durations = np.array([f['duration'] // timedelta(microseconds=1) for f in traces_fields])  # noqa: E501
+        # Validations of add_global_stats and calculate_breakdown
+        threshold = TIMESTAMP_THRESHOLD.total_seconds()
+        valid = (F[:, self.target_slots] - F[:, self.source_slots] + threshold >= 0).all(axis=1) \
+            & (T[:, self.start_slots[0]] == T[:, 0]) \
+            & (T[:, self.start_slots[1:]] == T[:, self.end_slots[:-1]]).all(axis=1) \
+            & (np.abs(trace_durations - span) <= MARGIN_US) \
+            & (np.abs(trace_durations - breakdown) < MARGIN_US)
+        rows = []
+        for i, trace_fields in enumerate(traces_fields):
+            if not valid[i]:
+                rows.append(None)
+                continue
+            values = {
+                **trace_fields,
+                'start_time': times[i][0],
+                'end_time': times[i][self.end_slot],
+                'num_cold_starts': self.num_cold_starts,
+                'longest_path_names': list(self.longest_path_names),
+                SIGNATURE_FIELD: self.signature,
+                **{c: timedelta(microseconds=int(us)) for c, us in zip(self.categories, sums[i])}
+            }
+            rows.append([values.get(field, None) for field in fields])
+        return rows
+
+
+class BatchBreakdown:
+    """Extracts trace breakdowns (see extract_trace_breakdown) for many traces using
+    the vectorized fast path for known shapes. Results keep the order of added traces.
+    Example:
+    batch = BatchBreakdown()
+    for line in lines:
+        batch.add(line)
+    for trace, result in batch.flush():
+        # result is a breakdown row or the exception of an invalid trace
+    """
+
+    def __init__(self, fields=CSV_FIELDS, clock_offsets=None) -> None:
+        self.fields = fields
+        self.clock_offsets = clock_offsets
+        # The fast path only computes the CSV fields and the topology signature
+        self.enabled = set(fields) <= FAST_FIELDS
+        # shape key => ShapeTemplate
+        self.templates = dict()
+        # [trace, breakdown row or exception (None while pending)] in order of addition
+        self.results = []
+        # shape key => list of (result index, timestamps, per-trace fields)
+        self.pending = defaultdict(list)
+        self.num_fast = 0
+
+    def __len__(self) -> int:
+        return len(self.results)
+
+    def add(self, line):
+        """Adds a JSON-formatted trace line."""
+        trace = dict()
+        try:
+            trace = json.loads(line)
+            shape = parse_shape(trace, self.clock_offsets) if self.enabled else None
+            if shape is None:
+                result = self.general(trace)
+            elif shape[0] in self.templates:
+                self.pending[shape[0]].append((len(self.results), shape[1], shape[2]))
+                result = None
+            else:
+                G = calculate_breakdown(create_span_graph(trace, self.clock_offsets))
+                result = [G.graph.get(field, None) for field in self.fields]
+                self.add_template(shape[0], G, shape[1])
+        except Exception as e:
+            result = e
+        self.results.append([trace, result])
+
+    def add_template(self, key, G, times):
+        try:
+            self.templates[key] = ShapeTemplate(G, times)
+        except KeyError:
+            # Critical path with timestamps not matching any (sub)segment
+            pass
+
+    def general(self, trace):
+        try:
+            return extract_trace_breakdown(trace, self.fields, self.clock_offsets)
+        except Exception as e:
+            return e
+
+    def flush(self) -> list:
+        """Computes all pending traces and returns the (trace, result) tuples added since
+        the last flush where result is a breakdown row or an exception."""
+        for key, batch in self.pending.items():
+            indices, times, traces_fields = zip(*batch)
+            rows = self.templates[key].rows(times, traces_fields, self.fields)
+            for i, row in zip(indices, rows):
+                if row is None:
+                    row = self.general(self.results[i][0])
+                else:
+                    self.num_fast += 1
+                self.results[i][1] = row
+        results = [(trace, result) for trace, result in self.results]
+        self.results = []
+        self.pending = defaultdict(list)
+        return results
@@ -0,0 +1,50 @@
+import logging
+import time
+
+from sb.k6_metrics import count_requests
+
+
+def wait_for_stable_count(count_traces, expected=None, timeout=15 * 60, interval=30,
+                          min_ratio=0.95, stable_polls=2,
+                          sleep=time.sleep, clock=time.monotonic) -> int:
+    """Polls `count_traces()` every `interval` seconds until the trace count is stable
+    and near the `expected` count. Returns the last trace count, also after a timeout.
+    Tracing backends ingest traces with a varying delay (e.g., minutes for Azure Insights)
+    and sometimes drop traces. Hence, we wait until the count does not change anymore.
+    expected: the expected number of traces (e.g., k6 requests) or None if unknown.
+    timeout: maximum number of seconds to wait.
+    min_ratio: minimum fraction of `expected` traces required before returning early.
+    stable_polls: number of consecutive polls the count must remain unchanged.
+    sleep, clock: injectable time functions for testing.
+    """
+    deadline = clock() + timeout
+    last_count = None
+    unchanged = 0
+    target = f"/{expected}" if expected else ''
+    while True:
+        count = count_traces()
+        unchanged = unchanged + 1 if count == last_count else 0
+        last_count = count
+        logging.info(f"Found {count}{target} traces (unchanged for {unchanged} polls).")
+        if expected:
+            near_expected = count >= min_ratio * expected
+        else:
+            near_expected = count > 0
+        if near_expected and unchanged >= stable_polls:
+            return count
+        if clock() + interval > deadline:
+            logging.warning(f"Timeout after waiting {timeout}s for traces. Found {count}{target} traces.")  # noqa: E501
+            return count
+        sleep(interval)
+
+
+def expected_trace_count(spec):
+    """Returns the number of k6 requests of the last invocation or None if unavailable."""
+    logs_directory = spec.logs_directory()
+    if logs_directory is None:
+        return None
+    metrics_file = spec.workload_log_file()
+    if not metrics_file.is_file():
+        logging.warning(f"Unknown expected number of traces because {metrics_file} is missing.")
+        return None
+    return count_requests(metrics_file)
@@ -0,0 +1,172 @@
+import json
+import logging
+import re
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from sb.k6_metrics import HTTP_REQS, DROPPED_ITERATIONS
+
+VUS = 'vus'
+VUS_MAX = 'vus_max'
+WORKLOAD_METRICS = {HTTP_REQS, DROPPED_ITERATIONS, VUS, VUS_MAX}
+# k6 duration units: https://k6.io/docs/using-k6/options/#duration
+DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+CSV_FIELDS = [
+    'scenario',
+    'stage',
+    'start',
+    'end',
+    'target_start',
+    'target_end',
+    'expected_requests',
+    'achieved_requests',
+    'deviation',
+    'relative_deviation',
+    'dropped_iterations',
+    'max_vus',
+    'vus_max',
+    'exhausted_seconds'
+]
+
+
+def parse_duration(duration) -> float:
+    """Returns the number of seconds of a k6 duration string (e.g., '1m30s')."""
+    parts = re.findall(r'(\d+(?:\.\d+)?)(ms|s|m|h)', str(duration))
+    if not parts or ''.join(n + u for n, u in parts) != str(duration):
+        raise ValueError(f"Invalid k6 duration {duration}.")
+    return sum(float(number) * DURATION_UNITS[unit] for number, unit in parts)
+
+
+def decode_stages(scenario) -> list:
+    """Returns a list of (start, end, start_rate, end_rate) tuples in seconds and
+    requests per second for an arrival-rate scenario or None for other executors.
+    In ramping-arrival-rate, the rate linearly ramps from the previous target
+    (or startRate) to the target of each stage."""
+    time_unit = parse_duration(scenario.get('timeUnit', '1s'))
+    offset = parse_duration(scenario.get('startTime', '0s'))
+    executor = scenario.get('executor')
+    if executor == 'constant-arrival-rate':
+        rate = scenario['rate'] / time_unit
+        return [(offset, offset + parse_duration(scenario['duration']), rate, rate)]
+    elif executor == 'ramping-arrival-rate':
+        stages = []
+        start = offset
+        rate = scenario.get('startRate', 0) / time_unit
+        for stage in scenario['stages']:
+            end = start + parse_duration(stage['duration'])
+            target = stage['target'] / time_unit
+            stages.append((start, end, rate, target))
+            start, rate = end, target
+        return stages
+    return None
+
+
+def target_series(stages) -> np.ndarray:
+    """Returns the expected number of requests for each second of the piecewise linear
+    arrival rate defined by `stages` (see decode_stages)."""
+    end = int(np.ceil(stages[-1][1]))
+    # Breakpoints of the continuous piecewise linear rate function
+    times = [stages[0][0]] + [s[1] for s in stages]
+    rates = [stages[0][2]] + [s[3] for s in stages]
+    # Integrate exactly using all breakpoints and whole seconds within the stages as grid
+    seconds = np.arange(end + 1)
+    grid = np.union1d(seconds[(seconds > times[0]) & (seconds < times[-1])], times)
+    grid_rates = np.interp(grid, times, rates)
+    cumulative = np.concatenate([[0], np.cumsum(np.diff(grid) * (grid_rates[1:] + grid_rates[:-1]) / 2)])  # noqa: E501
+    # No requests before the first and after the last stage
+    return np.diff(np.interp(seconds, grid, cumulative, left=0, right=cumulative[-1]))
+
+
+def read_metrics(metrics_file) -> pd.DataFrame:
+    """Reads the workload-related k6 metrics with seconds relative to the test start."""
+    df = pd.read_csv(metrics_file, usecols=lambda c: c in {'metric_name', 'timestamp', 'metric_value', 'scenario'})  # noqa: E501
+    # k6 emits vus samples every second from the start of the test
+    t0 = df['timestamp'].min()
+    df = df[df['metric_name'].isin(WORKLOAD_METRICS)].copy()
+    df['second'] = (df['timestamp'] - t0).astype(int)
+    return df
+
+
+def per_second(df, metric, length, agg='sum') -> np.ndarray:
+    """Returns an array with the aggregated `metric` value for each second."""
+    values = df[df['metric_name'] == metric].groupby('second')['metric_value'].agg(agg)
+    return values.reindex(range(length), fill_value=0).to_numpy()
+
+
+def analyze_scenario(name, scenario, df) -> list:
+    """Returns a list of per-stage rows (see CSV_FIELDS) comparing the target
+    and achieved arrival rate of a scenario."""
+    stages = decode_stages(scenario)
+    if not stages:
+        return []
+    expected = target_series(stages)
+    length = len(expected)
+    # Samples are tagged with their scenario except for global metrics such as vus
+    scenario_df = df
+    if 'scenario' in df.columns:
+        scenario_df = df[(df['scenario'] == name) | df['scenario'].isna()]
+    achieved = per_second(scenario_df, HTTP_REQS, length)
+    dropped = per_second(scenario_df, DROPPED_ITERATIONS, length)
+    vus = per_second(df, VUS, length, 'max')
+    vus_max = per_second(df, VUS_MAX, length, 'max')
+    rows = []
+    for i, (start, end, start_rate, end_rate) in enumerate(stages):
+        s, e = int(start), max(int(end), int(start) + 1)
+        expected_requests = expected[s:e].sum()
+        achieved_requests = achieved[s:e].sum()
+        deviation = achieved_requests - expected_requests
+        relative_deviation = deviation / expected_requests if expected_requests > 0 else np.nan
+        # Iterations could not start in time or all VUs were busy while falling behind
+        behind = achieved[s:e] < np.floor(expected[s:e])
+        busy = (vus[s:e] >= vus_max[s:e]) & (vus_max[s:e] > 0)
+        exhausted = (dropped[s:e] > 0) | (busy & behind)
+        rows.append([
+            name, i, start, end, start_rate, end_rate,
+            round(expected_requests, 2), int(achieved_requests), round(deviation, 2),
+            round(relative_deviation, 4), int(dropped[s:e].sum()),
+            int(vus[s:e].max()), int(vus_max[s:e].max()), int(exhausted.sum())
+        ])
+    return rows
+
+
+class WorkloadAnalyzer:
+    """Validates whether k6 achieved the target arrival rates of a workload:
+    1) Aligns the requests in k6_metrics.csv with the per-second targets of
+       arrival-rate scenarios (e.g., generated by the WorkloadGenerator)
+    2) Saves the deviation, dropped iterations, and VU exhaustion per stage
+       into workload_validation.csv
+    Dropped iterations and exhausted VUs indicate a load generator bottleneck
+    rather than cloud latency.
+    """
+
+    def __init__(self, metrics_file, workload_options) -> None:
+        """metrics_file: path to a k6_metrics.csv file.
+        workload_options: path to a k6 options JSON file or an options dict."""
+        self.metrics_file = Path(metrics_file)
+        self.workload_options = workload_options
+
+    def analyze_workload(self) -> pd.DataFrame:
+        options = self.workload_options
+        if not isinstance(options, dict):
+            with open(options) as file:
+                options = json.load(file)
+        df = read_metrics(self.metrics_file)
+        rows = []
+        for name, scenario in options.get('scenarios', {}).items():
+            rows.extend(analyze_scenario(name, scenario, df))
+        result = pd.DataFrame(rows, columns=CSV_FIELDS)
+        if result.empty:
+            logging.info('Skip workload validation without arrival-rate scenarios.')
+            return result
+        validation_file = self.metrics_file.parent / 'workload_validation.csv'
+        result.to_csv(validation_file, index=False)
+        expected = result['expected_requests'].sum()
+        achieved = result['achieved_requests'].sum()
+        deviation = (achieved - expected) / expected if expected > 0 else 0
+        logging.info(f"Achieved {achieved} of {expected:.0f} target requests ({deviation:+.1%}). Written to {validation_file}.")  # noqa: E501
+        dropped = result['dropped_iterations'].sum()
+        if dropped > 0:
+            exhausted_stages = (result['exhausted_seconds'] > 0).sum()
+            logging.warning(f"k6 dropped {dropped} iterations and exhausted its VUs in {exhausted_stages} stages. Consider increasing preAllocatedVUs or maxVUs.")  # noqa: E501
+        return result
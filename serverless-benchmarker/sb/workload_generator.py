@@ -1,12 +1,256 @@
 from pathlib import Path
+import logging
 import os
 import numpy as np
 import pandas as pd
-from stochastic.processes.continuous import FractionalBrownianMotion
-import stochastic
+
+from sb.fbm_bank import fbm_samples
+from sb.k6_metrics import request_latencies
+from sb.workload_analyzer import decode_stages, target_series
+from sb.workload_trace import WorkloadTrace
+
+# k6 tag and environment variable identifying the endpoint of composite workload scenarios
+ENDPOINT_TAG = 'endpoint'
+
+
+def size_vus(per_second_rates, latency=None, quantile=0.99, headroom=1.5):
+    """Sizes the k6 VUs of an arrival-rate workload using Little's law:
+    concurrent requests = arrival rate * latency.
+    Returns a tuple (preAllocatedVUs, maxVUs) for the peak rate of `per_second_rates`.
+    latency: expected request latency in seconds as number, array of samples,
+             or path to the k6_metrics.csv of a previous run.
+             Without latency, falls back to the legacy heuristic of
+             preAllocatedVUs = ceil(peak rate / 10) and no maxVUs (None).
+    quantile: latency quantile for sizing maxVUs.
+    headroom: multiplication factor for the expected concurrency.
+    Pre-allocates VUs for the median latency and allows k6 to grow up to
+    maxVUs for the tail latency instead of dropping iterations.
+    """
+    peak_rate = np.max(per_second_rates) if len(per_second_rates) > 0 else 0
+    if latency is None:
+        return int(np.ceil(peak_rate / 10)), None
+    samples = latency_samples(latency)
+    # Round before ceiling to avoid an extra VU due to floating point errors (e.g., 3.0000001)
+    pre_allocated_vus = max(1, int(np.ceil(np.round(peak_rate * np.median(samples) * headroom, 6))))  # noqa E501
+    max_vus = max(pre_allocated_vus, int(np.ceil(np.round(peak_rate * np.quantile(samples, quantile) * headroom, 6))))  # noqa E501
+    return pre_allocated_vus, max_vus
+
+
+def latency_samples(latency) -> np.ndarray:
+    """Returns request latencies in seconds from a number, an array of samples,
+    or the path to the k6_metrics.csv of a previous run.
+    Strings are numbers (e.g., '0.2' from a config value) unless they name an existing file."""
+    if isinstance(latency, str) and not Path(latency).exists():
+        try:
+            latency = float(latency)
+        except ValueError:
+            pass
+    if isinstance(latency, (str, Path)):
+        samples = request_latencies(latency)
+    else:
+        samples = np.atleast_1d(np.asarray(latency, dtype=float))
+    if len(samples) == 0:
+        raise Exception(f"No latency samples available for sizing VUs from {latency}.")
+    return samples
+
+
+def max_window_arrivals(arrivals, window) -> int:
+    """Returns the maximum number of sorted `arrivals` within any window [t, t + window).
+    Equals the peak number of concurrent requests if every request takes `window`."""
+    arrivals = np.asarray(arrivals, dtype=np.int64)
+    if len(arrivals) == 0:
+        return 0
+    window_ends = np.searchsorted(arrivals, arrivals + max(int(np.ceil(window)), 1), side='left')
+    return int(np.max(window_ends - np.arange(len(arrivals))))
+
+
+def size_replay_vus(arrivals, latency, quantile=0.99, headroom=1.5) -> int:
+    """Sizes the VUs replaying `arrivals` (milliseconds) such that each request starts on time
+    if the latencies stay below their `quantile` of the expected `latency` (see size_vus).
+    Unlike size_vus, this counts the arrivals within latency-length windows because
+    bursty arrival processes exceed the concurrency of the per-second peak rate.
+    Logs a warning if slower requests can delay the start of later requests."""
+    samples = latency_samples(latency)
+    concurrency = max_window_arrivals(arrivals, np.quantile(samples, quantile) * 1000)
+    vus = min(max(1, int(np.ceil(np.round(concurrency * headroom, 6)))), len(arrivals))
+    max_concurrency = max_window_arrivals(arrivals, np.max(samples) * 1000)
+    if max_concurrency > vus:
+        logging.warning(f"Replaying arrivals with {vus} VUs for up to {concurrency} concurrent requests but {max_concurrency} requests overlap at the maximum expected latency of {np.max(samples):.3f}s. Requests start late if all VUs are busy and iterations not started within maxDuration are dropped.")  # noqa E501
+    return vus
+
+
+def compact_stages(per_second_rates, tolerance, sum_tolerance=0.01) -> list:
+    """Approximates per-second rates with few linear ramps (i.e., k6 ramping-arrival-rate stages).
+    Returns a list of (duration_in_seconds, target) tuples starting from the first rate.
+    Greedily extends each ramp as long as
+    1) every second of the ramp deviates at most `tolerance` requests from its rate
+       for the least squares target and
+    2) an integer target within 1) keeps the cumulative number of invocations within
+       a `sum_tolerance` fraction of all invocations (at least 1 invocation).
+    Bound 1) does not hold for rate changes that no ramp covers. They step within one second
+    like the legacy encoding, so that second deviates by half the change (plus up to half the
+    tolerance to compensate drift). Steps can exceed bound 2) by at most the steps that the
+    tolerance cannot compensate. Ramps never increase such drift and pull it back where possible.
+    Galloping followed by binary search finds the longest ramp in O(L log L) for length L.
+    """
+    rates = np.asarray(per_second_rates, dtype=float)
+    n = len(rates)
+    sum_bound = max(1.0, sum_tolerance * rates.sum())
+    stages = []
+    start, start_rate, drift = 0, rates[0] if n > 0 else 0, 0.0
+
+    def fit_ramp(end):
+        """Returns the integer target of a ramp from start to end closest to the least squares
+        fit within the bounds 1) and 2) and the summed deviation of that ramp or None."""
+        # k6 ramps continuously, so each second receives the rate at its midpoint
+        weights = (np.arange(end - start) + 0.5) / (end - start)
+        offsets = rates[start:end] - start_rate
+        best = start_rate + np.dot(weights, offsets) / np.dot(weights, weights)
+        # Each second bounds the target to an interval as its deviation is linear in the target
+        low = max(0, start_rate + np.max((offsets - tolerance) / weights))
+        high = start_rate + np.min((offsets + tolerance) / weights)
+        # Targets far from the least squares fit start the next ramp off the rates
+        if not low - 1e-9 <= max(0, int(np.round(best))) <= high + 1e-9:
+            return None
+        # Steps can exceed 2), so ramps must at least not increase the drift then
+        for bound in [sum_bound, max(sum_bound, abs(drift))]:
+            sum_error_low = -bound - drift + offsets.sum()
+            sum_error_high = bound - drift + offsets.sum()
+            target_low = int(np.ceil(np.round(max(low, start_rate + sum_error_low / weights.sum()), 9)))  # noqa: E501
+            target_high = int(np.floor(np.round(min(high, start_rate + sum_error_high / weights.sum()), 9)))  # noqa: E501
+            if target_low <= target_high:
+                target = min(max(int(np.round(best)), target_low), target_high)
+                return target, np.sum(start_rate + (target - start_rate) * weights - rates[start:end])  # noqa: E501
+        return None
+
+    while start < n:
+        good, bad, length = start + 1, None, 2
+        while bad is None and good < n:
+            end = min(start + length, n)
+            if fit_ramp(end) is not None:
+                good = end
+                length *= 2
+            else:
+                bad = end
+        while bad is not None and bad - good > 1:
+            mid = (good + bad) // 2
+            if fit_ramp(mid) is not None:
+                good = mid
+            else:
+                bad = mid
+        if good == start + 1:
+            # Step to the new rate within one second like the run length encoding because
+            # fitting single seconds exactly overshoots and oscillates.
+            # Targets within the tolerance of the rate compensate drift beyond 2).
+            rate = rates[start]
+            step_drift = drift + (start_rate - rate) / 2
+            excess = np.sign(step_drift) * max(0, abs(step_drift) - sum_bound)
+            correction = np.clip(-np.ceil(2 * abs(excess)) * np.sign(excess), -int(tolerance), int(tolerance))  # noqa: E501
+            target = max(0, int(rate + correction))
+            drift += (start_rate + target) / 2 - rate
+        else:
+            target, sum_error = fit_ramp(good)
+            drift += sum_error
+        stages.append((good - start, target))
+        start, start_rate = good, target
+    return stages
+
+
+def arrival_timestamps(per_second_rates, process='poisson', cv=1, seed=None) -> np.ndarray:
+    """Returns sorted request timestamps in seconds for the given per second rates.
+    Samples a renewal process with unit rate and maps it onto the cumulative rate
+    (time rescaling), which yields a non-homogeneous process following the rates:
+    * poisson: exponential inter-arrival times
+    * gamma: gamma inter-arrival times with coefficient of variation `cv`
+             (cv > 1 is burstier and cv < 1 more regular than poisson)
+    """
+    rng = np.random.default_rng(seed)
+    rates = np.asarray(per_second_rates, dtype=float)
+    cumulative = np.concatenate([[0], np.cumsum(rates)])
+    total = cumulative[-1]
+    if total <= 0:
+        return np.array([])
+    shape = 1.0 if process == 'poisson' else 1 / cv ** 2
+    # Draw enough unit-rate inter-arrival times in batches until they exceed the total
+    batch = int(total + 6 * np.sqrt(total) * max(cv, 1) + 10)
+    operational_times = np.cumsum(rng.gamma(shape, 1 / shape, batch))
+    while operational_times[-1] < total:
+        more = np.cumsum(rng.gamma(shape, 1 / shape, batch)) + operational_times[-1]
+        operational_times = np.concatenate([operational_times, more])
+    operational_times = operational_times[operational_times < total]
+    # Invert the piecewise linear cumulative rate (flat during seconds without requests)
+    seconds = np.arange(len(rates) + 1)
+    return np.interp(operational_times, cumulative, seconds)
+
+
+def rate_scale_factor(per_minute_rates, scale_factor=1, scale_rate_per_second=None) -> float:
+    """Returns the scale factor that achieves a mean `scale_rate_per_second` if given."""
+    if not scale_rate_per_second:
+        return scale_factor
+    mean_rate_per_second = np.mean(per_minute_rates) / 60
+    if mean_rate_per_second == 0:
+        return 1
+    return scale_rate_per_second / mean_rate_per_second
+
+
+def upscale_traces(per_minute_rates, scale_factors, scale_types, hurst=0.8, seed=None) -> np.ndarray:  # noqa E501
+    """Upscales multiple per minute rate traces into per second rates in a single batched pass.
+    Distributes the requests of each minute across its seconds using fractional Brownian
+    motion samples and scales each trace by its scale factor and type (linear|compound).
+    hurst: Hurst parameter of the fBm in (0, 1). Higher values yield smoother rates.
+    seed: the i-th trace uses the fBm realization of seed + i (see sb.fbm_bank).
+    Returns a matrix with one row per trace. Traces are time-aligned at t=0 and shorter
+    traces have no requests at the end."""
+    num_minutes = max(len(rates) for rates in per_minute_rates)
+    # NaN padding excludes missing minutes from the quantiles of compound scaling
+    rates = np.full((len(per_minute_rates), num_minutes), np.nan)
+    bm_samples = np.full((len(per_minute_rates), num_minutes * 60), np.nan)
+    magnitude_multiplier = 100  # Need to increase magnitude or values become too small
+    for i, trace_rates in enumerate(per_minute_rates):
+        rates[i, :len(trace_rates)] = trace_rates
+        trace_seed = None if seed is None else seed + i
+        samples = fbm_samples(60 * len(trace_rates), hurst, 10, trace_seed) * magnitude_multiplier
+        # The fBm sample includes t=0, hence one more sample than seconds
+        bm_samples[i, :60 * len(trace_rates)] = (samples + np.abs(np.floor(samples.min())))[:60 * len(trace_rates)]  # noqa E501
+    # Scale random samples by actual request rate per minute
+    bm_samples = bm_samples.reshape(len(per_minute_rates), num_minutes, 60)
+    requests_per_unit = rates / bm_samples.sum(axis=2)
+    per_second_rates = (bm_samples * requests_per_unit[:, :, np.newaxis]).reshape(len(per_minute_rates), -1)  # noqa E501
+
+    scaled_per_second_rates = np.empty_like(per_second_rates)
+    for scale_type in set(scale_types):
+        rows = np.array([t == scale_type for t in scale_types])
+        factors = np.asarray(scale_factors, dtype=float)[rows, np.newaxis]
+        if scale_type == 'linear':
+            scaled_per_second_rates[rows] = per_second_rates[rows] * factors
+        elif scale_type == 'compound':
+            # Use compounding to scale
+            compounding_fractions = per_second_rates[rows] / np.nansum(per_second_rates[rows], axis=1, keepdims=True)  # noqa E501
+            max_fraction = np.nanquantile(compounding_fractions, 0.95, axis=1, keepdims=True)
+            # Find exponent required to scale the maximum requests per second by the scale_factor
+            exponent = np.log(factors) / np.log(1 + max_fraction)
+            scaled = per_second_rates[rows] * np.power(1 + compounding_fractions, exponent)
+            # Clip extremes
+            clip_threshold = np.nanquantile(scaled, 0.95, axis=1, keepdims=True)
+            scaled_per_second_rates[rows] = np.where(scaled > clip_threshold, clip_threshold, scaled)  # noqa E501
+        else:
+            raise Exception(f'Unknown scaling type: {scale_type}')
+
+    return np.nan_to_num(np.round(scaled_per_second_rates))
 
 
 class WorkloadGenerator:
+    # Optional generator options configurable through the spec and `sb invoke --option=value`
+    OPTIONS = ['expected_latency', 'stage_tolerance', 'max_stages',
+               'trace_function', 'trace_start', 'trace_end', 'workloads',
+               'arrival_process', 'arrival_cv',
+               'burst_size', 'burst_interval', 'burst_repetitions', 'hurst']
+    # Processes for precomputed request arrival timestamps (see arrival_timestamps)
+    ARRIVAL_PROCESSES = ['poisson', 'gamma']
+    # Keys of composite workload entries (see `workloads`)
+    WORKLOAD_KEYS = ['name', 'endpoint', 'workload_type', 'workload_trace', 'scale_factor',
+                     'scale_type', 'scale_rate_per_second',
+                     'trace_function', 'trace_start', 'trace_end']
 
     workload_type_to_file_map = {
         'fluctuating': 'fluctuating.csv',
@@ -16,25 +260,82 @@ class WorkloadGenerator:
     }
 
     def __init__(self, workload_type, scale_factor=1, scale_type='linear', workload_trace=None,
-                 scale_rate_per_second=None, seconds_to_skip=3 * 60):
+                 scale_rate_per_second=None, seconds_to_skip=3 * 60,
+                 expected_latency=None, stage_tolerance=None, max_stages=None,
+                 trace_function=None, trace_start=0, trace_end=None, workloads=None,
+                 arrival_process=None, arrival_cv=2,
+                 burst_size=None, burst_interval=15 * 60, burst_repetitions=1, hurst=0.8):
+        """expected_latency: enables VU sizing based on the expected request latency
+                             (see size_vus).
+        stage_tolerance: enables the compact k6 stage encoding with linear ramps that
+                         deviate at most this many requests per second (see compact_stages).
+        max_stages: caps the number of k6 stages of the compact encoding by doubling the
+                    tolerance until the stages fit. Keeps the total invocations error bound.
+        trace_function: function id within a multi-function binary workload trace
+                        (see sb.workload_trace).
+        trace_start, trace_end: window [start, end) of the workload trace in minutes.
+        workloads: list of workload entries for the workload_type `composite`, which generates
+                   one time-aligned k6 scenario per entry. Entries are dictionaries with a
+                   workload_type or workload_trace and the optional keys of WORKLOAD_KEYS.
+                   The `endpoint` tags the requests of a scenario and is available as
+                   __ENV.ENDPOINT in the workload script (e.g., to select the trigger URL
+                   BENCHMARK_URL_<ENDPOINT>, see BenchmarkSpec.endpoint_envs).
+                   Example: [{'workload_type': 'steady', 'endpoint': 'http'},
+                             {'workload_type': 'spikes', 'scale_factor': 2, 'endpoint': 'queue'}]
+        arrival_process: replays precomputed request timestamps of a poisson|gamma process
+                         instead of evenly spaced k6 arrival-rate stages (see encode_arrivals).
+                         Requires an expected_latency.
+        arrival_cv: coefficient of variation of the gamma inter-arrival times (burstiness).
+        burst_size: number of simultaneous requests per burst for the workload_type `burst`.
+        burst_interval: seconds between the starts of consecutive bursts. Idle periods
+                        longer than the keep-alive time of function instances force cold starts.
+        burst_repetitions: number of bursts.
+        hurst: Hurst parameter in (0, 1) of the fractional Brownian motion that distributes
+               the requests of a minute across its seconds. Lower values are more volatile.
+        """
         self.workload_type = workload_type
+        self.expected_latency = expected_latency
+        self.stage_tolerance = stage_tolerance
+        self.max_stages = max_stages
+        self.trace_function = trace_function
+        self.trace_start = trace_start
+        self.trace_end = trace_end
+        self.workloads = workloads
+        if arrival_process is not None and arrival_process not in WorkloadGenerator.ARRIVAL_PROCESSES:  # noqa E501
+            raise Exception(f"Unknown arrival process {arrival_process}. Supported: {WorkloadGenerator.ARRIVAL_PROCESSES}")  # noqa E501
+        if arrival_process is not None and workload_type == 'composite':
+            raise Exception('Arrival processes are unsupported for composite workloads.')
+        # The replay is only open-loop if the VUs cover all concurrent requests
+        if arrival_process is not None and expected_latency is None:
+            raise Exception('Arrival processes require an expected_latency for sizing the VUs.')
+        self.arrival_process = arrival_process
+        self.burst_size = burst_size
+        self.burst_interval = burst_interval
+        self.burst_repetitions = burst_repetitions
+        self.arrival_cv = arrival_cv
+        # Request timestamps in milliseconds if an arrival process is configured
+        self.arrivals = None
+        # Error introduced by the compact encoding (see encode_for_k6)
+        self.encoding_error = None
         self.workload_trace_file = None
         self.seconds_to_skip = seconds_to_skip
-        # Seed random number generator for stochastic library
+        # Seed for the random fBm samples (see sb.fbm_bank) and arrival processes
         self.rng_seed = int(os.getenv('SB_WORKLOADGEN_SEED', 11))
-        stochastic.random.seed(self.rng_seed)
+        if not 0 < float(hurst) < 1:
+            raise Exception(f"Invalid hurst parameter {hurst}. Must be within (0, 1).")
+        self.hurst = float(hurst)
         # Special workload types single or any (positive) number
         if workload_type == 'single' or (str(workload_type).isnumeric() and int(workload_type) > 0):
             pass
-        # Default workload traces supported by sb
-        elif workload_type in WorkloadGenerator.workload_type_to_file_map:
-            self.workload_trace_file = Path(__file__).parent.parent / 'data' / 'workload_traces' / '20min_picks' / WorkloadGenerator.workload_type_to_file_map[workload_type]  # noqa E501
-        # Custom csv file with per minute invocation rates
-        elif workload_trace and WorkloadGenerator.is_existing_csv_file(workload_trace):
-            self.workload_trace_file = Path(workload_trace)
+        # Simultaneous requests repeated after idle periods
+        elif workload_type == 'burst':
+            if not burst_size or int(burst_size) < 1 or int(burst_repetitions) < 1:
+                raise Exception(f"Invalid burst workload with burst_size={burst_size} and burst_repetitions={burst_repetitions}. Both must be at least 1.")  # noqa E501
+        # Multiple workloads with their own traces
+        elif workload_type == 'composite':
+            self.validate_workloads(workloads)
         else:
-            msg = 'Unknown workload type passed to workload generator: ' + str(workload_type)
-            raise Exception(msg)
+            self.workload_trace_file = WorkloadGenerator.trace_file(workload_type, workload_trace)
         self.scale_factor = scale_factor
         self.scale_type = scale_type
         self.scale_rate_per_second = scale_rate_per_second
@@ -43,6 +344,39 @@ class WorkloadGenerator:
         p = Path(path)
         return p.suffix == '.csv' and p.is_file()
 
+    def trace_file(workload_type, workload_trace=None) -> Path:
+        """Returns the path of the per minute rates trace for a workload type.
+        Raises an exception for unknown workload types."""
+        # Default workload traces supported by sb
+        if workload_type in WorkloadGenerator.workload_type_to_file_map:
+            return Path(__file__).parent.parent / 'data' / 'workload_traces' / '20min_picks' / WorkloadGenerator.workload_type_to_file_map[workload_type]  # noqa E501
+        # Custom csv file with per minute invocation rates
+        elif workload_trace and WorkloadGenerator.is_existing_csv_file(workload_trace):
+            return Path(workload_trace)
+        # Binary trace directory with per minute invocation rates of many functions
+        elif workload_trace and WorkloadTrace.is_trace(workload_trace):
+            return Path(workload_trace)
+        msg = 'Unknown workload type passed to workload generator: ' + str(workload_type)
+        raise Exception(msg)
+
+    def validate_workloads(self, workloads):
+        """Raises an exception for invalid composite workload entries."""
+        if not workloads:
+            raise Exception('The composite workload type requires a list of workloads.')
+        names = set()
+        for i, entry in enumerate(workloads):
+            unknown_keys = set(entry) - set(WorkloadGenerator.WORKLOAD_KEYS)
+            if unknown_keys:
+                raise Exception(f"Unknown keys {sorted(unknown_keys)} in workload entry {i}.")
+            WorkloadGenerator.trace_file(entry.get('workload_type', 'custom'), entry.get('workload_trace'))  # noqa E501
+            name = WorkloadGenerator.scenario_name(entry, i)
+            if name in names:
+                raise Exception(f"Duplicate scenario name {name} in workload entry {i}.")
+            names.add(name)
+
+    def scenario_name(entry, index) -> str:
+        return str(entry.get('name') or entry.get('endpoint') or f"scenario_{index}")
+
     def generate_trace(self) -> dict:
         """Returns a k6 options dictionary: https://k6.io/docs/using-k6/options"""
         if self.workload_type == 'single':
@@ -50,6 +384,10 @@ class WorkloadGenerator:
         elif str(self.workload_type).isnumeric():
             iterations = int(self.workload_type)
             return self.default_options(iterations)
+        elif self.workload_type == 'burst':
+            return self.burst_options()
+        elif self.workload_type == 'composite':
+            return self.generate_composite_trace()
         else:
             per_second_rates = self.upscale_trace(self.workload_trace_file, self.scale_factor, self.scale_type, self.scale_rate_per_second)  # noqa E501
             # Skip the first 3 minutes to fix bootstrapping issue if trace is long enough.
@@ -57,10 +395,31 @@ class WorkloadGenerator:
                 # Every trace starts from 0 rps at t=0 and then oscillates the first few minutes
                 # causing unnatural spikes.
                 # Skipping the first 3 minutes discards this unnatural warmup phase.
-                per_second_rates_skip_start = per_second_rates[self.seconds_to_skip:]
-                return self.encode_for_k6(per_second_rates_skip_start)
-            else:
-                return self.encode_for_k6(per_second_rates)
+                per_second_rates = per_second_rates[self.seconds_to_skip:]
+            if self.arrival_process:
+                return self.encode_arrivals(per_second_rates)
+            return self.encode_for_k6(per_second_rates)
+
+    def burst_options(self) -> dict:
+        """Returns one per-vu-iterations scenario per burst where each of the `burst_size`
+        VUs sends a single request at the start time of the burst.
+        k6 initializes all VUs before the test starts and reuses them across bursts. Thus,
+        the requests of a burst leave at the same time without VU initialization delays.
+        Docs: https://k6.io/docs/using-k6/scenarios/executors/per-vu-iterations/
+        """
+        scenarios = dict()
+        for i in range(int(self.burst_repetitions)):
+            scenarios[f"burst_{i}"] = {
+                'executor': 'per-vu-iterations',
+                'vus': int(self.burst_size),
+                'iterations': 1,
+                'startTime': f"{i * int(self.burst_interval)}s",
+                # Bursts must not overlap to reuse the VUs. Without a graceful stop,
+                # k6 interrupts requests at maxDuration instead of 30s later (default).
+                'maxDuration': f"{max(min(int(self.burst_interval), 10 * 60), 1)}s",
+                'gracefulStop': '0s'
+            }
+        return {'scenarios': scenarios}
 
     def default_options(self, iterations=1) -> dict:
         options = {
@@ -70,59 +429,55 @@ class WorkloadGenerator:
         return options
 
     def upscale_trace(self, per_minute_rates_file_path, scale_factor=1, scale_type='linear', scale_rate_per_second=None):  # noqa E501
-        invocations_per_minute = pd.read_csv(per_minute_rates_file_path)['InvocationsPerMinute']
-        per_minute_rates_arr = invocations_per_minute.values
-        # Adjust scale_factor to achieve a given scale_rate
-        if scale_rate_per_second:
-            mean_rate_per_second = invocations_per_minute.mean() / 60
-            if mean_rate_per_second == 0:
-                scale_factor = 1
-            else:
-                scale_factor = scale_rate_per_second / mean_rate_per_second
-
-        bm = FractionalBrownianMotion(hurst=0.8, t=10)
-        magnitude_multiplier = 100  # Need to increase magnitude or values become too small
-        samples = bm.sample(60 * len(per_minute_rates_arr)) * magnitude_multiplier
-        all_bm_samples = samples + np.abs(np.floor(samples.min()))
+        per_minute_rates_arr = self.read_per_minute_rates(per_minute_rates_file_path, self.trace_function, self.trace_start, self.trace_end)  # noqa E501
+        scale_factor = rate_scale_factor(per_minute_rates_arr, scale_factor, scale_rate_per_second)  # noqa E501
+        return upscale_traces([per_minute_rates_arr], [scale_factor], [scale_type],
+                              self.hurst, self.rng_seed)[0]
 
-        per_second_rates = np.array([])
-        for i in range(len(per_minute_rates_arr)):
-            current_rate_minute = per_minute_rates_arr[i]
-            bm_samples = all_bm_samples[i * 60:(i + 1) * 60]
+    def generate_composite_trace(self) -> dict:
+        """Returns k6 options with one time-aligned ramping-arrival-rate scenario per workload.
+        Upscales all workload traces in a single batched pass (see upscale_traces)."""
+        all_rates, scale_factors, scale_types = [], [], []
+        for entry in self.workloads:
+            path = WorkloadGenerator.trace_file(entry.get('workload_type', 'custom'), entry.get('workload_trace'))  # noqa E501
+            rates = self.read_per_minute_rates(path, entry.get('trace_function'),
+                                               entry.get('trace_start', 0), entry.get('trace_end'))  # noqa E501
+            all_rates.append(rates)
+            scale_factors.append(rate_scale_factor(rates, entry.get('scale_factor', 1), entry.get('scale_rate_per_second')))  # noqa E501
+            scale_types.append(entry.get('scale_type', 'linear'))
+        per_second_rates = upscale_traces(all_rates, scale_factors, scale_types,
+                                          self.hurst, self.rng_seed)
+        # Skip the bootstrapping phase of all traces (see generate_trace)
+        if per_second_rates.shape[1] > self.seconds_to_skip:
+            per_second_rates = per_second_rates[:, self.seconds_to_skip:]
+        scenarios = dict()
+        for i, entry in enumerate(self.workloads):
+            scenario = self.encode_for_k6(per_second_rates[i])['scenarios']['benchmark_scenario']
+            endpoint = entry.get('endpoint')
+            if endpoint:
+                scenario['tags'] = {ENDPOINT_TAG: str(endpoint)}
+                scenario['env'] = {'ENDPOINT': str(endpoint)}
+            scenarios[WorkloadGenerator.scenario_name(entry, i)] = scenario
+        return {'scenarios': scenarios}
 
-            # Scale random samples by actual request rate per minute
-            total_units = bm_samples.sum()
-            requests_per_unit = current_rate_minute / total_units
-            upscaled_samples = bm_samples * requests_per_unit
-
-            per_second_rates = np.append(per_second_rates, upscaled_samples)
-
-        scaled_per_second_rates = None
-        if scale_type == 'linear':
-            scaled_per_second_rates = per_second_rates * scale_factor
-        elif scale_type == 'compound':
-            # Use compounding to scale
-            compounding_fractions = per_second_rates / per_second_rates.sum()
-            max_fraction = np.quantile(compounding_fractions, 0.95)
-            # Find exponent required to scale the maximum requests per second by the scale_factor
-            exponent = np.log(scale_factor) / np.log(1 + max_fraction)
-            scaled_per_second_rates = per_second_rates * np.power(1 + compounding_fractions, exponent)  # noqa E501
-            # Clip extremes
-            clip_threshold = np.quantile(scaled_per_second_rates, 0.95)
-            scaled_per_second_rates[scaled_per_second_rates > clip_threshold] = clip_threshold
-        else:
-            raise Exception(f'Unknown scaling type: {scale_type}')
-
-        return np.round(scaled_per_second_rates)
+    def read_per_minute_rates(self, path, function=None, start=0, end=None) -> np.ndarray:
+        """Returns the per minute invocation rates within the trace window [start, end) from
+        a CSV file or a binary trace directory. Binary traces only load the window from disk."""
+        if WorkloadTrace.is_trace(path):
+            return WorkloadTrace(path).per_minute_rates(function, start, end)
+        invocations_per_minute = pd.read_csv(path)['InvocationsPerMinute']
+        return invocations_per_minute.values[start:end]
 
     def encode_for_k6(self, per_second_rates) -> dict:
+        if self.stage_tolerance is not None or self.max_stages is not None:
+            return self.encode_compact_for_k6(per_second_rates)
         # Run length encoding merges contiguous seconds with the same request rate
         n = len(per_second_rates)
         element_does_not_match_prev = per_second_rates[1:] != per_second_rates[:-1]
         positions_where_element_does_not_match = np.append(np.where(element_does_not_match_prev), n - 1)  # noqa E501
         run_lengths = np.diff(np.append(-1, positions_where_element_does_not_match))
         key_elements = per_second_rates[positions_where_element_does_not_match]
-        pre_allocated_vus = int(np.ceil(np.max(per_second_rates) / 10))
+        pre_allocated_vus, max_vus = size_vus(per_second_rates, self.expected_latency)
         start_rate = 0
         if len(key_elements) > 0:
             start_rate = int(key_elements[0])
@@ -162,5 +517,71 @@ class WorkloadGenerator:
                 }
             }
         }
+        if max_vus is not None:
+            config_object['scenarios']['benchmark_scenario']['maxVUs'] = max_vus
 
         return config_object
+
+    def encode_compact_for_k6(self, per_second_rates) -> dict:
+        """Encodes long and noisy traces into few k6 stages using linear ramps.
+        Saves the introduced error into `encoding_error`."""
+        if self.max_stages is not None and self.max_stages < 1:
+            raise ValueError(f"Invalid max_stages {self.max_stages}. Must be at least 1.")
+        tolerance = self.stage_tolerance or 0
+        peak_rate = np.max(per_second_rates) if len(per_second_rates) > 0 else 0
+        while True:
+            # The total invocations error stays bounded, only the per-second tolerance grows
+            stages = compact_stages(per_second_rates, tolerance)
+            if self.max_stages is None or len(stages) <= self.max_stages:
+                break
+            if tolerance > peak_rate:
+                raise ValueError(f"Cannot encode {len(per_second_rates)} seconds into max_stages {self.max_stages} within a total invocations error of 1%. Got {len(stages)} k6 stages.")  # noqa: E501
+            tolerance = tolerance * 2 if tolerance > 0 else 1
+        pre_allocated_vus, max_vus = size_vus(per_second_rates, self.expected_latency)
+        scenario = {
+            'executor': 'ramping-arrival-rate',
+            'startRate': int(per_second_rates[0]) if len(per_second_rates) > 0 else 0,
+            'timeUnit': '1s',
+            'preAllocatedVUs': pre_allocated_vus,
+            'stages': [{'target': target, 'duration': f"{duration}s"} for duration, target in stages]  # noqa E501
+        }
+        if max_vus is not None:
+            scenario['maxVUs'] = max_vus
+        self.encoding_error = self.compare_encoding(per_second_rates, scenario, tolerance)
+        return {'scenarios': {'benchmark_scenario': scenario}}
+
+    def compare_encoding(self, per_second_rates, scenario, tolerance) -> dict:
+        """Returns and logs the error of the k6 `scenario` compared to the per-second rates."""
+        error = {'seconds': len(per_second_rates), 'stages': len(scenario['stages']),
+                 'tolerance': tolerance, 'max_error': 0.0, 'total_error': 0.0}
+        if len(per_second_rates) > 0:
+            encoded_rates = target_series(decode_stages(scenario))
+            total = np.sum(per_second_rates)
+            error['max_error'] = float(np.abs(encoded_rates - per_second_rates).max())
+            error['total_error'] = float((encoded_rates.sum() - total) / total) if total > 0 else 0.0  # noqa E501
+        logging.info(f"Encoded {error['seconds']} seconds into {error['stages']} k6 stages with tolerance {tolerance}: max error {error['max_error']:.2f} requests per second, total invocations error {error['total_error']:+.2%}.")  # noqa E501
+        return error
+
+    def encode_arrivals(self, per_second_rates) -> dict:
+        """Encodes precomputed request timestamps for an open-loop k6 replay.
+        Saves the timestamps as milliseconds since the scenario start into `arrivals`.
+        The shared-iterations scenario executes the `replayArrivals` function of the workload
+        script, which sleeps until the timestamp of each iteration before sending the request.
+        The VUs wait for upcoming requests and must cover the concurrent requests
+        (see size_replay_vus and expected_latency)."""
+        timestamps = arrival_timestamps(per_second_rates, self.arrival_process,
+                                        self.arrival_cv, self.rng_seed)
+        if len(timestamps) == 0:
+            raise Exception('Cannot replay an arrival process without requests.')
+        self.arrivals = np.round(timestamps * 1000).astype('<u4')
+        scenario = {
+            'executor': 'shared-iterations',
+            'exec': 'replayArrivals',
+            # k6 requires at least as many iterations as VUs
+            'vus': size_replay_vus(self.arrivals, self.expected_latency),
+            'iterations': len(self.arrivals),
+            # Allow late requests to complete
+            'maxDuration': f"{len(per_second_rates) + 60}s"
+        }
+        logging.info(f"Generated {len(self.arrivals)} {self.arrival_process} arrivals over {len(per_second_rates)} seconds.")  # noqa E501
+        return {'scenarios': {'benchmark_scenario': scenario}}
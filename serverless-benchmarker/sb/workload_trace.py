@@ -0,0 +1,134 @@
+# Binary format for large per-minute invocation traces with many functions, such as the
+# Azure Functions public dataset (invocations_per_function_md.anon.dXX.csv):
+# https://github.com/Azure/AzurePublicDataset/blob/master/AzureFunctionsDataset2019.md
+# A trace is a directory with the files:
+# * invocations.npy: uint32 matrix with one row per function and one column per minute
+# * index.json: {"functions": [function ids in row order], "minutes": N, "sources": [...]}
+# NumPy memory-maps the matrix such that slicing a time window of a function
+# only reads the required pages instead of the whole file.
+import json
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+MATRIX_FILE = 'invocations.npy'
+INDEX_FILE = 'index.json'
+# Single-function CSV format of the bundled traces (see data/workload_traces)
+RATE_COLUMN = 'InvocationsPerMinute'
+# Columns identifying a function in the Azure Functions dataset
+AZURE_ID_COLUMNS = ['HashOwner', 'HashApp', 'HashFunction']
+
+
+class WorkloadTrace:
+    """Memory-mapped per-minute invocation trace of many functions (see convert_trace).
+    Example:
+    trace = WorkloadTrace('data/azure_functions.sbtrace')
+    rates = trace.per_minute_rates('owner/app/function', start=60, end=120)
+    """
+
+    def __init__(self, path) -> None:
+        self.path = Path(path)
+        with open(self.path / INDEX_FILE) as file:
+            index = json.load(file)
+        self.functions = index['functions']
+        self.rows = {function: row for row, function in enumerate(self.functions)}
+        self.invocations = np.load(self.path / MATRIX_FILE, mmap_mode='r')
+
+    @staticmethod
+    def is_trace(path) -> bool:
+        p = Path(path)
+        return (p / INDEX_FILE).is_file() and (p / MATRIX_FILE).is_file()
+
+    @property
+    def minutes(self) -> int:
+        return self.invocations.shape[1]
+
+    def per_minute_rates(self, function=None, start=0, end=None) -> np.ndarray:
+        """Returns the invocations per minute of a `function` id within the minutes [start, end).
+        The function defaults to the only function of single-function traces.
+        Raises a KeyError for unknown functions."""
+        if function is None:
+            if len(self.functions) != 1:
+                raise KeyError(f"Trace {self.path} contains {len(self.functions)} functions. Specify a trace_function.")  # noqa: E501
+            function = self.functions[0]
+        if function not in self.rows:
+            raise KeyError(f"Unknown function {function} in trace {self.path}.")
+        return np.array(self.invocations[self.rows[function], start:end], dtype=np.int64)
+
+
+def read_header(csv_file) -> list:
+    return list(pd.read_csv(csv_file, nrows=0).columns)
+
+
+def minute_columns(columns) -> list:
+    """Returns the per-minute columns (i.e., named 1..1440) of an Azure Functions dataset file."""
+    return [c for c in columns if c.isdigit()]
+
+
+def function_ids(df, id_columns) -> pd.Series:
+    return df[id_columns].astype(str).agg('/'.join, axis=1)
+
+
+def convert_trace(csv_files, output, id_columns=AZURE_ID_COLUMNS, chunksize=100_000):
+    """Converts CSV traces into a memory-mappable WorkloadTrace directory `output`.
+    Concatenates the `csv_files` in time (e.g., the days d01..d14 of the Azure dataset)
+    and aligns their functions by id. Functions missing in a file have no invocations.
+    Supported CSV formats:
+    * Single function with an InvocationsPerMinute column (id: file name without suffix)
+    * Azure Functions dataset with per-minute columns 1..1440 (id: `id_columns` joined by /)
+    Reads the CSV files in chunks of `chunksize` rows to limit memory usage.
+    Returns the converted WorkloadTrace.
+    """
+    csv_files = [Path(f) for f in csv_files]
+    output = Path(output)
+    # First pass: index function ids and minutes per file
+    rows = dict()
+    spans = []
+    for csv_file in csv_files:
+        columns = read_header(csv_file)
+        if RATE_COLUMN in columns:
+            rows.setdefault(csv_file.stem, len(rows))
+            minutes = sum(len(c) for c in pd.read_csv(csv_file, usecols=[RATE_COLUMN], chunksize=chunksize))  # noqa: E501
+        else:
+            missing = [c for c in id_columns if c not in columns]
+            if missing:
+                raise ValueError(f"Unsupported trace format of {csv_file}. Missing columns: {missing}")  # noqa: E501
+            for chunk in pd.read_csv(csv_file, usecols=id_columns, dtype=str, chunksize=chunksize):
+                for function in function_ids(chunk, id_columns):
+                    rows.setdefault(function, len(rows))
+            minutes = len(minute_columns(columns))
+        spans.append(minutes)
+    # Second pass: fill the matrix file chunk by chunk
+    output.mkdir(parents=True, exist_ok=True)
+    shape = (len(rows), sum(spans))
+    logging.info(f"Converting {len(csv_files)} CSV files into a trace with {shape[0]} functions and {shape[1]} minutes ...")  # noqa: E501
+    matrix = np.lib.format.open_memmap(output / MATRIX_FILE, mode='w+', dtype=np.uint32, shape=shape)  # noqa: E501
+    offset = 0
+    for csv_file, minutes in zip(csv_files, spans):
+        columns = read_header(csv_file)
+        if RATE_COLUMN in columns:
+            start = offset
+            for chunk in pd.read_csv(csv_file, usecols=[RATE_COLUMN], chunksize=chunksize):
+                matrix[rows[csv_file.stem], start:start + len(chunk)] = chunk[RATE_COLUMN].to_numpy()  # noqa: E501
+                start += len(chunk)
+        else:
+            minute_cols = minute_columns(columns)
+            dtypes = {c: str for c in id_columns}
+            for chunk in pd.read_csv(csv_file, usecols=id_columns + minute_cols, dtype=dtypes, chunksize=chunksize):  # noqa: E501
+                # Sum duplicate functions within and across chunks
+                values = chunk[minute_cols].groupby(function_ids(chunk, id_columns).to_numpy()).sum()  # noqa: E501
+                chunk_rows = [rows[function] for function in values.index]
+                matrix[chunk_rows, offset:offset + minutes] += values.to_numpy(dtype=np.uint32)
+        offset += minutes
+    matrix.flush()
+    del matrix
+    index = {
+        'functions': list(rows),
+        'minutes': shape[1],
+        'sources': [f.name for f in csv_files]
+    }
+    with open(output / INDEX_FILE, 'w') as file:
+        json.dump(index, file)
+    return WorkloadTrace(output)
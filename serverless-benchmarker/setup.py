@@ -26,6 +26,10 @@ setup(
         # Workload generation
         'stochastic==0.6.0',
         'pandas==1.3.5',
+        # Vectorized clock-skew correction for trace analysis
+        'numpy>=1.17.3,<2',
+        # Compressed traces.json.zst files
+        'zstandard>=0.15.0,<1',
         # AWS
         'boto3>=1.20.26,<2',
         # Additional dependencies for certain benchmarks
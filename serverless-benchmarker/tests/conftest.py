@@ -1,9 +1,12 @@
 from pathlib import Path
+import json
 import logging
 import shutil
+import pytest
 
 tests_dir = Path(__file__).parent
 fixtures_dir = tests_dir.joinpath('fixtures')
+trace_fixtures_dir = fixtures_dir.joinpath('aws_trace_analyzer')
 
 
 def pytest_sessionstart(session):
@@ -18,3 +21,12 @@ def pytest_sessionstart(session):
             else:
                 logging.debug(f"rm-dir:{path}")
                 shutil.rmtree(path)
+
+
+@pytest.fixture
+def load_trace():
+    """Returns a function loading the X-Ray trace of an app in the aws_trace_analyzer fixtures."""
+    def load(app):
+        with open(trace_fixtures_dir / app / 'traces.json') as file:
+            return json.load(file)
+    return load
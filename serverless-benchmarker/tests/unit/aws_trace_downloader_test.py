@@ -0,0 +1,146 @@
+import json
+from datetime import datetime, timedelta
+import pytest
+from botocore.stub import Stubber
+from sb.aws_trace_downloader import AwsTraceDownloader, extract_trace_ids, filter_expression, is_in_progress, is_sampled, sample_key, time_slices, compact_trace_id  # noqa: E501
+from sb.benchmark_spec import BenchmarkSpec
+from sb.trace_io import open_traces
+
+
+def test_count_traces():
+    spec = BenchmarkSpec({'aws_bench': {'region': 'us-east-1'}})
+    downloader = AwsTraceDownloader(spec)
+    end = datetime.now().astimezone()
+    start = end - timedelta(minutes=10)
+    with Stubber(downloader.client) as stubber:
+        stubber.add_response('get_trace_summaries',
+                             {'TraceSummaries': [{'Id': '1-a'}, {'Id': '1-b'}], 'NextToken': 'n'})
+        stubber.add_response('get_trace_summaries', {'TraceSummaries': [{'Id': '1-c'}]})
+        assert downloader.count_traces(start, end) == 3
+
+
+def test_count_traces_with_trace_services():
+    spec = BenchmarkSpec({'aws_bench': {'region': 'us-east-1', 'trace_services': ['f1', 'f2']}})
+    downloader = AwsTraceDownloader(spec)
+    end = datetime.now().astimezone()
+    start = end - timedelta(minutes=10)
+    expected_params = {
+        'StartTime': start,
+        'EndTime': end,
+        'FilterExpression': 'service("f1") OR service("f2")'
+    }
+    with Stubber(downloader.client) as stubber:
+        stubber.add_response('get_trace_summaries', {'TraceSummaries': [{'Id': '1-a'}]},
+                             expected_params)
+        assert downloader.count_traces(start, end) == 1
+
+
+def test_filter_expression():
+    spec = BenchmarkSpec({'aws_bench': {'trace_services': ['f1']}})
+    assert filter_expression(spec) == 'service("f1")'
+    spec['trace_filter'] = 'annotation.root_trace_id BEGINSWITH "1-"'
+    assert filter_expression(spec) == 'annotation.root_trace_id BEGINSWITH "1-"'
+    assert filter_expression(BenchmarkSpec({'aws_bench': {}})) is None
+
+
+def test_is_sampled():
+    keys = [f"1-{i:08x}-abc" for i in range(10000)]
+    half = [k for k in keys if is_sampled(k, 0.5)]
+    tenth = [k for k in keys if is_sampled(k, 0.1)]
+    assert 4500 < len(half) < 5500
+    assert 800 < len(tenth) < 1200
+    assert set(tenth) <= set(half)
+    assert all(is_sampled(k, None) and is_sampled(k, 1) for k in keys)
+    with pytest.raises(ValueError):
+        is_sampled(keys[0], 0)
+
+
+def test_extract_trace_ids_samples_connected_traces_together():
+    parent = {'Id': '1-parent'}
+    child = {
+        'Id': '1-child',
+        'Annotations': {'root_trace_id': [{'AnnotationValue': {'StringValue': '1-parent'}}]}
+    }
+    assert sample_key(child) == '1-parent'
+    for rate in [0.1, 0.3, 0.5, 0.7, 0.9]:
+        ids = extract_trace_ids({'TraceSummaries': [parent, child]}, rate)
+        assert ids in ([], ['1-parent', '1-child'])
+
+
+def test_time_slices():
+    start = datetime(2022, 1, 1, 10, 0)
+    slices = time_slices(start, start + timedelta(minutes=35), timedelta(minutes=15))
+    assert slices == [
+        (start, start + timedelta(minutes=15)),
+        (start + timedelta(minutes=15), start + timedelta(minutes=30)),
+        (start + timedelta(minutes=30), start + timedelta(minutes=35))
+    ]
+    assert time_slices(start, start, timedelta(minutes=15)) == []
+
+
+def test_compact_trace_id():
+    assert compact_trace_id('1-5759e988-bd862e3fe1be46a994272793') == 0x5759e988bd862e3fe1be46a994272793  # noqa: E501
+    assert compact_trace_id('custom-id') == 'custom-id'
+
+
+def test_retrieve_trace_ids_deduplicates_slices(tmp_path):
+    spec = BenchmarkSpec({'aws_bench': {'region': 'us-east-1', 'trace_slice_minutes': 5}})
+    downloader = AwsTraceDownloader(spec)
+    start = datetime.now().astimezone()
+    end = start + timedelta(minutes=10)
+    ids = ['1-00000001-000000000000000000000001', '1-00000002-000000000000000000000002']
+    trace_ids_file = tmp_path / 'trace_ids.txt'
+    with Stubber(downloader.client) as stubber:
+        # Both slices return the trace at their shared boundary
+        stubber.add_response('get_trace_summaries', {'TraceSummaries': [{'Id': ids[0]}, {'Id': ids[1]}]})  # noqa: E501
+        stubber.add_response('get_trace_summaries', {'TraceSummaries': [{'Id': ids[1]}]})
+        trace_ids = downloader.retrieve_trace_ids(start, end, trace_ids_file)
+    assert sorted(trace_ids) == ids
+    assert sorted(trace_ids_file.read_text().split()) == ids
+
+
+def xray_trace(id, in_progress=False):
+    document = {'id': '1', 'trace_id': id}
+    if in_progress:
+        document['in_progress'] = True
+    segment = {'Id': '1', 'Document': json.dumps(document, separators=(',', ':'))}
+    return {'Id': id, 'Segments': [segment]}
+
+
+def test_is_in_progress():
+    assert is_in_progress(xray_trace('1-a', in_progress=True))
+    assert not is_in_progress(xray_trace('1-a'))
+
+
+def test_retrieve_traces_refetches_in_progress(tmp_path):
+    spec = BenchmarkSpec({'aws_bench': {'region': 'us-east-1', 'trace_fetch_workers': 1,
+                                        'trace_retry_delay': 10}})
+    downloader = AwsTraceDownloader(spec)
+    delays = []
+    downloader.sleep = delays.append
+    ids = [f"1-0000000{i}-00000000000000000000000{i}" for i in range(7)]
+    trace_file = tmp_path / 'traces.json'
+    with Stubber(downloader.client) as stubber:
+        stubber.add_response('batch_get_traces', {
+            'Traces': [xray_trace(ids[0], True), xray_trace(ids[1]), xray_trace(ids[2], True),
+                       xray_trace(ids[3]), xray_trace(ids[4])],
+            'UnprocessedTraceIds': []
+        }, {'TraceIds': ids[:5]})
+        stubber.add_response('batch_get_traces', {
+            'Traces': [xray_trace(ids[5])], 'UnprocessedTraceIds': [ids[6]]
+        }, {'TraceIds': ids[5:]})
+        # First retry completes one trace, the second retry gives up on the other
+        stubber.add_response('batch_get_traces', {
+            'Traces': [xray_trace(ids[0]), xray_trace(ids[2], True)], 'UnprocessedTraceIds': []
+        }, {'TraceIds': [ids[0], ids[2]]})
+        stubber.add_response('batch_get_traces', {
+            'Traces': [xray_trace(ids[2], True)], 'UnprocessedTraceIds': []
+        }, {'TraceIds': [ids[2]]})
+        unprocessed_ids = downloader.retrieve_traces(ids, trace_file)
+        stubber.assert_no_pending_responses()
+    assert unprocessed_ids == [ids[6]]
+    assert delays == [10, 20]
+    with open_traces(trace_file) as file:
+        traces = [json.loads(line) for line in file]
+    assert [t['Id'] for t in traces] == [ids[1], ids[3], ids[4], ids[5], ids[0], ids[2]]
+    assert [is_in_progress(t) for t in traces] == [False] * 5 + [True]
@@ -1,6 +1,12 @@
+import json
 from pathlib import Path
+import os
 import platform
-from sb.benchmark_spec import BenchmarkSpec
+import threading
+import time
+import numpy as np
+import pytest
+from sb.benchmark_spec import BenchmarkSpec, execution_segments
 
 tests_path = Path(__file__).parent.parent
 sub_path = 'fixtures/higher_root_path/azure/higher_root_path_benchmark.py'
@@ -64,3 +70,199 @@ def test_setitem():
     spec = BenchmarkSpec(config)
     spec['endpoint'] = 'https://my-function.com'
     assert spec['endpoint'] == 'https://my-function.com'
+
+
+def local_spec(path):
+    config = {
+        'local_bench': {},
+        'sb': {
+            'host_path': str(path),
+            'host_system': platform.system()
+        }
+    }
+    spec = BenchmarkSpec(config)
+    spec.set_executor('local')
+    return spec
+
+
+@pytest.mark.skipif(platform.system() == 'Windows',
+                    reason="shell commands incompatible for local Windows execution")
+def test_run_many_dependencies(tmp_path):
+    spec = local_spec(tmp_path)
+    outputs = spec.run_many({
+        'read': {'cmd': 'cat a.txt b.txt', 'after': ['write_a', 'write_b']},
+        'write_a': {'cmd': 'echo a > a.txt'},
+        'write_b': {'cmd': 'sleep 0.1 && echo b > b.txt'}
+    })
+    assert outputs['read'] == 'a\nb\n'
+    assert spec.last_run_success
+
+
+@pytest.mark.skipif(platform.system() == 'Windows',
+                    reason="shell commands incompatible for local Windows execution")
+def test_run_many_failure_skips_dependents(tmp_path):
+    spec = local_spec(tmp_path)
+    with pytest.raises(Exception) as e:
+        spec.run_many({
+            'fail': {'cmd': 'exit 1'},
+            'dependent': {'cmd': 'touch dependent.txt', 'after': ['fail']},
+            'transitive': {'cmd': 'touch transitive.txt', 'after': ['dependent']},
+            # Independent commands still run, even if they become ready after the failure
+            'slow': {'cmd': 'sleep 0.2'},
+            'independent': {'cmd': 'touch independent.txt', 'after': ['slow']}
+        }, check=True)
+    assert 'exit 1' in str(e.value)
+    assert not (tmp_path / 'dependent.txt').exists()
+    assert not (tmp_path / 'transitive.txt').exists()
+    assert (tmp_path / 'independent.txt').exists()
+    assert not spec.last_run_success
+
+
+@pytest.mark.skipif(platform.system() == 'Windows',
+                    reason="shell commands incompatible for local Windows execution")
+def test_run_many_timeout_skips_dependents(tmp_path, monkeypatch):
+    spec = local_spec(tmp_path)
+    execute = spec.execute
+    # Simulate a timeout (returncode None) of the command `slow`
+    monkeypatch.setattr(spec, 'execute', lambda cmd, *args: ('', None) if cmd == 'slow' else execute(cmd, *args))  # noqa: E501
+    with pytest.raises(Exception) as e:
+        spec.run_many({
+            'slow': {'cmd': 'slow'},
+            'dependent': {'cmd': 'touch dependent.txt', 'after': ['slow']}
+        })
+    assert 'timed out' in str(e.value)
+    assert not (tmp_path / 'dependent.txt').exists()
+    assert not spec.last_run_success
+
+
+def test_run_many_cycle(tmp_path):
+    spec = local_spec(tmp_path)
+    with pytest.raises(ValueError):
+        spec.run_many({
+            'a': {'cmd': 'true', 'after': ['b']},
+            'b': {'cmd': 'true', 'after': ['a']}
+        })
+
+
+def test_run_many_skips_satisfied_commands(tmp_path):
+    spec = local_spec(tmp_path)
+    outputs = spec.run_many({
+        'install': {'cmd': None},
+        'deploy': {'cmd': 'echo deployed', 'after': ['install']}
+    })
+    assert outputs['install'] == ''
+    assert outputs['deploy'].rstrip() == 'deployed'
+
+
+def test_instance_isolation(tmp_path):
+    spec = local_spec(tmp_path)
+    assert spec.instance() is None
+    assert spec.stack_name('infra') == 'infra'
+    assert spec.workload_file_paths()[1] == BenchmarkSpec.DEFAULT_OPTIONS
+    spec.config['sb']['instance'] = 'http'
+    assert spec.stack_name('infra') == 'infra-http'
+    assert spec.workload_file_paths()[1] == 'workload_options_http.json'
+
+
+def test_lock_serializes_threads(tmp_path):
+    spec = local_spec(tmp_path)
+    events = []
+
+    def critical_section(name):
+        with spec.lock('shared'):
+            events.append(f"{name}-start")
+            time.sleep(0.1)
+            events.append(f"{name}-end")
+
+    threads = [threading.Thread(target=critical_section, args=(i,)) for i in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # No interleaving of critical sections
+    assert events[0].split('-')[0] == events[1].split('-')[0]
+    assert events[2].split('-')[0] == events[3].split('-')[0]
+
+
+def test_execution_segments():
+    assert execution_segments(1) == (['0:1'], '0,1')
+    assert execution_segments(3) == (['0:1/3', '1/3:2/3', '2/3:1'], '0,1/3,2/3,1')
+    with pytest.raises(ValueError):
+        execution_segments(0)
+
+
+@pytest.mark.skipif(platform.system() == 'Windows',
+                    reason="shell commands incompatible for local Windows execution")
+def test_run_k6_segments(tmp_path, monkeypatch):
+    # Fake k6 writing one request per execution segment into its --out csv file
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    fake_k6 = bin_dir / 'k6'
+    fake_k6.write_text(
+        '#!/bin/sh\n'
+        'for arg in "$@"; do case $arg in\n'
+        '  --out) ;; csv=*) out=${arg#csv=} ;;\n'
+        '  --execution-segment=*) segment=${arg#--execution-segment=} ;;\n'
+        'esac; done\n'
+        'index=${out##*_}; index=${index%.csv}\n'
+        'echo "metric_name,timestamp,metric_value,segment" > "$out"\n'
+        'echo "http_reqs,$((1650000000 + index)),1,$segment" >> "$out"\n'
+        'echo "http_reqs,$((1650000010 - index)),1,$segment" >> "$out"\n'
+    )
+    fake_k6.chmod(0o755)
+    monkeypatch.setenv('PATH', f"{bin_dir}:{os.environ['PATH']}")
+    monkeypatch.chdir(tmp_path)
+    spec = local_spec(tmp_path)
+    spec['k6_segments'] = 2
+    spec.event_log.start('invoke')
+    spec.run_k6()
+    metrics_file = spec.workload_log_file()
+    assert metrics_file.read_text() == (
+        'metric_name,timestamp,metric_value,segment\n'
+        'http_reqs,1650000000,1,0:1/2\n'
+        'http_reqs,1650000001,1,1/2:1\n'
+        'http_reqs,1650000009,1,1/2:1\n'
+        'http_reqs,1650000010,1,0:1/2\n'
+    )
+    assert list(metrics_file.parent.glob('k6_metrics_*.csv')) == []
+
+
+def test_arrivals_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    spec = local_spec(tmp_path)
+    spec['workload_type'] = 'jump'
+    spec['scale_factor'] = 1
+    spec['scale_type'] = 'linear'
+    spec['seconds_to_skip'] = 180
+    spec['arrival_process'] = 'gamma'
+    spec['expected_latency'] = 0.2
+    spec.create_workload_options_file(tmp_path)
+    arrivals_file = tmp_path / 'workload_options.arrivals.bin'
+    arrivals = np.fromfile(arrivals_file, dtype='<u4')
+    options = json.loads((tmp_path / BenchmarkSpec.DEFAULT_OPTIONS).read_text())
+    assert options['scenarios']['benchmark_scenario']['iterations'] == len(arrivals)
+    assert spec.arrivals_envs(BenchmarkSpec.DEFAULT_SCRIPT, BenchmarkSpec.DEFAULT_OPTIONS) == {
+        'ARRIVALS_FILE': 'workload_options.arrivals.bin'
+    }
+    # Stale arrivals are removed when regenerating without arrival process
+    spec['arrival_process'] = None
+    spec.create_workload_options_file(tmp_path)
+    assert not arrivals_file.exists()
+    assert spec.arrivals_envs(BenchmarkSpec.DEFAULT_SCRIPT, BenchmarkSpec.DEFAULT_OPTIONS) == {}
+
+
+def test_endpoint_envs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    spec = local_spec(tmp_path)
+    assert spec.endpoint_envs({'http': 'https://a'}) == {}
+    scenarios = {
+        'http': {'executor': 'constant-vus', 'env': {'ENDPOINT': 'http'}},
+        'default': {'executor': 'constant-vus'}
+    }
+    spec.create_workload_options_file(tmp_path, {'scenarios': scenarios})
+    assert spec.endpoint_envs({'http': 'https://a'}) == {'BENCHMARK_URL_HTTP': 'https://a'}
+    # Requests to endpoints without URL would silently go to BENCHMARK_URL
+    scenarios['queue'] = {'executor': 'constant-vus', 'env': {'ENDPOINT': 'queue'}}
+    spec.create_workload_options_file(tmp_path, {'scenarios': scenarios})
+    with pytest.raises(Exception, match='queue'):
+        spec.endpoint_envs({'http': 'https://a'})
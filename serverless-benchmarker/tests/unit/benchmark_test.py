@@ -10,3 +10,10 @@ def test_config_path():
     bench = Benchmark(None, bench_file)
     config_path = (bench_file.parent / '.sb/config.yml')
     assert bench.config_path() == config_path
+
+
+def test_instance_config_path():
+    bench = Benchmark(None, bench_file, instance='http')
+    config_path = (bench_file.parent / '.sb/http/config.yml')
+    assert bench.config_path() == config_path
+    assert bench.new_sb_config()['sb']['instance'] == 'http'
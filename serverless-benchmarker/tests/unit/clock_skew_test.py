@@ -0,0 +1,172 @@
+import copy
+import csv
+import json
+from datetime import datetime, timedelta
+import pytest
+
+import sb.trace_errors as te
+from sb.aws_trace_analyzer import AwsTraceAnalyzer, extract_trace_breakdown
+from sb.aws_trace_trigger_analyzer import AwsTraceTriggerAnalyzer
+from sb.clock_skew import ClockSkewEstimator, correct_clock_skew, load_offsets, segment_clocks
+from sb.cli.trace_cmd import TraceCmd
+from sb.trace_index import IndexedTraceWriter
+from sb.trace_pipeline import TracePipeline
+
+FUNCTION = 'AWS::Lambda::Function'
+
+
+def skew_trace(trace, origin, offset):
+    """Returns a copy of the trace where the clock of all `origin` segments is ahead by
+    `offset` seconds. Like X-Ray, the trace duration spans the skewed timestamps."""
+    trace = copy.deepcopy(trace)
+    segments = []
+    for wrapper in trace['Segments']:
+        segment = json.loads(wrapper['Document'])
+        if segment.get('origin') == origin:
+            for doc, _ in segment_clocks([segment]):
+                doc['start_time'] += offset
+                doc['end_time'] += offset
+        wrapper['Document'] = json.dumps(segment)
+        segments.append(segment)
+    end_time = max(s['end_time'] for s in segments)
+    start_time = min(s['start_time'] for s in segments)
+    trace['Duration'] = round(end_time - start_time, 3)
+    return trace
+
+
+def estimate(traces):
+    estimator = ClockSkewEstimator()
+    for trace in traces:
+        estimator.add_trace(trace)
+    return estimator.offsets()
+
+
+def test_no_offsets_without_skew(load_trace):
+    assert estimate([load_trace('thumbnail_app')] * 10) == {}
+
+
+def test_no_offsets_with_few_samples(load_trace):
+    assert estimate([skew_trace(load_trace('todo_app'), FUNCTION, 0.05)] * 5) == {}
+
+
+def test_correct_skewed_traces(load_trace):
+    trace = load_trace('todo_app')
+    skewed = skew_trace(trace, FUNCTION, 0.05)
+    with pytest.raises(te.TraceError):
+        extract_trace_breakdown(copy.deepcopy(skewed))
+    offsets = estimate([skewed] * 10)
+    assert offsets[FUNCTION] == pytest.approx(0.05, abs=0.002)
+    breakdown = extract_trace_breakdown(copy.deepcopy(skewed), clock_offsets=offsets)
+    assert breakdown == extract_trace_breakdown(trace)
+
+
+def test_correct_clock_skew():
+    segments = [
+        {'id': 'a', 'origin': 'A', 'start_time': 1.0, 'end_time': 4.0},
+        {'id': 'b', 'origin': 'B', 'start_time': 0.5, 'end_time': 3.0,
+         'subsegments': [{'id': 'c', 'start_time': 0.6, 'end_time': 2.0}]}
+    ]
+    assert correct_clock_skew(segments, {'B': -1.0}) == pytest.approx(-0.5)
+    assert [(s['start_time'], s['end_time']) for s in segments] == [(1.0, 4.0), (1.5, 4.0)]
+    assert segments[1]['subsegments'][0]['start_time'] == pytest.approx(1.6)
+    assert correct_clock_skew(segments, {'B': -1.5}) == pytest.approx(1.5)
+    assert correct_clock_skew(segments, {}) == 0.0
+
+
+def test_analyzer_corrects_clock_skew(tmp_path, load_trace):
+    skewed = skew_trace(load_trace('todo_app'), FUNCTION, 0.05)
+    trace_file = tmp_path / 'traces.json'
+    trace_file.write_text((json.dumps(skewed) + '\n') * 10)
+    AwsTraceAnalyzer(trace_file).analyze_traces()
+    with open(tmp_path / 'trace_breakdown.csv') as file:
+        assert len(list(csv.DictReader(file))) == 10
+    assert load_offsets(tmp_path / 'clock_offsets.csv')[FUNCTION] == pytest.approx(0.05, abs=0.002)  # noqa: E501
+    AwsTraceAnalyzer(trace_file, correct_clock_skew=False).analyze_traces()
+    with open(tmp_path / 'trace_breakdown.csv') as file:
+        assert len(list(csv.DictReader(file))) == 0
+
+
+def trigger_trace(i, skew):
+    """Returns an HTTP trigger trace where F1 (InfraLambda) invokes F2 (TriggerLambda)
+    and the clock of all Lambda functions is ahead by `skew` seconds."""
+    start = 1650000000.0 + i * 10
+    f = start + skew
+    receivers = [{'id': f"r{n}{i:03d}", 'name': f"receiver{n}",
+                  'start_time': f + 0.3 + n * 0.01, 'end_time': f + 0.3 + n * 0.01}
+                 for n in range(6)]
+    segments = [
+        {'id': f"l1{i:03d}", 'name': 'InfraLambda-abc', 'origin': 'AWS::Lambda',
+         'start_time': start, 'end_time': start + 1.01},
+        {'id': f"f1{i:03d}", 'name': 'InfraLambda-abc', 'origin': FUNCTION, 'parent_id': f"l1{i:03d}",  # noqa: E501
+         'start_time': f + 0.01, 'end_time': f + 1.0,
+         'subsegments': [{'id': f"s1{i:03d}", 'name': 'http_trigger',
+                          'start_time': f + 0.1, 'end_time': f + 0.9}]},
+        {'id': f"l2{i:03d}", 'name': 'TriggerLambda-xyz', 'origin': 'AWS::Lambda',
+         'parent_id': f"s1{i:03d}", 'start_time': start + 0.2, 'end_time': start + 0.8},
+        {'id': f"f2{i:03d}", 'name': 'TriggerLambda-xyz', 'origin': FUNCTION, 'parent_id': f"l2{i:03d}",  # noqa: E501
+         'start_time': f + 0.21, 'end_time': f + 0.79, 'subsegments': receivers}
+    ]
+    trace_id = f"1-{i:08x}-{i:024x}"
+    trace = {'Id': trace_id, 'Duration': 1.01,
+             'Segments': [{'Document': json.dumps(s)} for s in segments]}
+    return json.dumps(trace) + '\n'
+
+
+def trigger_rows(trace_file, correct_clock_skew=True):
+    AwsTraceTriggerAnalyzer(trace_file, correct_clock_skew).analyze_traces()
+    with open(trace_file.parent / 'trigger.csv') as file:
+        return list(csv.DictReader(file))
+
+
+def test_trigger_analyzer_corrects_clock_skew(tmp_path):
+    trace_file = tmp_path / 'traces.json'
+    trace_file.write_text(''.join(trigger_trace(i, 0.05) for i in range(10)))
+    skewed = trigger_rows(trace_file, correct_clock_skew=False)
+    corrected = trigger_rows(trace_file)
+    offset = load_offsets(tmp_path / 'clock_offsets.csv')[FUNCTION]
+    assert offset == pytest.approx(0.04)
+    assert len(skewed) == len(corrected) == 10
+    delta = timedelta(seconds=offset)
+    for before, after in zip(skewed, corrected):
+        # The AWS::Lambda service clock is the reference
+        assert after['t3'] == before['t3']
+        for t in ['t1', 't2', 't4', 't9']:
+            diff = datetime.fromisoformat(before[t]) - datetime.fromisoformat(after[t])
+            assert diff.total_seconds() == pytest.approx(delta.total_seconds(), abs=1e-5)
+    # The minimal correction shortens the trigger latency t4 - t3 from 150ms (true: 100ms)
+    t3, t4 = datetime.fromisoformat(corrected[0]['t3']), datetime.fromisoformat(corrected[0]['t4'])
+    assert (t4 - t3).total_seconds() == pytest.approx(0.11, abs=1e-5)
+
+
+def test_pipeline_corrects_clock_skew(tmp_path):
+    lines = [trigger_trace(i, 0.05) for i in range(10)]
+    offline_dir = tmp_path / 'offline'
+    offline_dir.mkdir()
+    (offline_dir / 'traces.json').write_text(''.join(lines))
+    corrected = trigger_rows(offline_dir / 'traces.json')
+    # Streamed traces are re-analyzed with correction once the download completes
+    with TracePipeline(AwsTraceTriggerAnalyzer(tmp_path / 'traces.json')) as pipeline:
+        with open(tmp_path / 'traces.json', 'w') as file:
+            for line in lines:
+                file.write(line)
+                pipeline.put(line)
+    with open(tmp_path / 'trigger.csv') as file:
+        assert list(csv.DictReader(file)) == corrected
+    assert (tmp_path / 'clock_offsets.csv').read_text() == (offline_dir / 'clock_offsets.csv').read_text()  # noqa: E501
+
+
+def test_trace_cmd_breakdown_corrects_clock_skew(tmp_path, capsys, load_trace):
+    skewed = skew_trace(load_trace('todo_app'), FUNCTION, 0.05)
+    with IndexedTraceWriter(tmp_path / 'traces.json') as writer:
+        for _ in range(10):
+            writer.write(json.dumps(skewed) + '\n')
+    with pytest.raises(te.TraceError):
+        TraceCmd(None).show(skewed['Id'], log_path=tmp_path, breakdown=True)
+    AwsTraceAnalyzer(tmp_path / 'traces.json').analyze_traces()
+    capsys.readouterr()
+    TraceCmd(None).show(skewed['Id'], log_path=tmp_path, breakdown=True)
+    with open(tmp_path / 'trace_breakdown.csv') as file:
+        row = next(csv.DictReader(file))
+    # Prints the breakdown of each of the 10 copies
+    breakdown, _ = json.JSONDecoder().raw_decode(capsys.readouterr().out)
+    assert breakdown['duration'] == row['duration']
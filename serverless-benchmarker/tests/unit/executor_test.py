@@ -0,0 +1,197 @@
+import os
+from pathlib import Path
+import platform
+import shlex
+import shutil
+import subprocess
+import pytest
+from sb.benchmark_spec import BenchmarkSpec
+from sb.executor import DockerExecutor, LocalExecutor, SshExecutor
+from sb.provider import Provider
+from sb.sb import Sb
+
+
+@pytest.fixture
+def spec(tmp_path):
+    config = {
+        'local_bench': {},
+        'sb': {
+            'host_path': str(tmp_path),
+            'host_system': platform.system()
+        }
+    }
+    return BenchmarkSpec(config)
+
+
+def test_default_executor(spec):
+    assert isinstance(spec.executor, DockerExecutor)
+
+
+def test_docker_command(spec):
+    docker_cmd = spec.executor.command('echo "$HOME"', 'alpine:3.12.0', '/bin/sh')
+    assert docker_cmd.startswith('docker run --rm')
+    assert f":{spec.mount_dir()}" in docker_cmd
+    assert f"cd '{spec.bench_dir()}'" in docker_cmd
+
+
+def test_set_executor(spec):
+    spec.set_executor('local')
+    assert isinstance(spec.executor, LocalExecutor)
+    with pytest.raises(KeyError):
+        spec.set_executor('unknown')
+
+
+@pytest.mark.skipif(platform.system() == 'Windows',
+                    reason="shell pwd command incompatible for local Windows execution")
+def test_local_run_cwd(spec, tmp_path):
+    spec.set_executor('local')
+    out = spec.run('pwd').rstrip()
+    assert Path(out).resolve() == tmp_path.resolve()
+
+
+@pytest.mark.skipif(platform.system() == 'Windows',
+                    reason="shell variable syntax incompatible for local Windows execution")
+def test_local_run_env(spec, monkeypatch):
+    # Like Docker, local commands do not inherit arbitrary host variables
+    monkeypatch.setenv('SB_EXECUTOR_TEST', 'it works')
+    spec.set_executor('local')
+    out = spec.run('echo "$SB_EXECUTOR_TEST:$HOME"').rstrip()
+    assert out == f":{os.environ['HOME']}"
+
+
+def test_local_host_credential_env(spec, tmp_path, monkeypatch):
+    # Host credentials work without Docker
+    monkeypatch.setattr(Provider, 'secrets_dir', lambda p: pytest.fail('Docker not required'))
+    monkeypatch.setenv('AWS_PROFILE', 'host-profile')
+    monkeypatch.setenv('PULUMI_ACCESS_TOKEN', 'token')
+    monkeypatch.setenv('ARM_CLIENT_ID', 'azure-client')
+    monkeypatch.delenv('AWS_SHARED_CREDENTIALS_FILE', raising=False)
+    popen_calls = []
+    monkeypatch.setattr(subprocess, 'Popen', lambda *args, **kwargs: popen_calls.append(kwargs))
+    spec['provider'] = ['aws', 'pulumi']
+    spec.set_executor('local')
+    spec.executor.popen('pulumi up', 'node12.x', '/bin/sh')
+    env = popen_calls[0]['env']
+    assert env['AWS_PROFILE'] == 'host-profile'
+    assert env['PULUMI_ACCESS_TOKEN'] == 'token'
+    assert env['HOME'] == os.environ['HOME']
+    assert 'AWS_SHARED_CREDENTIALS_FILE' not in env
+    # Only credentials of the configured providers
+    assert 'ARM_CLIENT_ID' not in env
+
+
+def test_local_volume_credential_env(spec, tmp_path, monkeypatch):
+    spec['local_credentials'] = 'volume'
+    secrets_dirs = {'aws': tmp_path / 'aws-secrets', 'pulumi': tmp_path / 'pulumi-secrets'}
+    for secrets_dir in secrets_dirs.values():
+        secrets_dir.mkdir()
+    monkeypatch.setattr(Provider, 'secrets_dir', lambda p: secrets_dirs.get(p.name))
+    monkeypatch.setenv('AWS_PROFILE', 'host-profile')
+    popen_calls = []
+    monkeypatch.setattr(subprocess, 'Popen', lambda *args, **kwargs: popen_calls.append(kwargs))
+    spec['provider'] = ['aws', 'pulumi']
+    spec.set_executor('local')
+    spec.executor.popen('pulumi up', 'node12.x', '/bin/sh')
+    env = popen_calls[0]['env']
+    assert env['AWS_SHARED_CREDENTIALS_FILE'] == str((secrets_dirs['aws'] / 'credentials').resolve())  # noqa: E501
+    assert env['AWS_CONFIG_FILE'] == str((secrets_dirs['aws'] / 'config').resolve())
+    assert env['PULUMI_HOME'] == str(secrets_dirs['pulumi'].resolve())
+    assert 'AWS_PROFILE' not in env
+    assert env['PATH'] == os.environ['PATH']
+
+
+def test_local_missing_volume_credentials(spec, monkeypatch):
+    monkeypatch.setattr(Provider, 'secrets_dir', lambda p: None)
+    spec['local_credentials'] = 'volume'
+    spec['provider'] = 'azure'
+    spec.set_executor('local')
+    with pytest.raises(Exception) as e:
+        spec.executor.env()
+    assert 'sb login azure' in str(e.value)
+    spec['provider'] = 'ibm'
+    with pytest.raises(Exception) as e:
+        spec.executor.env()
+    assert 'does not support ibm' in str(e.value)
+
+
+@pytest.mark.skipif(platform.system() == 'Windows',
+                    reason="shell exit command incompatible for local Windows execution")
+def test_local_run_check(spec):
+    spec.set_executor('local')
+    with pytest.raises(Exception) as e:
+        spec.run('exit 3', check=True)
+    assert 'exited unsuccessfully' in str(e.value)
+    assert not spec.last_run_success
+
+
+def test_docker_cache_volumes(spec):
+    docker_cmd = spec.executor.command('npm install', BenchmarkSpec.IMAGES['node12.x'], '/bin/sh')
+    assert ' -v sb-cache-npm:/root/.npm' in docker_cmd
+    alpine_cmd = spec.executor.command('ls', 'alpine:3.12.0', '/bin/sh')
+    assert 'sb-cache' not in alpine_cmd
+    spec['cache_volumes'] = False
+    assert spec.cache_mount('node12.x') == ''
+
+
+def test_npm_install_command(spec, tmp_path):
+    project = tmp_path / 'shared'
+    project.mkdir()
+    # Always install without package-lock.json
+    assert spec.npm_install_command('shared') == 'cd shared && npm install'
+    (project / 'package.json').write_text('{"name": "shared"}')
+    (project / 'package-lock.json').write_text('{"lockfileVersion": 1}')
+    cmd = spec.npm_install_command('shared')
+    lock_hash = spec.npm_lock_hash('shared')
+    assert cmd.startswith('cd shared && npm install && node -e')
+    # Simulate a successful install
+    (project / 'node_modules').mkdir()
+    (project / 'node_modules' / BenchmarkSpec.NPM_INSTALL_STAMP).write_text(f"{lock_hash}\n")
+    assert spec.npm_install_command('shared') is None
+    assert spec.npm_install(['shared']) == []
+    (project / 'package-lock.json').write_text('{"lockfileVersion": 2}')
+    assert spec.npm_install_command('shared') is not None
+
+
+@pytest.mark.skipif(platform.system() == 'Windows' or shutil.which('node') is None,
+                    reason="requires a POSIX shell and node")
+def test_npm_install_stamp_after_lockfile_rewrite(spec, tmp_path, monkeypatch):
+    project = tmp_path / 'shared'
+    project.mkdir()
+    (project / 'package.json').write_text('{"name": "shared"}')
+    (project / 'package-lock.json').write_text('{"lockfileVersion": 1}')
+    # Fake npm rewriting the package-lock.json like npm install upgrading its format
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    (bin_dir / 'npm').write_text('#!/bin/sh\nmkdir -p node_modules\necho \'{"lockfileVersion": 2}\' > package-lock.json\n')  # noqa: E501
+    (bin_dir / 'npm').chmod(0o755)
+    monkeypatch.setenv('PATH', f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    spec.set_executor('local')
+    assert spec.npm_install(['shared']) == ['shared']
+    # The stamp matches the rewritten package-lock.json
+    assert spec.npm_install_command('shared', 'node12.x') is None
+    assert spec.npm_install(['shared']) == []
+
+
+def test_docker_cpuset(spec):
+    docker_cmd = spec.executor.command('k6 run', 'loadimpact/k6:0.37.0', '/bin/sh', cpus='0-3')
+    assert ' --cpuset-cpus=0-3' in docker_cmd
+    assert '--cpuset-cpus' not in spec.executor.command('k6 run', 'loadimpact/k6:0.37.0', '/bin/sh')
+
+
+def test_ssh_command(spec):
+    remote = SshExecutor(spec, 'lg2', 'sb-k6/bench')
+    cmd = remote.command('k6 run --env "A=it\'s" script.js', 'loadimpact/k6:0.37.0', '/bin/sh', '0-1')  # noqa: E501
+    args = shlex.split(cmd)
+    assert args[:2] == ['ssh', 'lg2']
+    assert len(args) == 3
+    assert args[2].startswith('mkdir -p sb-k6/bench && cd sb-k6/bench && docker run')
+    assert '--cpuset-cpus=0-1' in args[2]
+    assert shlex.split(args[2])[-1] == 'k6 run --env "A=it\'s" script.js'
+
+
+def test_sb_executor_flag():
+    bench_file = Path(__file__).parent.parent / 'fixtures' / 'mock_benchmark' / 'mock_benchmark.py'
+    assert isinstance(Sb(str(bench_file), local=True).bench.spec.executor, LocalExecutor)
+    # Used within the sb container, where local only means not to re-enter Docker
+    assert isinstance(Sb(str(bench_file), local=True, executor='docker').bench.spec.executor, DockerExecutor)  # noqa: E501
+    assert isinstance(Sb(str(bench_file)).bench.spec.executor, DockerExecutor)
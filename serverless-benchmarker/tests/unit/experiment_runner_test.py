@@ -0,0 +1,132 @@
+import json
+import logging
+import time
+import pytest
+import yaml
+import sb.experiment_runner as experiment_runner
+from sb.experiment_runner import ExperimentRunner, cpu_sets
+
+STUB_BENCHMARK = '''
+BENCHMARK_CONFIG = """
+stub_benchmark:
+  description: Stub benchmark recording its instance.
+"""
+
+
+def prepare(spec):
+    import logging
+    spec['stack'] = spec.stack_name('app')
+    logging.info(f"prepare(): deploying stack {spec['stack']}")
+
+
+def invoke(spec):
+    pass
+
+
+def cleanup(spec):
+    pass
+'''
+
+
+@pytest.fixture
+def benchmark_file(tmp_path):
+    file = tmp_path / 'stub_benchmark.py'
+    file.write_text(STUB_BENCHMARK)
+    return file
+
+
+def record_instance(sb):
+    """Experiment recording its instance into records/<instance>.json"""
+    start = time.time()
+    sb.prepare()
+    time.sleep(0.2)
+    record = {
+        'start': start,
+        'end': time.time(),
+        'stack': sb.bench.spec['stack'],
+        'trigger': sb.bench.spec['trigger'],
+        'k6_cpus': sb.bench.spec['k6_cpus'],
+        'config_path': str(sb.bench.config_path())
+    }
+    records_dir = sb.bench.path / 'records'
+    records_dir.mkdir(exist_ok=True)
+    (records_dir / f"{sb.instance}.json").write_text(json.dumps(record))
+
+
+def fail_instance(sb):
+    if sb.instance == 'bad':
+        logging.error('experiment(): simulated failure')
+        raise ValueError('simulated failure')
+    record_instance(sb)
+
+
+def load_records(benchmark_file):
+    return {f.stem: json.loads(f.read_text())
+            for f in (benchmark_file.parent / 'records').glob('*.json')}
+
+
+def test_cpu_sets():
+    assert cpu_sets(2, 8) == ['0-3', '4-7']
+    assert cpu_sets(3, 8) == ['0-1', '2-3', '4-5']
+    assert cpu_sets(4, 6) == ['0', '1', '2', '3']
+    # Share CPUs round-robin if there are more slots than CPUs
+    assert cpu_sets(3, 2) == ['0', '1', '0']
+
+
+def test_invalid_max_concurrency():
+    with pytest.raises(ValueError):
+        ExperimentRunner('trigger_benchmark.py', max_concurrency=0)
+
+
+def test_schedules_instances_into_slots(benchmark_file, monkeypatch):
+    monkeypatch.setattr(experiment_runner, 'cpu_sets', lambda n: [f"slot{i}" for i in range(n)])
+    instances = {f"i{i}": {'trigger': f"t{i}"} for i in range(5)}
+    ExperimentRunner(benchmark_file, max_concurrency=2).run(record_instance, instances)
+    records = load_records(benchmark_file)
+    assert sorted(records) == sorted(instances)
+    for name, record in records.items():
+        assert record['trigger'] == instances[name]['trigger']
+        assert record['k6_cpus'] in ['slot0', 'slot1']
+    # At most two instances run at the same time and concurrent instances use different slots
+    for record in records.values():
+        running = [r for r in records.values() if r['start'] <= record['start'] < r['end']]
+        assert len(running) <= 2
+        assert len({r['k6_cpus'] for r in running}) == len(running)
+
+
+def test_isolates_instance_stacks_and_configs(benchmark_file):
+    instances = {'http': {'trigger': 'http'}, 'queue': {'trigger': 'queue'}}
+    ExperimentRunner(benchmark_file, pin_k6=False).run(record_instance, instances)
+    records = load_records(benchmark_file)
+    for name in instances:
+        config_path = benchmark_file.parent / '.sb' / name / 'config.yml'
+        assert records[name]['stack'] == f"app-{name}"
+        assert records[name]['config_path'] == str(config_path.resolve())
+        assert records[name]['k6_cpus'] is None
+        with open(config_path) as file:
+            config = yaml.safe_load(file)
+        assert config['sb']['instance'] == name
+        assert config['stub_benchmark']['stack'] == f"app-{name}"
+    assert not (benchmark_file.parent / '.sb' / 'config.yml').exists()
+
+
+def test_propagates_instance_failures(benchmark_file):
+    instances = {'good1': {}, 'bad': {}, 'good2': {}}
+    with pytest.raises(Exception) as e:
+        ExperimentRunner(benchmark_file, pin_k6=False).run(fail_instance, instances)
+    assert 'failed for 1 of 3 instances: bad' in str(e.value)
+    # Other instances still complete
+    assert sorted(load_records(benchmark_file)) == ['good1', 'good2']
+
+
+def test_writes_instance_log_files(benchmark_file):
+    instances = {'good': {}, 'bad': {}}
+    with pytest.raises(Exception):
+        ExperimentRunner(benchmark_file, pin_k6=False).run(fail_instance, instances)
+    logs_dir = benchmark_file.parent / experiment_runner.INSTANCE_LOGS_DIR
+    good_log = (logs_dir / 'good.log').read_text()
+    bad_log = (logs_dir / 'bad.log').read_text()
+    assert '[good] INFO:root:prepare(): deploying stack app-good' in good_log
+    assert 'simulated failure' not in good_log
+    assert '[bad] ERROR:root:experiment(): simulated failure' in bad_log
+    assert 'app-good' not in bad_log
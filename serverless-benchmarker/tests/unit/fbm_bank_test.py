@@ -0,0 +1,23 @@
+import numpy as np
+import stochastic
+from stochastic.processes.continuous import FractionalBrownianMotion
+from sb.fbm_bank import fbm_samples
+
+
+def test_banked_samples_match_stochastic(tmp_path, monkeypatch):
+    monkeypatch.setenv('SB_FBM_BANK', str(tmp_path))
+    stochastic.random.seed(11)
+    expected = FractionalBrownianMotion(hurst=0.8, t=10).sample(120)
+    assert np.array_equal(fbm_samples(120, 0.8, 10, 11), expected)
+    assert len(list(tmp_path.glob('*.npy'))) == 1
+    banked = fbm_samples(120, 0.8, 10, 11)
+    assert isinstance(banked, np.memmap)
+    assert np.array_equal(banked, expected)
+    assert not np.array_equal(fbm_samples(120, 0.6, 10, 11), expected)
+
+
+def test_disabled_bank(tmp_path, monkeypatch):
+    monkeypatch.setenv('SB_FBM_BANK', 'off')
+    monkeypatch.chdir(tmp_path)
+    assert np.array_equal(fbm_samples(60, 0.8, 10, 1), fbm_samples(60, 0.8, 10, 1))
+    assert list(tmp_path.iterdir()) == []
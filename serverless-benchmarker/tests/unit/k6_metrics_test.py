@@ -0,0 +1,94 @@
+import pytest
+from sb.k6_metrics import count_requests, merge_metrics, K6MetricsFollower
+
+
+def test_count_requests(tmp_path):
+    metrics_file = tmp_path / 'k6_metrics.csv'
+    metrics_file.write_text(
+        'metric_name,timestamp,metric_value,check,error,error_code\n'
+        'http_reqs,1650000000,1.000000,,,\n'
+        'http_req_duration,1650000000,120.500000,,,\n'
+        'http_reqs,1650000001,1.000000,,,\n'
+        'http_req_failed,1650000001,0.000000,,,\n'
+    )
+    assert count_requests(metrics_file) == 2
+
+
+HEADER = 'metric_name,timestamp,metric_value,check,error,error_code\n'
+
+
+def request_lines(second, durations, failed=0):
+    lines = ''
+    for i, duration in enumerate(durations):
+        lines += f"http_reqs,{second},1.000000,,,\n"
+        lines += f"http_req_duration,{second},{duration},,,\n"
+        lines += f"http_req_failed,{second},{1 if i < failed else 0},,,\n"
+    return lines
+
+
+def test_follower_incremental_reads(tmp_path):
+    metrics_file = tmp_path / 'k6_metrics.csv'
+    follower = K6MetricsFollower(metrics_file, window=10)
+    content = HEADER + request_lines(100, [10, 20, 30, 40], failed=1)
+    # Simulate k6 flushing a partial line
+    metrics_file.write_text(content[:-10])
+    with open(metrics_file) as file:
+        follower.read_available(file)
+        assert follower.snapshot()['rps'] == 4
+        with open(metrics_file, 'a') as writer:
+            writer.write(content[-10:] + request_lines(101, [50, 60]))
+        follower.read_available(file)
+    stats = follower.snapshot()
+    assert stats['seconds'] == 2
+    assert stats['rps'] == 3
+    assert stats['max_rps'] == 4
+    assert stats['p50'] == 35
+    assert stats['error_rate'] == 1 / 6
+
+
+def test_follower_sliding_window(tmp_path):
+    follower = K6MetricsFollower(tmp_path / 'k6_metrics.csv', window=3)
+    follower.process_line(HEADER.strip())
+    for line in request_lines(1, [10]).splitlines() + request_lines(5, [20, 30]).splitlines():
+        follower.process_line(line)
+    # Second 1 fell out of the window and late samples for it are ignored
+    follower.process_line('http_reqs,1,1.000000,,,')
+    assert list(follower.seconds) == [5]
+    assert follower.snapshot()['rps'] == 2
+    follower.process_line('dropped_iterations,6,3,,,')
+    assert follower.snapshot()['dropped_iterations'] == 3
+
+
+def test_follower_thread(tmp_path):
+    metrics_file = tmp_path / 'k6_metrics.csv'
+    follower = K6MetricsFollower(metrics_file, interval=0.01, poll_interval=0.01)
+    follower.start()
+    metrics_file.write_text(HEADER + request_lines(100, [10, 20]))
+    follower.stop()
+    assert follower.snapshot()['rps'] == 2
+
+
+def test_merge_metrics(tmp_path):
+    part_a = tmp_path / 'k6_metrics_0.csv'
+    part_b = tmp_path / 'k6_metrics_1.csv'
+    part_a.write_text(HEADER + request_lines(100, [10]) + request_lines(102, [30]))
+    part_b.write_text(HEADER + request_lines(101, [20]))
+    metrics_file = tmp_path / 'k6_metrics.csv'
+    merge_metrics([part_a, part_b], metrics_file)
+    assert metrics_file.read_text() == HEADER + request_lines(100, [10]) + request_lines(101, [20]) + request_lines(102, [30])  # noqa: E501
+    part_b.write_text('metric_name,timestamp\n')
+    with pytest.raises(Exception):
+        merge_metrics([part_a, part_b], metrics_file)
+
+
+def test_merge_unordered_metrics(tmp_path):
+    # k6 flushes its samples only nearly in chronological order
+    part_a = tmp_path / 'k6_metrics_0.csv'
+    part_b = tmp_path / 'k6_metrics_1.csv'
+    part_a.write_text(HEADER + request_lines(102, [30]) + request_lines(100, [10]))
+    part_b.write_text(HEADER + request_lines(101, [20]) + request_lines(103, [40]))
+    metrics_file = tmp_path / 'k6_metrics.csv'
+    merge_metrics([part_a, part_b], metrics_file)
+    assert metrics_file.read_text() == HEADER + ''.join(request_lines(t, [d]) for t, d in [(100, 10), (101, 20), (102, 30), (103, 40)])  # noqa: E501
+    # Keeps the parts unchanged
+    assert part_a.read_text() == HEADER + request_lines(102, [30]) + request_lines(100, [10])
@@ -0,0 +1,85 @@
+import csv
+import json
+import pytest
+
+from sb.aws_trace_analyzer import AwsTraceAnalyzer, create_span_graph
+from sb.aws_trace_trigger_analyzer import AwsTraceTriggerAnalyzer
+from sb.cli.trace_cmd import TraceCmd
+from sb.sb import Sb, trace_analyzer_class
+from sb.shape_index import ShapeIndex, normalize_name, topology_signature
+
+
+def without_cold_starts(trace):
+    """Removes the Initialization subsegments of all Lambda functions."""
+    for wrapper in trace['Segments']:
+        segment = json.loads(wrapper['Document'])
+        if segment.get('origin') == 'AWS::Lambda::Function':
+            segment['subsegments'] = [s for s in segment.get('subsegments', [])
+                                      if s['name'] != 'Initialization']
+        wrapper['Document'] = json.dumps(segment)
+    return trace
+
+
+def test_normalize_name():
+    assert normalize_name('wildrydes-FaceDetectionFunction-UB72KZMWRLCF') == 'wildrydes-FaceDetectionFunction-*'  # noqa: E501
+    assert normalize_name('InfraLambda-5d2a1e7') == 'InfraLambda-*'
+    assert normalize_name('thumbnail-generator-dev-thumbnail-generator') == 'thumbnail-generator-dev-thumbnail-generator'  # noqa: E501
+    assert normalize_name('AssignWorkerID3') == 'AssignWorkerID3'
+    assert normalize_name(None) == ''
+
+
+def test_signature_folds_cold_starts(load_trace):
+    cold = load_trace('thumbnail_app')
+    cold_signature = topology_signature(create_span_graph(cold))
+    warm_signature = topology_signature(create_span_graph(without_cold_starts(cold)))
+    assert cold_signature == warm_signature
+    assert cold_signature != topology_signature(create_span_graph(load_trace('matrix_app')))
+
+
+def test_analyzer_writes_shape_index(tmp_path, load_trace):
+    apps = ['matrix_app', 'thumbnail_app', 'thumbnail_app', 'thumbnail_app_in_progress']
+    lines = [json.dumps(load_trace(app)) + '\n' for app in apps]
+    AwsTraceAnalyzer(tmp_path / 'traces.json').analyze_lines(lines)
+    with open(tmp_path / 'trace_breakdown.csv') as file:
+        signatures = [row['signature'] for row in csv.DictReader(file)]
+    assert len(signatures) == 3 and signatures[1] == signatures[2]
+    index = ShapeIndex.load(tmp_path / 'shape_index.json')
+    assert len(index) == 2
+    assert index.count(signatures[1]) == 2
+    assert index.mean(signatures[1]) == 14.963
+    assert index.mean(signatures[1], 'overhead') is None
+    assert index.shapes[signatures[1]]['services'] == ['AWS::ApiGateway::Stage', 'AWS::Lambda', 'AWS::Lambda::Function', 'AWS::S3::Bucket']  # noqa: E501
+
+
+def test_trace_cmd_shapes(tmp_path, capsys, load_trace):
+    runs = {'run1': ['thumbnail_app', 'matrix_app'], 'run2': ['thumbnail_app', 'thumbnail_app']}
+    for run, apps in runs.items():
+        (tmp_path / run).mkdir()
+        lines = [json.dumps(load_trace(app)) + '\n' for app in apps]
+        AwsTraceAnalyzer(tmp_path / run / 'traces.json').analyze_lines(lines)
+    TraceCmd(None).shapes(tmp_path / 'run1', tmp_path / 'run2')
+    rows = list(csv.DictReader(capsys.readouterr().out.splitlines()))
+    assert len(rows) == 2
+    assert [(r['run1_count'], r['run2_count']) for r in rows] == [('1', '2'), ('1', '0')]
+    assert rows[0]['run2_mean_duration'] == '14.963'
+
+
+def test_trace_cmd_shapes_builds_missing_index(tmp_path, capsys, load_trace):
+    # Runs analyzed only for trigger.csv have no shape index yet
+    with open(tmp_path / 'traces.json', 'w') as file:
+        file.write(json.dumps(load_trace('thumbnail_app')) + '\n')
+    TraceCmd(None).shapes(tmp_path)
+    assert (tmp_path / 'shape_index.json').is_file()
+    rows = list(csv.DictReader(capsys.readouterr().out.splitlines()))
+    assert [r[f"{tmp_path.name}_count"] for r in rows] == ['1']
+
+
+def test_analyze_traces_with_breakdown_analyzer(tmp_path, load_trace):
+    with open(tmp_path / 'traces.json', 'w') as file:
+        file.write(json.dumps(load_trace('thumbnail_app')) + '\n')
+    assert trace_analyzer_class('aws') is AwsTraceTriggerAnalyzer
+    with pytest.raises(Exception):
+        trace_analyzer_class('aws', 'unknown')
+    Sb().analyze_traces(tmp_path / 'traces.json', 'aws', analyzer='breakdown')
+    assert len(ShapeIndex.load(tmp_path / 'shape_index.json')) == 1
+    assert not (tmp_path / 'trigger.csv').exists()
@@ -0,0 +1,53 @@
+import csv
+import json
+import pytest
+
+import sb.trace_errors as te
+from sb.aws_trace_analyzer import AwsTraceAnalyzer, extract_trace_breakdown
+
+
+@pytest.mark.parametrize('app,code', [
+    ('thumbnail_app_in_progress', te.IN_PROGRESS),
+    ('thumbnail_app_missing_root', te.MISSING_PARENT),
+    ('event_processing_memory_leak', te.CYCLE),
+    ('realworld_app_missing_coldstart', te.BREAKDOWN_MISMATCH)
+])
+def test_error_codes(app, code, load_trace):
+    with pytest.raises(te.TraceError) as e:
+        extract_trace_breakdown(load_trace(app))
+    assert e.value.code == code
+
+
+def test_invariant_errors_remain_assertions(load_trace):
+    with pytest.raises(AssertionError):
+        extract_trace_breakdown(load_trace('realworld_app_missing_coldstart'))
+
+
+def test_error_code_of_other_exceptions():
+    assert te.error_code(KeyError('Id')) == 'KeyError'
+    assert te.error_code(te.TraceError(te.CLOCK_SKEW, 'skew')) == te.CLOCK_SKEW
+
+
+def test_invalid_trace_summary():
+    summary = te.InvalidTraceSummary(num_examples=2)
+    for i in range(5):
+        summary.add(te.IN_PROGRESS, f"t{i}")
+    summary.add(te.MISSING_ROOT, 'r1')
+    assert len(summary) == 6
+    assert summary.rows(100) == [
+        [te.IN_PROGRESS, 5, 5.0, 't0 t1'],
+        [te.MISSING_ROOT, 1, 1.0, 'r1']
+    ]
+
+
+def test_analyzer_writes_summary(tmp_path, load_trace):
+    apps = ['matrix_app', 'thumbnail_app_in_progress', 'event_processing_memory_leak']
+    lines = [json.dumps(load_trace(app)) + '\n' for app in apps]
+    AwsTraceAnalyzer(tmp_path / 'traces.json').analyze_lines(lines)
+    with open(tmp_path / 'invalid_traces.csv') as file:
+        invalid = list(csv.DictReader(file))
+    assert [row['code'] for row in invalid] == [te.IN_PROGRESS, te.CYCLE]
+    with open(tmp_path / 'invalid_summary.csv') as file:
+        summary = list(csv.DictReader(file))
+    assert {row['code']: int(row['count']) for row in summary} == {te.IN_PROGRESS: 1, te.CYCLE: 1}
+    assert summary[0]['example_trace_ids'] == invalid[0]['trace_id']
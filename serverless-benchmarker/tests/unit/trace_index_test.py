@@ -0,0 +1,104 @@
+import json
+import sqlite3
+import pytest
+
+from sb.cli.trace_cmd import TraceCmd
+from sb.trace_index import IndexedTraceWriter, TraceIndex, build_index, find_entries, index_file, read_trace, trace_keys  # noqa: E501
+from sb.trace_io import open_traces
+
+ROOT_ID = '1-ffffffff-ffffffffffffffffffffffff'
+
+
+def trace_line(i, root_trace_id=None):
+    # Documents are compact and double-encoded as in X-Ray traces
+    document = {'id': f"{i:016x}", 'annotations': {}}
+    if root_trace_id:
+        document['annotations']['root_trace_id'] = root_trace_id
+    segment = {'Document': json.dumps(document, separators=(',', ':'))}
+    trace = {'Id': f"1-{i:08x}-{i:024x}", 'Segments': [segment]}
+    return json.dumps(trace) + '\n'
+
+
+LINES = [trace_line(i) for i in range(200)] + [trace_line(200, ROOT_ID), trace_line(201, ROOT_ID)]
+
+
+@pytest.mark.parametrize('name', ['traces.json', 'traces.json.zst', 'traces.json.gz'])
+def test_indexed_writer_random_access(tmp_path, name):
+    trace_file = tmp_path / name
+    with IndexedTraceWriter(trace_file, frame_size=1000) as writer:
+        for line in LINES:
+            writer.write(line)
+    # Sequential reads across all (zstd) frames
+    with open_traces(trace_file) as file:
+        assert list(file) == LINES
+    # Random access through the index
+    entry = find_entries(index_file(trace_file), trace_keys(LINES[150])[0])[0]
+    assert read_trace(trace_file, entry) == LINES[150]
+    if name.endswith('.zst'):
+        assert entry['frame'] > 0
+        assert entry['offset'] < 1000 + len(LINES[150])
+
+
+def test_find_by_root_trace_id(tmp_path):
+    with IndexedTraceWriter(tmp_path / 'traces.json.zst') as writer:
+        for line in LINES:
+            writer.write(line)
+    traces = TraceIndex(tmp_path).traces(ROOT_ID)
+    assert [t['Id'] for t in traces] == [json.loads(line)['Id'] for line in LINES[-2:]]
+    assert TraceIndex(tmp_path).traces('1-unknown') == []
+
+
+@pytest.mark.parametrize('name', ['traces.json', 'traces.json.zst'])
+def test_build_index_on_demand(tmp_path, name):
+    trace_file = tmp_path / name
+    with open_traces(trace_file, 'w') as file:
+        file.writelines(LINES)
+    index = TraceIndex(trace_file)
+    assert index.index_path.is_file()
+    assert index.traces(trace_keys(LINES[42])[0]) == [json.loads(LINES[42])]
+    # Rebuilding yields the same index
+    content = index_rows(index.index_path)
+    assert len(content) == len(LINES)
+    assert index_rows(build_index(trace_file)) == content
+
+
+def test_index_lookups_use_btree(tmp_path):
+    with IndexedTraceWriter(tmp_path / 'traces.json') as writer:
+        for line in LINES:
+            writer.write(line)
+    db = sqlite3.connect(index_file(tmp_path / 'traces.json'))
+    for field, index in [('trace_id', 'traces_trace_id'), ('root_trace_id', 'traces_root_trace_id')]:  # noqa: E501
+        plan = db.execute(f"EXPLAIN QUERY PLAN SELECT * FROM traces WHERE {field} = ?", (ROOT_ID,)).fetchall()  # noqa: E501
+        assert f"USING INDEX {index}" in str(plan)
+    db.close()
+    # Missing indexes are not created by lookups
+    with pytest.raises(sqlite3.OperationalError):
+        find_entries(tmp_path / 'missing.db', ROOT_ID)
+    assert not (tmp_path / 'missing.db').exists()
+
+
+def index_rows(index_path) -> list:
+    db = sqlite3.connect(index_path)
+    rows = db.execute('SELECT * FROM traces ORDER BY rowid').fetchall()
+    db.close()
+    return rows
+
+
+def test_trace_keys_azure():
+    line = json.dumps({'tables': [], 'attrs': {'rootTraceId': 'r1', 'traceId': 't1'}})
+    assert trace_keys(line) == ('t1', 'r1')
+
+
+def test_trace_cmd_show(tmp_path, capsys, load_trace):
+    trace = load_trace('matrix_app')
+    with IndexedTraceWriter(tmp_path / 'traces.json') as writer:
+        writer.write(json.dumps(trace) + '\n')
+    cmd = TraceCmd(None)
+    cmd.show(trace['Id'], log_path=tmp_path)
+    shown = json.loads(capsys.readouterr().out)
+    assert shown['Id'] == trace['Id']
+    assert isinstance(shown['Segments'][0]['Document'], dict)
+    cmd.show(trace['Id'], log_path=tmp_path, breakdown=True)
+    assert json.loads(capsys.readouterr().out)['trace_id'] == trace['Id']
+    with pytest.raises(KeyError):
+        cmd.show('1-unknown', log_path=tmp_path)
@@ -0,0 +1,97 @@
+import csv
+import json
+from pathlib import Path
+import pytest
+
+from sb.trace_io import traces_file, find_traces, is_traces_file, with_stem, open_traces, PrefetchReader  # noqa: E501
+from sb.aws_trace_analyzer import AwsTraceAnalyzer
+from sb.aws_trace_migrator import migrate_traces
+
+TRACES = [{'Id': f"1-{i:08x}", 'Duration': i / 10, 'Segments': []} for i in range(1000)]
+
+
+def write_traces(path, traces=TRACES):
+    with open_traces(path, 'w') as file:
+        for trace in traces:
+            file.write(json.dumps(trace) + '\n')
+
+
+@pytest.mark.parametrize('compression', ['zst', 'gz', 'none'])
+def test_round_trip(tmp_path, compression):
+    path = traces_file(tmp_path, compression)
+    write_traces(path)
+    with open_traces(path) as file:
+        assert [json.loads(line) for line in file] == TRACES
+
+
+def test_traces_file_names(tmp_path):
+    assert traces_file(tmp_path).name == 'traces.json.zst'
+    assert traces_file(tmp_path, 'gz').name == 'traces.json.gz'
+    assert traces_file(tmp_path, 'none').name == 'traces.json'
+    with pytest.raises(ValueError):
+        traces_file(tmp_path, 'bz2')
+
+
+def test_compresses(tmp_path):
+    plain = traces_file(tmp_path, 'none')
+    compressed = traces_file(tmp_path, 'zst')
+    write_traces(plain)
+    write_traces(compressed)
+    assert compressed.stat().st_size < plain.stat().st_size / 5
+
+
+def test_find_traces(tmp_path):
+    assert find_traces(tmp_path) is None
+    write_traces(tmp_path / 'traces.json.gz')
+    assert find_traces(tmp_path) == tmp_path / 'traces.json.gz'
+
+
+def test_is_traces_file():
+    assert is_traces_file('logs/traces.json')
+    assert is_traces_file('logs/traces.json.zst')
+    assert not is_traces_file('logs/traces.json.bak')
+
+
+def test_with_stem():
+    assert with_stem('logs/traces.json.zst', 'traces_v2') == Path('logs/traces_v2.json.zst')
+    assert with_stem('logs/traces.json', 'traces_v2') == Path('logs/traces_v2.json')
+
+
+def test_prefetch_reader_propagates_errors():
+    class FailingStream:
+        def read(self, size):
+            raise OSError('corrupt')
+
+        def close(self):
+            pass
+
+    reader = PrefetchReader(FailingStream())
+    with pytest.raises(OSError, match='corrupt'):
+        reader.read(10)
+    reader.close()
+
+
+def test_prefetch_reader_close_before_eof(tmp_path):
+    path = tmp_path / 'traces.json.zst'
+    write_traces(path)
+    with open_traces(path) as file:
+        assert json.loads(file.readline()) == TRACES[0]
+
+
+def test_migrate_compressed_traces(tmp_path):
+    path = tmp_path / 'traces.json.gz'
+    with open_traces(path, 'w') as file:
+        json.dump({trace['Id']: trace for trace in TRACES[:3]}, file)
+    migrate_traces(path, replace=True)
+    with open_traces(path) as file:
+        assert [json.loads(line) for line in file] == TRACES[:3]
+
+
+def test_analyze_compressed_traces(tmp_path, load_trace):
+    compressed = tmp_path / 'traces.json.zst'
+    with open_traces(compressed, 'w') as file:
+        file.write(json.dumps(load_trace('matrix_app')) + '\n')
+    AwsTraceAnalyzer(compressed).analyze_traces()
+    with open(tmp_path / 'trace_breakdown.csv') as file:
+        rows = list(csv.reader(file))
+    assert len(rows) == 2
@@ -0,0 +1,52 @@
+import json
+import pytest
+
+from sb.trace_pipeline import TracePipeline, open_pipeline
+from sb.aws_trace_analyzer import AwsTraceAnalyzer
+
+
+class FailingAnalyzer:
+    def __init__(self, log_path) -> None:
+        self.log_path = log_path
+
+    def analyze_lines(self, lines):
+        next(iter(lines))
+        raise ValueError('Analyzer failed')
+
+
+def fixture_lines(load_trace):
+    return [json.dumps(load_trace(app)) + '\n'
+            for app in ['matrix_app', 'realworld_app', 'model_training_app']]
+
+
+def test_pipeline_matches_analyze_traces(tmp_path, load_trace):
+    lines = fixture_lines(load_trace)
+    # Analyze after download
+    offline_dir = tmp_path / 'offline'
+    offline_dir.mkdir()
+    with open(offline_dir / 'traces.json', 'w') as file:
+        file.writelines(lines)
+    AwsTraceAnalyzer(offline_dir / 'traces.json').analyze_traces()
+    # Analyze while downloading (maxsize smaller than the number of lines)
+    streaming_dir = tmp_path / 'streaming'
+    streaming_dir.mkdir()
+    with TracePipeline(AwsTraceAnalyzer(streaming_dir / 'traces.json'), maxsize=1) as pipeline:
+        with open(streaming_dir / 'traces.json', 'w') as file:
+            for line in lines:
+                file.write(line)
+                pipeline.put(line)
+    offline = (offline_dir / 'trace_breakdown.csv').read_text()
+    assert (streaming_dir / 'trace_breakdown.csv').read_text() == offline
+    assert len(offline.splitlines()) == 4
+
+
+def test_pipeline_raises_for_failed_analyzer(tmp_path, load_trace):
+    with pytest.raises(Exception, match='FailingAnalyzer'):
+        with TracePipeline(FailingAnalyzer(tmp_path / 'traces.json'), maxsize=1) as pipeline:
+            for line in fixture_lines(load_trace):
+                pipeline.put(line)
+
+
+def test_open_pipeline_without_analyzer(tmp_path):
+    with open_pipeline(None, tmp_path / 'traces.json') as pipeline:
+        assert pipeline is None
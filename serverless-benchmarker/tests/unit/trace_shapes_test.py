@@ -0,0 +1,75 @@
+import copy
+import json
+from datetime import datetime
+import numpy as np
+import pytest
+
+import sb.trace_errors as te
+from sb.aws_trace_analyzer import extract_trace_breakdown
+from sb.clock_skew import segment_clocks
+from sb.trace_shapes import BatchBreakdown, parse_shape, to_micros
+
+
+def stretch_trace(trace, factor, shift=0):
+    """Returns a copy of the trace with the same shape but stretched and shifted timestamps."""
+    trace = copy.deepcopy(trace)
+    segments = [json.loads(s['Document']) for s in trace['Segments']]
+    start = min(doc['start_time'] for doc, _ in segment_clocks(segments))
+    for doc, _ in segment_clocks(segments):
+        for key in ['start_time', 'end_time']:
+            doc[key] = round(start + shift + (doc[key] - start) * factor, 6)
+    for wrapper, segment in zip(trace['Segments'], segments):
+        wrapper['Document'] = json.dumps(segment)
+    trace['Duration'] = round(trace['Duration'] * factor, 3)
+    return trace
+
+
+def batch_results(traces):
+    batch = BatchBreakdown()
+    for trace in traces:
+        batch.add(json.dumps(trace))
+    return batch, [result for _, result in batch.flush()]
+
+
+def general_result(trace):
+    try:
+        return extract_trace_breakdown(copy.deepcopy(trace))
+    except Exception as e:
+        return e
+
+
+@pytest.mark.parametrize('app', ['matrix_app', 'thumbnail_app', 'realworld_app', 'event_processing_app'])  # noqa: E501
+def test_batch_matches_general_engine(app, load_trace):
+    trace = load_trace(app)
+    traces = [trace] + [stretch_trace(trace, factor, shift)
+                        for factor in [1, 1.1, 1.5, 2] for shift in [0, 0.5, 3600]]
+    batch, results = batch_results(traces)
+    assert batch.num_fast == len(traces) - 1
+    assert results == [general_result(t) for t in traces]
+
+
+def test_fallback_for_unknown_shapes(load_trace):
+    traces = [load_trace(app) for app in ['thumbnail_app_in_progress', 'thumbnail_app_missing_root', 'matrix_app']]  # noqa: E501
+    assert parse_shape(traces[0]) is None
+    assert parse_shape(traces[1]) is None
+    batch, results = batch_results(traces)
+    assert batch.num_fast == 0
+    assert [te.error_code(r) for r in results[:2]] == [te.IN_PROGRESS, te.MISSING_PARENT]
+    assert results[2] == general_result(traces[2])
+
+
+def test_fast_path_validates_duration(load_trace):
+    trace = load_trace('thumbnail_app')
+    invalid = copy.deepcopy(trace)
+    invalid['Duration'] += 1
+    batch, results = batch_results([trace, invalid, trace])
+    assert batch.num_fast == 1
+    assert te.error_code(results[1]) == te.DURATION_MISMATCH
+    assert results[2] == results[0]
+
+
+def test_to_micros():
+    times = [1613573901.6805, 1619774396.626, 1624353531.8654525, 1.0000005]
+    expected = [datetime.fromtimestamp(t) - datetime.fromtimestamp(0) for t in times]
+    micros = to_micros(np.array(times)) - to_micros(np.array([0.0]))
+    assert [e.days * 86400_000_000 + e.seconds * 1_000_000 + e.microseconds for e in expected] == micros.tolist()  # noqa: E501
@@ -0,0 +1,52 @@
+from sb.trace_waiter import wait_for_stable_count
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def time(self):
+        return self.now
+
+
+def stub_backend(counts):
+    """Returns a count function yielding the given counts and repeating the last one."""
+    counts = list(counts)
+
+    def count_traces():
+        return counts.pop(0) if len(counts) > 1 else counts[0]
+    return count_traces
+
+
+def test_returns_once_stable_near_expected():
+    clock = FakeClock()
+    count = wait_for_stable_count(stub_backend([0, 40, 98, 98, 98]), expected=100,
+                                  interval=30, sleep=clock.sleep, clock=clock.time)
+    assert count == 98
+    assert clock.now == 4 * 30
+
+
+def test_waits_while_below_expected():
+    clock = FakeClock()
+    count = wait_for_stable_count(stub_backend([10, 10, 10, 10, 100]), expected=100,
+                                  interval=30, sleep=clock.sleep, clock=clock.time)
+    assert count == 100
+    assert clock.now == 6 * 30
+
+
+def test_timeout():
+    clock = FakeClock()
+    count = wait_for_stable_count(stub_backend([10]), expected=100, timeout=120,
+                                  interval=30, sleep=clock.sleep, clock=clock.time)
+    assert count == 10
+    assert clock.now == 120
+
+
+def test_unknown_expected_count():
+    clock = FakeClock()
+    count = wait_for_stable_count(stub_backend([0, 0, 0, 5, 5, 5]), expected=None,
+                                  interval=30, sleep=clock.sleep, clock=clock.time)
+    assert count == 5
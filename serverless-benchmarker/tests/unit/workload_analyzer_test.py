@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from sb.workload_analyzer import WorkloadAnalyzer, decode_stages, parse_duration, target_series
+
+OPTIONS = {
+    'scenarios': {
+        'benchmark_scenario': {
+            'executor': 'ramping-arrival-rate',
+            'startRate': 0,
+            'timeUnit': '1s',
+            'preAllocatedVUs': 1,
+            'stages': [
+                {'target': 0, 'duration': '2s'},
+                {'target': 4, 'duration': '1s'},
+                {'target': 4, 'duration': '2s'}
+            ]
+        }
+    }
+}
+
+
+def test_parse_duration():
+    assert parse_duration('13s') == 13
+    assert parse_duration('1m30s') == 90
+    assert parse_duration('500ms') == 0.5
+    with pytest.raises(ValueError):
+        parse_duration('10 seconds')
+
+
+def test_target_series():
+    stages = decode_stages(OPTIONS['scenarios']['benchmark_scenario'])
+    assert stages == [(0, 2, 0, 0), (2, 3, 0, 4), (3, 5, 4, 4)]
+    # The second stage ramps linearly from 0 to 4 requests per second
+    assert np.array_equal(target_series(stages), [0, 0, 2, 4, 4])
+    constant = {'executor': 'constant-arrival-rate', 'rate': 30, 'timeUnit': '1m',
+                'duration': '2s', 'startTime': '1s'}
+    assert np.array_equal(target_series(decode_stages(constant)), [0, 0.5, 0.5])
+    assert decode_stages({'executor': 'per-vu-iterations'}) is None
+
+
+def test_analyze_workload(tmp_path):
+    metrics_file = tmp_path / 'k6_metrics.csv'
+    lines = ['metric_name,timestamp,metric_value,scenario']
+    for second in range(5):
+        lines.append(f"vus,{100 + second},1,")
+        lines.append(f"vus_max,{100 + second},1,")
+    for second, requests in [(2, 2), (3, 4), (4, 2)]:
+        lines += [f"http_reqs,{100 + second},1,benchmark_scenario"] * requests
+    lines.append('dropped_iterations,104,2,benchmark_scenario')
+    metrics_file.write_text('\n'.join(lines) + '\n')
+    result = WorkloadAnalyzer(metrics_file, OPTIONS).analyze_workload()
+    assert list(result['expected_requests']) == [0, 2, 8]
+    assert list(result['achieved_requests']) == [0, 2, 6]
+    assert list(result['dropped_iterations']) == [0, 0, 2]
+    assert list(result['exhausted_seconds']) == [0, 0, 1]
+    assert result['relative_deviation'].iloc[2] == -0.25
+    assert (tmp_path / 'workload_validation.csv').is_file()
@@ -1,6 +1,9 @@
 import json
 import os
-from sb.workload_generator import WorkloadGenerator
+import numpy as np
+import pytest
+from sb.workload_analyzer import decode_stages, target_series
+from sb.workload_generator import WorkloadGenerator, arrival_timestamps, compact_stages, max_window_arrivals, size_replay_vus, size_vus  # noqa: E501
 
 
 def test_default_workload():
@@ -36,3 +39,231 @@ def json_options(*args):
     generator = WorkloadGenerator(*args)
     workload_dict = generator.generate_trace()
     return json.dumps(workload_dict)
+
+
+def test_size_vus():
+    rates = [0, 5, 20, 10]
+    # Legacy heuristic without latency
+    assert size_vus(rates) == (2, None)
+    # Little's law: 20 rps * 0.5s * 1.5 headroom = 15 concurrent requests
+    assert size_vus(rates, 0.5) == (15, 15)
+    samples = [0.1] * 98 + [1.0, 1.0]
+    assert size_vus(rates, samples, quantile=0.99, headroom=1) == (2, 20)
+
+
+def test_size_vus_from_k6_metrics(tmp_path):
+    metrics_file = tmp_path / 'k6_metrics.csv'
+    metrics_file.write_text(
+        'metric_name,timestamp,metric_value,check,error,error_code\n'
+        'http_reqs,1650000000,1.000000,,,\n'
+        'http_req_duration,1650000000,200.000000,,,\n'
+        'http_req_duration,1650000001,400.000000,,,\n'
+    )
+    assert size_vus([10], str(metrics_file), quantile=1, headroom=1) == (3, 4)
+
+
+def test_size_vus_from_numeric_string():
+    # Config values such as `expected_latency: "0.5"` are numbers, not paths
+    assert size_vus([20], '0.5') == (15, 15)
+    with pytest.raises(FileNotFoundError):
+        size_vus([20], 'missing_k6_metrics.csv')
+
+
+def test_expected_latency_emits_max_vus():
+    actual = json.loads(json_options('jump', 1, 'linear', None, None, 0, 2.0))
+    scenario = actual['scenarios']['benchmark_scenario']
+    assert list(scenario.keys())[-1] == 'maxVUs'
+    assert scenario['maxVUs'] >= scenario['preAllocatedVUs'] > 1
+
+
+def test_compact_stages():
+    # Linear ramp and noisy plateau
+    rates = list(range(0, 20)) + [20, 21, 19, 20, 20, 21, 19, 20]
+    # Without tolerance, each rate change steps within one second like the legacy encoding
+    assert compact_stages(rates, 0) == [(1, r) for r in rates]
+    assert compact_stages([0] * 5 + [5] * 5, 0) == [(5, 0), (1, 5), (4, 5)]
+    stages = compact_stages(rates, 2)
+    assert len(stages) == 2
+    assert sum(duration for duration, _ in stages) == len(rates)
+
+
+def test_compact_encoding_reports_error():
+    generator = WorkloadGenerator('single', stage_tolerance=3)
+    rng = np.random.default_rng(1)
+    rates = np.round(50 + 10 * np.sin(np.arange(3600) / 300) + rng.normal(0, 1, 3600))
+    scenario = generator.encode_for_k6(rates)['scenarios']['benchmark_scenario']
+    error = generator.encoding_error
+    assert error['stages'] == len(scenario['stages']) < 100
+    assert error['max_error'] <= 3 + 1e-9
+    assert abs(error['total_error']) <= 0.01
+
+
+def test_compact_stages_error_bounds():
+    rng = np.random.default_rng(3)
+    rates = np.concatenate([rng.poisson(30, 1800), rng.poisson(80, 1800)]).astype(float)
+    for tolerance in [1, 2, 5]:
+        stages = compact_stages(rates, tolerance)
+        scenario = {'executor': 'ramping-arrival-rate', 'startRate': rates[0],
+                    'stages': [{'target': t, 'duration': f"{d}s"} for d, t in stages]}
+        errors = target_series(decode_stages(scenario)) - rates
+        assert abs(errors.sum()) <= 0.01 * rates.sum()
+        # Only one-second steps exceed the per-second tolerance
+        ramp_seconds = np.concatenate([np.arange(start - d, start) for start, (d, _)
+                                       in zip(np.cumsum([d for d, _ in stages]), stages) if d > 1])  # noqa: E501
+        assert np.abs(errors[ramp_seconds]).max() <= tolerance + 1e-9
+
+
+def test_compact_encoding_caps_stages():
+    generator = WorkloadGenerator('single', max_stages=10)
+    rates = np.round(np.random.default_rng(2).uniform(0, 100, 1000))
+    scenario = generator.encode_for_k6(rates)['scenarios']['benchmark_scenario']
+    assert len(scenario['stages']) <= 10
+    assert generator.encoding_error['tolerance'] > 0
+    # Raising the tolerance keeps the total invocations error bound
+    assert abs(generator.encoding_error['total_error']) <= 0.01
+    os.environ['SB_WORKLOADGEN_SEED'] = '11'
+    generator = WorkloadGenerator('jump', max_stages=3)
+    generator.generate_trace()
+    assert generator.encoding_error['stages'] <= 3
+    assert abs(generator.encoding_error['total_error']) <= 0.01
+
+
+def test_compact_encoding_rejects_unreachable_max_stages():
+    generator = WorkloadGenerator('single', max_stages=1)
+    # Any single ramp from 0 misses the 100 invocations by at least 50
+    with pytest.raises(ValueError):
+        generator.encode_for_k6(np.array([0, 0, 1] * 100, dtype=float))
+
+
+def test_composite_workload(tmp_path):
+    os.environ['SB_WORKLOADGEN_SEED'] = '11'
+    short_trace = tmp_path / 'short.csv'
+    short_trace.write_text('InvocationsPerMinute\n' + '600\n' * 5)
+    workloads = [
+        {'workload_type': 'steady', 'endpoint': 'http'},
+        {'workload_type': 'spikes', 'scale_factor': 2, 'scale_type': 'compound', 'endpoint': 'queue'},  # noqa: E501
+        {'workload_trace': str(short_trace), 'name': 'short'}
+    ]
+    generator = WorkloadGenerator('composite', seconds_to_skip=0, workloads=workloads)
+    scenarios = generator.generate_trace()['scenarios']
+    assert list(scenarios) == ['http', 'queue', 'short']
+    assert scenarios['http']['tags'] == {'endpoint': 'http'}
+    assert scenarios['queue']['env'] == {'ENDPOINT': 'queue'}
+    assert 'tags' not in scenarios['short']
+    # Time-aligned scenarios with no requests after the end of shorter traces
+    durations = {name: sum(int(s['duration'][:-1]) for s in sc['stages']) for name, sc in scenarios.items()}  # noqa: E501
+    assert set(durations.values()) == {20 * 60}
+    assert scenarios['short']['stages'][-1]['target'] == 0
+
+
+def test_composite_workload_validation():
+    with pytest.raises(Exception):
+        WorkloadGenerator('composite')
+    with pytest.raises(Exception):
+        WorkloadGenerator('composite', workloads=[{'workload_type': 'steady', 'rate': 1}])
+    with pytest.raises(Exception):
+        WorkloadGenerator('composite', workloads=[{'workload_type': 'steady', 'endpoint': 'a'},
+                                                  {'workload_type': 'jump', 'endpoint': 'a'}])
+
+
+def test_batched_upscaling_matches_single_trace():
+    os.environ['SB_WORKLOADGEN_SEED'] = '11'
+    single = WorkloadGenerator('jump', 2).generate_trace()
+    os.environ['SB_WORKLOADGEN_SEED'] = '11'
+    composite = WorkloadGenerator('composite', workloads=[{'workload_type': 'jump', 'scale_factor': 2}]).generate_trace()  # noqa: E501
+    assert composite['scenarios']['scenario_0'] == single['scenarios']['benchmark_scenario']
+
+
+def test_arrival_timestamps_follow_rates():
+    rates = [0, 1000, 0, 3000]
+    timestamps = arrival_timestamps(rates, 'poisson', seed=1)
+    assert np.all(np.diff(timestamps) >= 0)
+    counts = np.histogram(timestamps, bins=np.arange(5))[0]
+    assert counts[0] == counts[2] == 0
+    assert counts[1] == pytest.approx(1000, rel=0.1)
+    assert counts[3] == pytest.approx(3000, rel=0.1)
+    assert np.array_equal(timestamps, arrival_timestamps(rates, 'poisson', seed=1))
+
+
+def test_gamma_arrivals_are_burstier():
+    rates = [1000] * 10
+
+    def inter_arrival_cv(timestamps):
+        gaps = np.diff(timestamps)
+        return gaps.std() / gaps.mean()
+
+    assert inter_arrival_cv(arrival_timestamps(rates, 'poisson', seed=1)) == pytest.approx(1, abs=0.1)  # noqa: E501
+    assert inter_arrival_cv(arrival_timestamps(rates, 'gamma', cv=3, seed=1)) == pytest.approx(3, rel=0.2)  # noqa: E501
+
+
+def test_encode_arrivals():
+    os.environ['SB_WORKLOADGEN_SEED'] = '11'
+    generator = WorkloadGenerator('jump', arrival_process='poisson', expected_latency=0.5)
+    scenario = generator.generate_trace()['scenarios']['benchmark_scenario']
+    assert scenario['executor'] == 'shared-iterations'
+    assert scenario['exec'] == 'replayArrivals'
+    assert scenario['iterations'] == len(generator.arrivals) > 0
+    assert generator.arrivals.dtype == np.dtype('<u4')
+    assert np.all(np.diff(generator.arrivals.astype(np.int64)) >= 0)
+    # Enough VUs for all requests within any 0.5s window
+    assert scenario['vus'] == int(np.ceil(max_window_arrivals(generator.arrivals, 500) * 1.5))
+    with pytest.raises(Exception):
+        WorkloadGenerator('jump', arrival_process='uniform', expected_latency=0.5)
+    with pytest.raises(Exception):
+        WorkloadGenerator('jump', arrival_process='poisson')
+
+
+def test_max_window_arrivals():
+    arrivals = [0, 100, 150, 900, 1000, 1000, 1099, 5000]
+    assert max_window_arrivals(arrivals, 100) == 3
+    assert max_window_arrivals(arrivals, 1000) == 6
+    assert max_window_arrivals(arrivals, 0) == 2
+    assert max_window_arrivals([], 100) == 0
+
+
+def test_size_replay_vus(caplog):
+    # A burst exceeds the concurrency of its per-second rate
+    arrivals = np.array([0] * 20 + [1000 * i for i in range(1, 10)])
+    assert size_vus(np.bincount(arrivals // 1000), 0.1)[1] == 3
+    # Capped at the number of iterations
+    assert size_replay_vus(arrivals, 0.1) == 29
+    assert size_replay_vus(arrivals[20:], 0.1) == 2
+    assert 'start late' not in caplog.text
+    # Slow requests beyond the latency quantile can delay later requests
+    assert size_replay_vus(arrivals[20:], [0.1] * 99 + [2.5]) == 2
+    assert 'start late' in caplog.text
+
+
+def test_burst_workload():
+    generator = WorkloadGenerator('burst', burst_size=50, burst_interval=600, burst_repetitions=3)
+    scenarios = generator.generate_trace()['scenarios']
+    assert list(scenarios) == ['burst_0', 'burst_1', 'burst_2']
+    assert scenarios['burst_2'] == {
+        'executor': 'per-vu-iterations',
+        'vus': 50,
+        'iterations': 1,
+        'startTime': '1200s',
+        'maxDuration': '600s',
+        'gracefulStop': '0s'
+    }
+    with pytest.raises(Exception):
+        WorkloadGenerator('burst')
+
+
+@pytest.mark.parametrize('interval', [1, 30, 600, 900])
+def test_bursts_do_not_overlap(interval):
+    generator = WorkloadGenerator('burst', burst_size=5, burst_interval=interval, burst_repetitions=4)  # noqa: E501
+    # k6 stops a scenario at most maxDuration + gracefulStop (default: 30s) after its start
+    windows = sorted((int(s['startTime'][:-1]),
+                      int(s['startTime'][:-1]) + int(s['maxDuration'][:-1]) + int(s.get('gracefulStop', '30s')[:-1]))  # noqa: E501
+                     for s in generator.generate_trace()['scenarios'].values())
+    assert all(end <= next_start for (_, end), (next_start, _) in zip(windows, windows[1:]))
+
+
+def test_hurst_parameter():
+    os.environ['SB_WORKLOADGEN_SEED'] = '11'
+    smooth = WorkloadGenerator('steady', hurst=0.9).upscale_trace(WorkloadGenerator.trace_file('steady'))  # noqa: E501
+    volatile = WorkloadGenerator('steady', hurst=0.2).upscale_trace(WorkloadGenerator.trace_file('steady'))  # noqa: E501
+    assert np.abs(np.diff(volatile)).mean() > np.abs(np.diff(smooth)).mean()
+    with pytest.raises(Exception):
+        WorkloadGenerator('steady', hurst=1.5)
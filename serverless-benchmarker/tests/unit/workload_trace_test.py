@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from sb.workload_generator import WorkloadGenerator
+from sb.workload_trace import WorkloadTrace, convert_trace
+
+
+def azure_csv(path, rows):
+    minutes = ','.join(str(m) for m in range(1, 5))
+    lines = [f"HashOwner,HashApp,HashFunction,Trigger,{minutes}"]
+    for owner, app, function, counts in rows:
+        lines.append(f"{owner},{app},{function},http,{','.join(str(c) for c in counts)}")
+    path.write_text('\n'.join(lines) + '\n')
+    return path
+
+
+def test_convert_azure_trace(tmp_path):
+    day1 = azure_csv(tmp_path / 'd01.csv', [
+        ('o1', 'a1', 'f1', [1, 2, 3, 4]),
+        ('o1', 'a1', 'f2', [0, 0, 5, 0]),
+        # Duplicate entries are summed up
+        ('o1', 'a1', 'f1', [1, 1, 1, 1])
+    ])
+    day2 = azure_csv(tmp_path / 'd02.csv', [
+        ('o2', 'a2', 'f3', [7, 7, 7, 7]),
+        ('o1', 'a1', 'f1', [9, 8, 7, 6])
+    ])
+    trace = convert_trace([day1, day2], tmp_path / 'azure.sbtrace', chunksize=2)
+    assert trace.functions == ['o1/a1/f1', 'o1/a1/f2', 'o2/a2/f3']
+    assert trace.minutes == 8
+    trace = WorkloadTrace(tmp_path / 'azure.sbtrace')
+    assert isinstance(trace.invocations, np.memmap)
+    assert trace.per_minute_rates('o1/a1/f1').tolist() == [2, 3, 4, 5, 9, 8, 7, 6]
+    assert trace.per_minute_rates('o2/a2/f3', start=2, end=6).tolist() == [0, 0, 7, 7]
+    with pytest.raises(KeyError):
+        trace.per_minute_rates()
+    with pytest.raises(KeyError):
+        trace.per_minute_rates('unknown')
+
+
+def test_generator_slices_binary_trace(tmp_path):
+    csv_file = tmp_path / 'steady.csv'
+    csv_file.write_text('InvocationsPerMinute\n60\n120\n180\n')
+    convert_trace([csv_file], tmp_path / 'steady.sbtrace')
+    generator = WorkloadGenerator('custom', workload_trace=str(tmp_path / 'steady.sbtrace'),
+                                  seconds_to_skip=0, trace_start=1, trace_end=2)
+    per_second_rates = generator.upscale_trace(generator.workload_trace_file)
+    assert len(per_second_rates) == 60
+    assert per_second_rates.sum() == pytest.approx(120, abs=30)